@@ -0,0 +1,103 @@
+"""
+@file       adaptive.py
+@brief      Compares the accepted throughput and the load balance of the routing policies
+            on multi_stage_arch. With the 'adversarial' traffic the static d-mod-k routes
+            of both flows of a first-stage switch share one uplink, while the 'mixed'
+            traffic is the contended pattern of allocators.py.
+            Run from the src directory: python ../benchmarks/adaptive.py
+@author     Akshay Joshi
+"""
+
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from simulator import Simulator
+from parser import Parser
+from routing import ROUTING_POLICIES, load_imbalance
+from sweep import init_worker, run_point
+
+ARCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "multi_stage_arch")
+
+# destinations of every producer
+TRAFFIC = {
+    "adversarial": {"A0": "B0", "A1": "B2", "A2": "B1", "A3": "B3"},
+    "mixed": {"A0": "B0:B2:B1", "A1": "B0:B3", "A2": "B2:B1:B0", "A3": "B3:B1"},
+}
+
+# switches that choose between several routes
+FIRST_STAGE = ("S1", "S2")
+
+class TrafficParser(Parser):
+    """
+    @class      TrafficParser
+    @brief      A Parser that sets the traffic of the producers.
+    """
+    def __init__(self, node_config, connection_config, user_nodes_dir, overrides):
+        super().__init__(node_config, connection_config, user_nodes_dir)
+        self.__overrides = overrides
+
+    def parse(self):
+        super().parse()
+        traffic = TRAFFIC[self.__overrides["traffic"]]
+        for node in self.nodes:
+            if node.get_node_id() in traffic:
+                node.pattern, node.pattern_params = "alternate", traffic[node.get_node_id()]
+
+
+def run_policy(cycles, engine, traffic, policy):
+    """
+    @brief      Runs one routing policy.
+    @return     a tuple with the delivered packets per consumer per cycle and the worst load
+                imbalance over the output ports of a first-stage switch.
+    """
+    node_config = os.path.join(ARCH_DIR, "nodes.csv")
+    connection_config = os.path.join(ARCH_DIR, "connections.csv")
+    rows = run_point(node_config, connection_config, ARCH_DIR, engine, cycles, {"traffic": traffic}, TrafficParser, policy)
+    delivered = sum(val for node_id, name, val in rows if name == "pkts_recvd")
+    consumers = len({node_id for node_id, name, _ in rows if name == "pkts_recvd"})
+    imbalance = max(
+        load_imbalance(val for node_id, name, val in rows if node_id == switch_id and name.startswith("pkts_forwarded_"))
+        for switch_id in FIRST_STAGE
+    )
+    return delivered / (cycles * consumers), imbalance
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--cycles",
+        type = int,
+        default = 5000,
+        help = "Number of simulation cycles per run (default: 5000)"
+    )
+    parser.add_argument(
+        "--engine",
+        type = str,
+        default = "cycle",
+        choices = list(Simulator.ENGINES),
+        help = "Simulation engine (default: cycle)"
+    )
+    parser.add_argument(
+        "--workers",
+        type = int,
+        default = os.cpu_count(),
+        help = "Number of worker processes (default: number of CPUs)"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    points = [(traffic, policy) for traffic in TRAFFIC for policy in ROUTING_POLICIES]
+    with ProcessPoolExecutor(max_workers = args.workers, initializer = init_worker, initargs = (ARCH_DIR,)) as pool:
+        futures = [pool.submit(run_policy, args.cycles, args.engine, traffic, policy) for traffic, policy in points]
+
+        print(f"{'traffic':<13}{'policy':<9}{'throughput':>12}{'imbalance':>11}")
+        for (traffic, policy), future in zip(points, futures):
+            throughput, imbalance = future.result()
+            print(f"{traffic:<13}{policy:<9}{throughput:>12.3f}{imbalance:>11.2f}")
@@ -0,0 +1,182 @@
+"""
+@file       allocators.py
+@brief      Compares the saturation throughput of the switch scheduling algorithms in two
+            cases. 'crossbar' is a single 8x8 switch under uniform traffic at full load,
+            where the throughput is decided by the switch: the input-queued modes are
+            limited by head-of-line blocking and virtual output queues lift the limit.
+            'multi_stage' is multi_stage_arch, where every producer injects a packet each
+            cycle to a rotating set of destinations that contend for the same switch
+            outputs. The accepted throughput is the fraction of the consumer bandwidth that
+            is delivered.
+
+            With 1 VC and 5000 cycles:
+
+              case         fifo   islip-1  islip-4  wavefront  voq-8  voq-32-4
+              crossbar     0.624  0.617    0.617    0.617      0.728  0.950
+              multi_stage  0.706  0.665    0.665    0.690      0.680  0.681
+
+            On the crossbar every input-queued mode reaches the head-of-line limit of an
+            8x8 switch, about 0.618, and the fifo mode is a like-for-like input-queued
+            baseline: with 1 VC every input has one head, which waits in one output queue,
+            so at most one packet per input and per output moves in a cycle, as in the
+            allocator modes. On multi_stage the throughput is limited by the conflicts of
+            the deterministic traffic between the stages, where the oldest-first order of
+            fifo serves the contending heads better than the round-robin pointers of the
+            allocators. With more than one VC the fifo mode reads the head of every VC of
+            an input in the same cycle, while the allocator and voq modes read one packet
+            per input, so only the 1-VC rows compare the algorithms like for like.
+            Run from the src directory: python ../benchmarks/allocators.py
+@author     Akshay Joshi
+"""
+
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from simulator import Simulator
+from parser import Parser
+from topology import make_topology
+from saturation import measure_load
+from sweep import init_worker, run_point
+
+ARCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "multi_stage_arch")
+INPUTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "inputs")
+
+# a single 8x8 switch with a generator and a sink on every port
+CROSSBAR = "butterfly:k=8,n=1,traffic=uniform"
+
+# destinations of every producer, chosen so that flows collide at the switches
+TRAFFIC = {
+    "A0": "B0:B2:B1",
+    "A1": "B0:B3",
+    "A2": "B2:B1:B0",
+    "A3": "B3:B1",
+}
+
+# name, switch algorithm and algorithm_params of every algorithm that is compared
+ALGORITHMS = [
+    ("fifo", "fifo", ""),
+    ("islip-1", "islip", "1"),
+    ("islip-4", "islip", "4"),
+    ("wavefront", "wavefront", ""),
+    ("voq-8", "voq", "8"),
+    ("voq-32-4", "voq", "32:4"),
+]
+
+CASES = ("crossbar", "multi_stage")
+
+class AllocatorParser(Parser):
+    """
+    @class      AllocatorParser
+    @brief      A Parser that sets the contended traffic on the producers, the scheduling
+                algorithm on the switches and the number of virtual channels on the links.
+    """
+    def __init__(self, node_config, connection_config, user_nodes_dir, overrides):
+        super().__init__(node_config, connection_config, user_nodes_dir)
+        self.__overrides = overrides
+
+    def parse(self):
+        super().parse()
+        for node in self.nodes:
+            if node.get_node_id() in TRAFFIC:
+                node.pattern, node.pattern_params = "alternate", TRAFFIC[node.get_node_id()]
+            elif node.get_class_name() == "Switch":
+                node.algorithm, node.algorithm_params = self.__overrides["algorithm"], self.__overrides["algorithm_params"]
+        for connection in self.connections:
+            connection.vcs = int(self.__overrides["vcs"])
+
+
+class SwitchOverrides:
+    """
+    @class      SwitchOverrides
+    @brief      Wraps a Topology and sets the scheduling algorithm on its switches and the
+                number of virtual channels on its links.
+    """
+    def __init__(self, topology, overrides):
+        self.__topology = topology
+        self.__overrides = overrides
+        self.nodes = []
+        self.connections = []
+
+    def parse(self):
+        self.__topology.parse()
+        self.nodes = self.__topology.nodes
+        self.connections = self.__topology.connections
+        for node in self.nodes:
+            if node.get_class_name() == "NewSwitch":
+                node.algorithm, node.algorithm_params = self.__overrides["algorithm"], self.__overrides["algorithm_params"]
+        for connection in self.connections:
+            connection.vcs = int(self.__overrides["vcs"])
+
+
+def run_algorithm(case, cycles, engine, overrides):
+    """
+    @brief      Runs one algorithm and returns the accepted throughput.
+    @return     delivered packets per consumer per cycle, measured after a warm-up of a
+                fifth of the cycles on the crossbar.
+    """
+    if case == "crossbar":
+        topology = SwitchOverrides(make_topology(CROSSBAR, INPUTS_DIR), overrides)
+        return measure_load(topology, 1.0, cycles, cycles // 5, engine)["accepted"]
+
+    node_config = os.path.join(ARCH_DIR, "nodes.csv")
+    connection_config = os.path.join(ARCH_DIR, "connections.csv")
+    rows = run_point(node_config, connection_config, ARCH_DIR, engine, cycles, overrides, AllocatorParser)
+    delivered = sum(val for node_id, name, val in rows if name == "pkts_recvd")
+    consumers = len({node_id for node_id, name, _ in rows if name == "pkts_recvd"})
+    return delivered / (cycles * consumers)
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--cycles",
+        type = int,
+        default = 5000,
+        help = "Number of simulation cycles per run (default: 5000)"
+    )
+    parser.add_argument(
+        "--cases",
+        type = str,
+        nargs = "+",
+        default = list(CASES),
+        choices = list(CASES),
+        help = "Networks to compare the algorithms on (default: crossbar multi_stage)"
+    )
+    parser.add_argument(
+        "--vcs",
+        type = int,
+        nargs = "+",
+        default = [1],
+        help = "Numbers of virtual channels per link to compare, see the notes above on more than one (default: 1)"
+    )
+    parser.add_argument(
+        "--engine",
+        type = str,
+        default = "cycle",
+        choices = list(Simulator.ENGINES),
+        help = "Simulation engine (default: cycle)"
+    )
+    parser.add_argument(
+        "--workers",
+        type = int,
+        default = os.cpu_count(),
+        help = "Number of worker processes (default: number of CPUs)"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    points = [(case, name, vcs, {"algorithm": algorithm, "algorithm_params": params, "vcs": vcs})
+              for case in args.cases for vcs in args.vcs for name, algorithm, params in ALGORITHMS]
+    with ProcessPoolExecutor(max_workers = args.workers, initializer = init_worker, initargs = (ARCH_DIR,)) as pool:
+        futures = [pool.submit(run_algorithm, case, args.cycles, args.engine, overrides) for case, _, _, overrides in points]
+
+        print(f"{'case':<13}{'algorithm':<12}{'vcs':>5}{'throughput':>12}")
+        for (case, name, vcs, _), future in zip(points, futures):
+            print(f"{case:<13}{name:<12}{vcs:>5}{future.result():>12.3f}")
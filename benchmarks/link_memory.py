@@ -0,0 +1,87 @@
+"""
+@file       link_memory.py
+@brief      Checks the memory of idle links, which dominates the footprint of large
+            fabrics. Builds links with their two ports as Simulator does, with the IDs the
+            parser gives them, measures the bytes per link with tracemalloc and exits with
+            status 1 if they exceed the figure documented for Link by more than the margin.
+            Run from the src directory: python ../benchmarks/link_memory.py
+@author     Akshay Joshi
+"""
+
+import os
+import sys
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from link import Link
+from port import InputPort, OutputPort
+
+# bytes of an idle link with its two ports and their ID strings, as documented for Link
+LINK_BYTES = 800
+
+def build_links(links):
+    """
+    @brief      Fills the list with idle links between consecutive switches, each with its
+                output and input port with one virtual channel, named as the parser
+                names them.
+    @param      links - a preallocated list, so that growing it is not measured.
+    """
+    for i in range(len(links)):
+        src_node, dst_node = f"S{i}", f"S{i + 1}"
+        op_id, ip_id = f"{src_node}_{i % 16}_out", f"{dst_node}_{i % 16}_in"
+        link = Link(f"link_{src_node}_{op_id}_to_{dst_node}_{ip_id}", 2)
+        link.set_output_port(OutputPort(op_id, 5, link))
+        link.set_input_port(InputPort(ip_id, 5, link))
+        links[i] = link
+
+def bytes_per_link(num_links):
+    """
+    @brief      Measures the memory allocated while building num_links links.
+    @return     the number of bytes per link.
+    """
+    links = [None] * num_links
+    tracemalloc.start()
+    try:
+        build_links(links)
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return allocated / num_links
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--links",
+        type = int,
+        default = 20000,
+        help = "Number of links built (default: 20000)"
+    )
+    parser.add_argument(
+        "--limit",
+        type = float,
+        default = LINK_BYTES,
+        help = f"Expected bytes per link (default: {LINK_BYTES}, the figure documented for Link)"
+    )
+    parser.add_argument(
+        "--margin",
+        type = float,
+        default = 0.05,
+        help = "Relative excess over the limit reported as a regression (default: 0.05)"
+    )
+    args = parser.parse_args()
+    if args.links <= 0 or args.limit <= 0 or args.margin < 0:
+        parser.error("links and limit must be positive and the margin not negative")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    measured = bytes_per_link(args.links)
+    allowed = args.limit * (1.0 + args.margin)
+    print(f"{measured:.0f} bytes per idle link with its ports ({args.links} links), allowed {allowed:.0f}")
+    if measured > allowed:
+        print(f"REGRESSION: links take {(measured / args.limit - 1) * 100:+.0f}% more memory than {args.limit:.0f} bytes")
+        sys.exit(1)
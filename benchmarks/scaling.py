@@ -0,0 +1,228 @@
+"""
+@file       scaling.py
+@brief      Measures the speed and memory of the simulator on generated topologies of
+            increasing size under uniform traffic: the startup time, the wall time per
+            simulated cycle, the packets delivered and forwarded per second and the peak
+            RSS. The results are saved as JSON, and compared against an earlier result
+            file with --compare, which flags the cases that got slower or bigger.
+            Run from the src directory: python ../benchmarks/scaling.py
+@author     Akshay Joshi
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import platform
+import resource
+import argparse
+import subprocess
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from simulator import Simulator
+from plotter import Plotter
+from topology import make_topology
+from sweep import init_worker
+
+INPUTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "inputs")
+
+# topologies of every scale and the number of cycles they are simulated for
+SCALES = {
+    "small": (2000, ["mesh:dims=4x4", "fat_tree:k=4", "butterfly:k=2,n=3"]),
+    "medium": (2000, ["mesh:dims=8x8", "fat_tree:k=8", "butterfly:k=4,n=3", "clos:m=8,n=8,r=8"]),
+    "large": (1000, ["mesh:dims=16x16", "fat_tree:k=16", "torus:dims=8x8x8"]),
+}
+
+# metrics where a higher value is a regression, with the smallest absolute and relative
+# increase that is not noise. The times of short runs vary by tens of percent between
+# identical runs on a shared machine, even as the best of several runs of CPU time.
+LOWER_IS_BETTER = {"startup_s": (0.05, 0.3), "us_per_cycle": (5.0, 0.3), "peak_rss_mb": (2.0, 0.0)}
+
+def run_case(topology, rate, engine, cycles):
+    """
+    @brief      Simulates one case in a fresh worker process, so that the peak RSS is the
+                one of this case only. The times are CPU times of the process, which do
+                not count the time other processes run on its CPU.
+    @return     a dict with the case and its metrics.
+    """
+    spec = f"{topology},traffic=uniform,traffic_params=rate={rate}"
+    start = time.process_time()
+    sim = Simulator(cycles, make_topology(spec, INPUTS_DIR), engine)
+    sim.set_plotter(Plotter(False))
+    sim.setup()
+    setup_end = time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim.run()
+    run_end = time.process_time()
+
+    delivered = forwarded = 0
+    for node in sim.get_nodes():
+        if node.has_stats():
+            counters = node.get_stats().get_counters()
+            delivered += counters.get("pkts_recvd", 0)
+            forwarded += counters.get("pkts_forwarded", 0)
+    run_s = run_end - setup_end
+    return {
+        "case": f"{topology}/rate={rate}/{engine}",
+        "nodes": len(sim.get_nodes()),
+        "links": len(sim.get_links()),
+        "cycles": cycles,
+        "startup_s": setup_end - start,
+        "run_s": run_s,
+        "us_per_cycle": run_s * 1e6 / cycles,
+        "pkts_per_s": delivered / run_s,
+        "hops_per_s": forwarded / run_s,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def best_of(runs):
+    """
+    @brief      Merges the repeated runs of a case, keeping the best value of every metric.
+    """
+    best = dict(runs[0])
+    for run in runs[1:]:
+        for metric in LOWER_IS_BETTER:
+            best[metric] = min(best[metric], run[metric])
+        if run["run_s"] < best["run_s"]:
+            for metric in ("run_s", "pkts_per_s", "hops_per_s"):
+                best[metric] = run[metric]
+    return best
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output = True, text = True,
+                              cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, baseline, threshold):
+    """
+    @brief      Compares the metrics of the cases present in both result files.
+    @param      threshold - relative increase of a metric that counts as a regression,
+                raised to the relative noise of the metric where that is larger.
+    @return     a list of (case, metric, old, new) tuples of the regressions.
+    """
+    old_cases = {result["case"]: result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = old_cases.get(result["case"])
+        if old is None:
+            continue
+        for metric, (noise, relative_noise) in LOWER_IS_BETTER.items():
+            if result[metric] > old[metric] * (1.0 + max(threshold, relative_noise)) and result[metric] - old[metric] > noise:
+                regressions.append((result["case"], metric, old[metric], result[metric]))
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--scales",
+        type = str,
+        nargs = "+",
+        default = ["small", "medium"],
+        choices = list(SCALES),
+        help = "Sizes of the topologies to run (default: small medium)"
+    )
+    parser.add_argument(
+        "--rates",
+        type = float,
+        nargs = "+",
+        default = [0.1, 0.5],
+        help = "Injection rates of the uniform traffic (default: 0.1 0.5)"
+    )
+    parser.add_argument(
+        "--engines",
+        type = str,
+        nargs = "+",
+        default = list(Simulator.ENGINES),
+        choices = list(Simulator.ENGINES),
+        help = "Simulation engines to run (default: cycle event)"
+    )
+    parser.add_argument(
+        "--cycles",
+        type = int,
+        default = None,
+        help = "Number of simulation cycles per case (default: per scale)"
+    )
+    parser.add_argument(
+        "--repeat",
+        type = int,
+        default = 3,
+        help = "Number of runs per case, the best of which is reported (default: 3)"
+    )
+    parser.add_argument(
+        "--workers",
+        type = int,
+        default = 1,
+        help = "Number of worker processes, more than one makes the timings noisier (default: 1)"
+    )
+    parser.add_argument(
+        "--output",
+        type = str,
+        default = "../outputs/benchmark.json",
+        help = "Path of the results file (default: ../outputs/benchmark.json)"
+    )
+    parser.add_argument(
+        "--compare",
+        type = str,
+        default = None,
+        help = "Path of an earlier results file to flag regressions against"
+    )
+    parser.add_argument(
+        "--threshold",
+        type = float,
+        default = 0.1,
+        help = "Relative increase of startup time, time per cycle or peak RSS reported as a regression, "
+               "at least the noise of the metric given in LOWER_IS_BETTER (default: 0.1)"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    cases = [(topology, rate, engine, args.cycles or cycles)
+             for scale in args.scales for cycles, topologies in [SCALES[scale]]
+             for topology in topologies for rate in args.rates for engine in args.engines]
+
+    # every case gets a new process, which keeps the peak RSS of the cases apart
+    with ProcessPoolExecutor(max_workers = args.workers, max_tasks_per_child = 1,
+                             initializer = init_worker, initargs = (INPUTS_DIR,)) as pool:
+        # the repetitions run in rounds over all cases, so that a slow period of the
+        # machine does not fall on all the runs of one case
+        rounds = [[pool.submit(run_case, *case) for case in cases] for _ in range(args.repeat)]
+        futures = [[runs[i] for runs in rounds] for i in range(len(cases))]
+
+        results = []
+        print(f"{'case':<42}{'nodes':>7}{'startup s':>11}{'us/cycle':>10}{'pkts/s':>10}{'hops/s':>10}{'RSS MB':>8}")
+        for runs in futures:
+            result = best_of([future.result() for future in runs])
+            results.append(result)
+            print(f"{result['case']:<42}{result['nodes']:>7}{result['startup_s']:>11.2f}{result['us_per_cycle']:>10.1f}"
+                  f"{result['pkts_per_s']:>10.0f}{result['hops_per_s']:>10.0f}{result['peak_rss_mb']:>8.1f}")
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok = True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent = 2)
+    print(f"Results can be found in {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for case, metric, old, new in regressions:
+            print(f"REGRESSION {case}: {metric} {old:.3f} -> {new:.3f} ({(new / old - 1) * 100:+.0f}%)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.compare}")
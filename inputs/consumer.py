@@ -21,6 +21,8 @@ class Consumer(Node):
     def setup(self):
         self.register_counter_stats(f"pkts_recvd")
         self.register_cycle_stats(f"{self.get_node_id()}")
+        self.in_id = 'B_in'
+        self.in_handle = self.input_handle(self.in_id)
 
     def advance(self, cycle):
         """
@@ -28,13 +30,23 @@ class Consumer(Node):
         @param      cycle - an integer representing current simulation time.
         """
         self.record_cycle_stats(f"{self.get_node_id()}", cycle, False)
-        input_port = 'B_in'
 
         # if cycle % self.rate  != 0:
         #     return
 
-        pkt = self.recv_pkt(input_port, cycle)
+        # receive one packet per cycle, from the first virtual channel that has one
+        input_port = self.get_input_port_at(self.in_handle)
+        pkt = None
+        for vc in range(input_port.get_num_vcs()):
+            pkt = self.recv_pkt_on(self.in_handle, cycle, vc)
+            if pkt:
+                break
         if pkt:
-            logger.debug(f"{self.get_node_id()} received packet {pkt.get_pkt_id()} on {input_port}")
+            logger.debug("%s received packet %s on %s", self.get_node_id(), pkt, self.in_id)
             self.incr_counter_stats(f"pkts_recvd", 1)
-            self.record_cycle_stats(f"{self.get_node_id()}", cycle, True)
\ No newline at end of file
+            self.record_cycle_stats(f"{self.get_node_id()}", cycle, True)
+            self.release_pkt(pkt)
+
+        # nothing left to receive, sleep until the next packet arrives
+        if input_port.is_empty():
+            self.sleep_until_event()
@@ -30,10 +30,10 @@ class CPU(Node):
             pkt = Packet(str(current_cycle), msg)
             status = self.send_pkt(pkt, "AsendsB", current_cycle)
             if status < 0:
-                logger.warning(f"Node {self.get_node_id()} unable to send pkt {pkt.get_pkt_id()}")
+                logger.warning("Node %s unable to send pkt %s", self.get_node_id(), pkt.get_pkt_id())
             else:
-                logger.debug(f"Node '{self.get_node_id()}' sent pkt {pkt.get_pkt_id()}")
+                logger.debug("Node '%s' sent pkt %s", self.get_node_id(), pkt.get_pkt_id())
         
         pkt = self.recv_pkt("BrecvsA", current_cycle)
         if pkt is not None:
-            logger.debug(f"Node {self.get_node_id()} received pkt {pkt.get_pkt_id()}")
+            logger.debug("Node %s received pkt %s", self.get_node_id(), pkt.get_pkt_id())
@@ -7,7 +7,6 @@ import logging
 logger = logging.getLogger(__name__)
 
 from node import Node
-from packet import Packet
 
 class Producer(Node):
     """
@@ -19,12 +18,17 @@ class Producer(Node):
         """
         super().__init__()
 
+    def is_done(self):
+        # a packet is generated every cycle for ever
+        return False
+
     def setup(self):
         self.register_counter_stats(f"pkts_sent")
         self.register_counter_stats(f"pkts_failed")
         self.register_cycle_stats(f"{self.get_node_id()}")
         self.register_interval_counter_stats(f"pkts_sent_interval_{self.get_node_id()}", interval = 5)
         self.register_interval_counter_stats(f"{self.get_node_id()}_cumulative_pkts", interval = 1)
+        self.out_handle = self.output_handle(self.get_node_id() + '_out')
 
     def advance(self, cycle):
         """
@@ -35,7 +39,6 @@ class Producer(Node):
 
         # if self.get_node_id() == "A1" or self.get_node_id() == "A2":
         #     return
-        pkt_id = self.get_node_id() + "_" + str(cycle)
 
         # if self.get_node_id() == "A0":
             # stream_rate = 1
@@ -50,16 +53,16 @@ class Producer(Node):
         # if cycle % stream_rate != 0:
         #     return
 
-        output_port = self.get_node_id() + '_out'
-
-        packet = Packet(pkt_id)
+        # the switch has a single output port, so the packets need no destination
+        packet = self.create_pkt(cycle, None)
 
-        if self.send_pkt(packet, output_port, cycle) < 0:
-            logger.warning(f"{self.get_node_id()} unable to send packet {pkt_id}")
+        if self.send_pkt_on(self.out_handle, packet, cycle) < 0:
+            logger.warning("%s unable to send packet %s", self.get_node_id(), packet)
+            self.release_pkt(packet)
             self.incr_counter_stats(f"pkts_failed", 1)
             self.incr_interval_counter_stats(f"{self.get_node_id()}_cumulative_pkts", cycle, self.get_stats().get_counter("pkts_sent"))
         else:
-            logger.debug(f"{self.get_node_id()} sent packet {pkt_id}")
+            logger.debug("%s sent packet %s", self.get_node_id(), packet)
             self.incr_counter_stats(f"pkts_sent", 1)
             self.record_cycle_stats(f"{self.get_node_id()}", cycle, True)
             self.incr_interval_counter_stats(f"pkts_sent_interval_{self.get_node_id()}", cycle, 1)
@@ -36,11 +36,31 @@ class Switch(Node):
     def get_processing_latency(self):
         return self.__processing_latency
 
+    def get_state(self):
+        state = super().get_state()
+        state["rr_index"] = self.__rr_index
+        state["pipeline"] = list(self.__pipeline)
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.__rr_index = state["rr_index"]
+        self.__pipeline = deque(state["pipeline"])
+
+    def is_done(self):
+        return not self.__pipeline
+
     def setup(self):
         self.register_counter_stats(f"pkts_forwarded")
         self.register_cycle_stats(f"{self.get_node_id()}")
         self.register_interval_counter_stats(f"{self.get_node_id()}_cumulative_pkts", interval = 1)
 
+        # resolve the port handles once
+        self.__input_ports = ['S0_in', 'S1_in', 'S2_in']
+        self.__output_port = 'S_out'
+        self.__in_handles = [self.input_handle(port_id) for port_id in self.__input_ports]
+        self.__out_handle = self.output_handle(self.__output_port)
+
     def advance(self, cycle):
         """
         @brief      This method performs a round-robin scheduling scheme to determine which
@@ -48,23 +68,23 @@ class Switch(Node):
         @param      cycle - an integer representing current simulation time
         """
         self.record_cycle_stats(f"{self.get_node_id()}", cycle, False)
-        input_ports = ['S0_in', 'S1_in', 'S2_in']
-        output_port = 'S_out'
+        input_ports = self.__input_ports
+        output_port = self.__output_port
+        in_handles = self.__in_handles
 
         num_inputs = len(input_ports)
 
         # Round-robin over input ports
         for i in range(num_inputs):
-            if self.get_output_port(output_port).get_credit() == 0:
+            if self.get_output_port_at(self.__out_handle).get_credit() == 0:
                 break
 
             port_idx = (self.get_rr_index() + i) % num_inputs
-            input_port = self.get_input_port(input_ports[port_idx])
-            pkt = self.recv_pkt(input_port.get_port_id(), cycle)
+            pkt = self.recv_pkt_on(in_handles[port_idx], cycle)
             if pkt:
-                logger.debug(f"Switch received packet {pkt.get_pkt_id()} from {input_port.get_port_id()}")
+                logger.debug("Switch received packet %s from %s", pkt, input_ports[port_idx])
                 ready_cycle = cycle + self.get_processing_latency()
-                self.get_pipeline().append((ready_cycle, pkt, input_port.get_port_id()))
+                self.get_pipeline().append((ready_cycle, pkt, input_ports[port_idx]))
                 self.set_rr_index((port_idx + 1) % num_inputs)
                 break
 
@@ -72,12 +92,16 @@ class Switch(Node):
         if self.get_pipeline():
             ready_cycle, pkt, input_port_id = self.get_pipeline()[0]
             if ready_cycle == cycle:
-                val = self.send_pkt(pkt, output_port, cycle)
+                val = self.send_pkt_on(self.__out_handle, pkt, cycle)
                 if val == 0:
-                    logger.debug(f"Switch forwarded packet {pkt.get_pkt_id()} from {input_port_id} to {output_port}")
+                    logger.debug("Switch forwarded packet %s from %s to %s", pkt, input_port_id, output_port)
                     self.get_pipeline().popleft()
                     self.incr_counter_stats(f"pkts_forwarded", 1)
                     self.record_cycle_stats(f"{self.get_node_id()}", cycle, True)
                     self.incr_interval_counter_stats(f"{self.get_node_id()}_cumulative_pkts", cycle, self.get_stats().get_counter("pkts_forwarded"))
                 else:
-                    logger.error(f"Switch unable to send packet {pkt.get_pkt_id()}")
+                    logger.error("Switch unable to send packet %s", pkt)
+
+        # sleep until a packet or credit arrives if there is nothing to forward
+        if not self.get_pipeline() and all(self.get_input_port_at(in_h).peek() is None for in_h in in_handles):
+            self.sleep_until_event()
@@ -2,7 +2,6 @@ import logging
 logger = logging.getLogger(__name__)
 
 from node import Node
-from packet import Packet
 
 class Producer(Node):
     def __init__(self):
@@ -18,6 +17,19 @@ class Producer(Node):
         else:
             self.pattern_params = []
 
+    def get_state(self):
+        state = super().get_state()
+        state["pattern_index"] = self.pattern_index
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.pattern_index = state["pattern_index"]
+
+    def is_done(self):
+        # the alternate pattern injects a packet every cycle for ever
+        return not (self.pattern == "alternate" and self.pattern_params)
+
     def setup(self):
         # register the necessary stats
         self.register_counter_stats(f"pkts_sent")
@@ -26,6 +38,9 @@ class Producer(Node):
         self.register_interval_counter_stats(f"pkts_sent_interval_{self.get_node_id()}", interval = 5)
         self.register_interval_counter_stats(f"{self.get_node_id()}_cumulative_pkts", interval = 1)
 
+        # resolve the output port once
+        self.out_handle = self.output_handle(f"{self.get_node_id()}_out")
+
     def advance(self, cycle):
         # record the current cycle stat as not having sent a packet
         self.record_cycle_stats(f"{self.get_node_id()}", cycle, False)
@@ -35,19 +50,21 @@ class Producer(Node):
             dst_id = self.pattern_params[self.pattern_index]
             self.pattern_index = (self.pattern_index + 1) % len(self.pattern_params)
         else:
+            # without a pattern the producer never sends, so it never needs to run again
+            self.sleep_until_event()
             return
 
-        pkt_id = f"{self.get_node_id()}_{cycle}"
-        packet = Packet(pkt_id, dst_id)
-        output_port = f"{self.get_node_id()}_out"
+        packet = self.create_pkt(cycle, dst_id)
 
-        # attempt to send the packet and record the stats
-        if self.send_pkt(packet, output_port, cycle) < 0:
-            logger.warning(f"{self.get_node_id()} unable to send packet {pkt_id}")
+        # attempt to send the packet on the virtual channel with the most credits and record the stats
+        vc = self.get_output_port_at(self.out_handle).select_vc()
+        if vc < 0 or self.send_pkt_on(self.out_handle, packet, cycle, vc) < 0:
+            logger.warning("%s unable to send packet %s", self.get_node_id(), packet)
+            self.release_pkt(packet)
             self.incr_counter_stats(f"pkts_failed", 1)
             self.incr_interval_counter_stats(f"{self.get_node_id()}_cumulative_pkts", cycle, self.get_stats().get_counter("pkts_sent"))
         else:
-            logger.debug(f"{self.get_node_id()} sent packet {pkt_id}")
+            logger.debug("%s sent packet %s", self.get_node_id(), packet)
             self.incr_counter_stats(f"pkts_sent", 1)
             self.record_cycle_stats(f"{self.get_node_id()}", cycle, True)
             self.incr_interval_counter_stats(f"pkts_sent_interval_{self.get_node_id()}", cycle, 1)
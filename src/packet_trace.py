@@ -0,0 +1,337 @@
+"""
+@file       packet_trace.py
+@brief      Records the packet and credit events of a run into a binary trace and decodes
+            it afterwards. Tracing swaps the class of the links and ports for subclasses
+            that record their events, so a run without a trace executes exactly the code
+            it would without this module. The events are written in chunks to a
+            preallocated, memory-mapped ring of fixed-size records that keeps the latest
+            ones when a run produces more than fit.
+            Decode a trace from the src directory: python packet_trace.py ../outputs/trace
+@author     Akshay Joshi
+"""
+
+import os
+import sys
+import csv
+import argparse
+import logging
+
+import numpy as np
+
+from link import Link
+from port import InputPort, OutputPort
+
+logger = logging.getLogger(__name__)
+
+# changes whenever the layout of the records changes
+FORMAT_VERSION = 1
+
+# send:   a packet left an output port
+# arrive: a link delivered a packet into the fifo of an input port
+# recv:   a node took a packet out of an input port
+# credit: a link returned 'count' credits to an output port
+EVENTS = ("send", "arrive", "recv", "credit")
+SEND, ARRIVE, RECV, CREDIT = range(len(EVENTS))
+
+# port is an index into the port table, src and dst are indices into the string table,
+# seq is the ID of the packet as given to its constructor, or -1 - i for a string ID
+# stored at index i of the string table. The packet fields are -1 for credits.
+RECORD = np.dtype([
+    ("cycle", "<i8"), ("event", "u1"), ("vc", "u1"), ("count", "<u2"),
+    ("port", "<i4"), ("src", "<i4"), ("dst", "<i4"), ("seq", "<i8"),
+])
+
+# separates the strings of the string table, which never occurs in node or port IDs
+SEPARATOR = "\0"
+
+# the tracer the traced links and ports record to, set by Tracer.attach
+_tracer = None
+
+class TracedLink(Link):
+    """
+    @class      TracedLink
+    @brief      Tells the tracer the cycle of the deliveries, which the input and output
+                ports are not given.
+    """
+    __slots__ = ()
+
+    def advance(self, current_cycle):
+        _tracer.cycle = current_cycle
+        Link.advance(self, current_cycle)
+
+class TracedInputPort(InputPort):
+    __slots__ = ()
+
+    def push_pkt(self, pkt):
+        _tracer.record_pkt(ARRIVE, _tracer.cycle, self, pkt)
+        InputPort.push_pkt(self, pkt)
+
+    def pop_pkt(self, current_cycle, vc=0):
+        pkt = InputPort.pop_pkt(self, current_cycle, vc)
+        if pkt is not None:
+            _tracer.record_pkt(RECV, current_cycle, self, pkt)
+        return pkt
+
+class TracedOutputPort(OutputPort):
+    __slots__ = ()
+
+    def push_pkt(self, pkt, current_cycle):
+        status = OutputPort.push_pkt(self, pkt, current_cycle)
+        if status == 0:
+            _tracer.record_pkt(SEND, current_cycle, self, pkt)
+        return status
+
+    def add_credit(self, count, vc=0):
+        _tracer.record_credit(_tracer.cycle, self, count, vc)
+        OutputPort.add_credit(self, count, vc)
+
+
+class Tracer:
+    """
+    @class      Tracer
+    @brief      Writes a trace directory with one .npy file per array: the records, the
+                string table of the node, port and packet IDs, the port table with the
+                node and port ID of every port, and the number of records written. The
+                records are buffered as tuples and converted in chunks, so recording an
+                event costs a few dictionary lookups and a list append.
+    """
+    def __init__(self, trace_dir, capacity=1 << 22, chunk=1 << 16):
+        """
+        @brief      A constructor for the Tracer class.
+        @param      trace_dir - path to the directory of the trace, created when needed.
+        @param      capacity - number of records kept, the oldest ones are overwritten
+                    once more are written.
+        @param      chunk - number of records buffered before they are written out.
+        """
+        assert capacity > 0, "Error: trace capacity should be positive"
+        assert chunk > 0, "Error: trace chunk size should be positive"
+        self.__trace_dir = trace_dir
+        self.__capacity = capacity
+        self.__chunk = min(chunk, capacity)
+        self.__strings = {}
+        self.__port_index = {}
+        self.__ports = []
+        self.__pending = []
+        self.__total = 0
+        self.__ring = None
+        self.cycle = 0
+
+    def __intern(self, value):
+        return self.__strings.setdefault(value, len(self.__strings))
+
+    def attach(self, links):
+        """
+        @brief      Makes the links and their ports record to this tracer and creates the
+                    ring file. Must be called after the network is built.
+        @param      links - the Link objects of the network.
+        """
+        global _tracer
+        _tracer = self
+        for link in links:
+            for port in (link.get_output_port(), link.get_input_port()):
+                self.__port_index[port] = len(self.__ports)
+                self.__ports.append((self.__intern(port.get_node().get_node_id()), self.__intern(port.get_port_id())))
+            link.get_output_port().__class__ = TracedOutputPort
+            link.get_input_port().__class__ = TracedInputPort
+            link.__class__ = TracedLink
+
+        os.makedirs(self.__trace_dir, exist_ok = True)
+        self.__ring = np.lib.format.open_memmap(os.path.join(self.__trace_dir, "records.npy"), mode = "w+",
+                                                dtype = RECORD, shape = (self.__capacity,))
+
+    def record_pkt(self, event, cycle, port, pkt):
+        seq = pkt.get_seq()
+        if not isinstance(seq, int):
+            seq = -1 - self.__intern(str(seq))
+        src = pkt.get_src_node_id()
+        strings = self.__strings
+        self.__pending.append((cycle, event, pkt.get_vc(), 1, self.__port_index[port],
+                               -1 if src is None else strings.setdefault(src, len(strings)),
+                               strings.setdefault(pkt.get_dst_node_id(), len(strings)), seq))
+        if len(self.__pending) >= self.__chunk:
+            self.__flush()
+
+    def record_credit(self, cycle, port, count, vc):
+        self.__pending.append((cycle, CREDIT, vc, count, self.__port_index[port], -1, -1, -1))
+        if len(self.__pending) >= self.__chunk:
+            self.__flush()
+
+    def __flush(self):
+        """
+        @brief      Writes the buffered records into the ring, wrapping around at its end.
+        """
+        if not self.__pending:
+            return
+        records = np.array(self.__pending, dtype = RECORD)
+        self.__pending = []
+        capacity = self.__capacity
+        pos = self.__total % capacity
+        first = min(len(records), capacity - pos)
+        self.__ring[pos:pos + first] = records[:first]
+        self.__ring[:len(records) - first] = records[first:]
+        self.__total += len(records)
+
+    def close(self):
+        """
+        @brief      Writes the remaining records and the tables. A ring that was not
+                    filled is shrunk to the records written.
+        """
+        global _tracer
+        if self.__ring is None:
+            return
+        self.__flush()
+        records_path = os.path.join(self.__trace_dir, "records.npy")
+        if self.__total < self.__capacity:
+            used = np.array(self.__ring[:self.__total])
+            del self.__ring
+            np.save(records_path, used)
+        else:
+            self.__ring.flush()
+            del self.__ring
+        self.__ring = None
+
+        for value in self.__strings:
+            assert SEPARATOR not in value, f"Error: {value!r} cannot be stored in the trace"
+        np.save(os.path.join(self.__trace_dir, "strings.npy"),
+                np.frombuffer(SEPARATOR.join(self.__strings).encode(), dtype = np.uint8))
+        np.save(os.path.join(self.__trace_dir, "ports.npy"), np.array(self.__ports, dtype = np.int32).reshape(-1, 2))
+        np.save(os.path.join(self.__trace_dir, "meta.npy"), np.array([FORMAT_VERSION, self.__total, self.__capacity], dtype = np.int64))
+        _tracer = None
+        kept = min(self.__total, self.__capacity)
+        logger.info(f"Wrote {kept} of {self.__total} trace records to {self.__trace_dir}")
+
+    def get_trace_dir(self):
+        return self.__trace_dir
+
+
+def load_trace(trace_dir):
+    """
+    @brief      Loads a trace written by Tracer, with the records memory-mapped.
+    @param      trace_dir - path to the trace directory.
+    @return     a tuple with the records in the order they were written, the string table
+                as a list, the port table as an (n, 2) array and the number of records
+                written, which exceeds the number of records if the ring wrapped around.
+    """
+    version, total, capacity = np.load(os.path.join(trace_dir, "meta.npy")).tolist()
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Trace format {version} is not supported, expected {FORMAT_VERSION}")
+    records = np.load(os.path.join(trace_dir, "records.npy"), mmap_mode = "r")
+    if total > capacity:
+        # the oldest record is the one after the last written
+        pos = total % capacity
+        records = np.concatenate((records[pos:], records[:pos]))
+    strings = np.load(os.path.join(trace_dir, "strings.npy")).tobytes().decode().split(SEPARATOR)
+    ports = np.load(os.path.join(trace_dir, "ports.npy"))
+    return records, strings, ports, total
+
+def decode(records, strings, ports):
+    """
+    @brief      Turns records into readable rows.
+    @return     a generator of (cycle, event, node, port, vc, packet, count) tuples, where
+                packet is the ID returned by Packet.get_pkt_id, or None for credits.
+    """
+    for cycle, event, vc, count, port, src, dst, seq in records.tolist():
+        node_idx, port_idx = ports[port]
+        packet = None
+        if event != CREDIT:
+            pkt_id = seq if seq >= 0 else strings[-1 - seq]
+            packet = pkt_id if src < 0 else f"{strings[src]}_{pkt_id}"
+        yield cycle, EVENTS[event], strings[node_idx], strings[port_idx], vc, packet, count
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "trace",
+        type = str,
+        help = "Path to the trace directory written with --trace"
+    )
+    parser.add_argument(
+        "--events",
+        type = str,
+        nargs = "+",
+        default = list(EVENTS),
+        choices = list(EVENTS),
+        help = "Events to decode (default: all)"
+    )
+    parser.add_argument(
+        "--node",
+        type = str,
+        default = None,
+        help = "Only decode the events at the ports of this node"
+    )
+    parser.add_argument(
+        "--packet",
+        type = str,
+        default = None,
+        help = "Only decode the events of this packet, e.g. A0_42"
+    )
+    parser.add_argument(
+        "--start",
+        type = int,
+        default = None,
+        help = "First cycle to decode"
+    )
+    parser.add_argument(
+        "--end",
+        type = int,
+        default = None,
+        help = "Cycle to stop decoding at"
+    )
+    parser.add_argument(
+        "--summary",
+        action = "store_true",
+        help = "Print the number of events of every type instead of the events"
+    )
+    parser.add_argument(
+        "--output",
+        type = str,
+        default = None,
+        help = "Path of a csv file to write the events to instead of printing them"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        records, strings, ports, total = load_trace(args.trace)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Error: {e}")
+
+    # the filters on integer fields run on the whole array before anything is decoded
+    mask = np.isin(records["event"], [EVENTS.index(event) for event in args.events])
+    if args.start is not None:
+        mask &= records["cycle"] >= args.start
+    if args.end is not None:
+        mask &= records["cycle"] < args.end
+    if args.node is not None:
+        node_ports = np.flatnonzero(np.array([strings[node] == args.node for node in ports[:, 0]], dtype = bool))
+        mask &= np.isin(records["port"], node_ports)
+    selected = records[mask]
+
+    if args.summary:
+        if total > len(records):
+            print(f"The ring kept the last {len(records)} of {total} records")
+        if len(selected):
+            print(f"Cycles {selected['cycle'].min()} to {selected['cycle'].max()}")
+        counts = np.bincount(selected["event"], minlength = len(EVENTS))
+        for event, count in zip(EVENTS, counts.tolist()):
+            print(f"{event:<8}{count:>12}")
+        sys.exit(0)
+
+    rows = decode(selected, strings, ports)
+    if args.packet is not None:
+        rows = (row for row in rows if row[5] is not None and str(row[5]) == args.packet)
+
+    header = ["cycle", "event", "node", "port", "vc", "packet", "count"]
+    if args.output is not None:
+        with open(args.output, "w", newline = '') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        print(f"Events can be found in {args.output}")
+    else:
+        print(f"{'cycle':>10} {'event':<7} {'node':<16} {'port':<16} {'vc':>3} {'packet':<20} {'count':>5}")
+        for cycle, event, node, port, vc, packet, count in rows:
+            print(f"{cycle:>10} {event:<7} {node:<16} {port:<16} {vc:>3} {str(packet or '-'):<20} {count:>5}")
@@ -0,0 +1,301 @@
+"""
+@file       parallel.py
+@brief      Implements a conservative parallel simulation that splits the network into
+            partitions, each simulated by a separate worker process.
+@author     Akshay Joshi
+"""
+
+import sys
+import math
+import traceback
+import multiprocessing
+import logging
+from collections import deque
+from typing import Dict, List
+
+from node import Node
+from parser import NodeSetup
+from simulator import Simulator
+
+logger = logging.getLogger(__name__)
+
+def partition_nodes(parser, num_partitions):
+    """
+    @brief      Splits the nodes into balanced partitions of neighbouring nodes. Nodes are
+                ordered by a breadth-first traversal of the topology so that connected
+                nodes tend to end up in the same partition.
+    @param      parser - parsed data that contains the nodes and connections.
+    @param      num_partitions - number of partitions to create.
+    @return     a list of lists of node IDs, one list per partition.
+    """
+    assert num_partitions > 0, "Error: number of partitions should be positive"
+    neighbours: Dict[str, List[str]] = {node.get_node_id(): [] for node in parser.nodes}
+    for data in parser.connections:
+        neighbours[data.get_src_node()].append(data.get_dst_node())
+        neighbours[data.get_dst_node()].append(data.get_src_node())
+
+    order = []
+    visited = set()
+    for root in neighbours:
+        if root in visited:
+            continue
+        visited.add(root)
+        queue = deque([root])
+        while queue:
+            node_id = queue.popleft()
+            order.append(node_id)
+            for next_id in neighbours[node_id]:
+                if next_id not in visited:
+                    visited.add(next_id)
+                    queue.append(next_id)
+
+    size = math.ceil(len(order) / num_partitions)
+    return [order[i:i + size] for i in range(0, len(order), size)]
+
+class RemoteNode(Node):
+    """
+    @class      RemoteNode
+    @brief      Stands in for a node of another partition at the far end of a boundary
+                link, so that the local port of the link belongs to a node. Its setup and
+                advance do nothing and it is never advanced.
+    """
+    def set_pattern(self, pattern, params):
+        pass
+
+    def setup(self):
+        pass
+
+    def advance(self, current_cycle):
+        pass
+
+
+class RemoteRouter(RemoteNode):
+    """
+    @class      RemoteRouter
+    @brief      A RemoteNode for a router, which local switches tell apart from a terminal
+                upstream of their inputs.
+    """
+    def set_routing_table(self, table):
+        pass
+
+
+class PartitionParser:
+    """
+    @class      PartitionParser
+    @brief      The parsed data of one partition: the nodes of the partition, the links that
+                touch them and a RemoteNode or RemoteRouter for every node of another
+                partition at the far end of such a link. The entries keep the order of the
+                whole network, so every node gets its port handles in the same order and the
+                routing tables of the whole network stay valid.
+    """
+    def __init__(self, parser, node_ids, routers):
+        """
+        @brief      A constructor for the PartitionParser class.
+        @param      parser - parsed data of the whole network.
+        @param      node_ids - IDs of the nodes that belong to the partition.
+        @param      routers - set of IDs of the nodes that forward packets.
+        """
+        local = set(node_ids)
+        self.connections = [data for data in parser.connections
+                            if data.get_src_node() in local or data.get_dst_node() in local]
+        remote = {node_id for data in self.connections for node_id in (data.get_src_node(), data.get_dst_node())}
+        remote -= local
+        self.nodes = []
+        for node in parser.nodes:
+            node_id = node.get_node_id()
+            if node_id in local:
+                self.nodes.append(node)
+            elif node_id in remote:
+                self.nodes.append(NodeSetup(__name__, "RemoteRouter" if node_id in routers else "RemoteNode", node_id))
+        self.__user_nodes_dir = parser.get_user_nodes_dir()
+
+    def parse(self):
+        # the entries are taken from the parsed data of the coordinator, only the user
+        # modules have to be found
+        if self.__user_nodes_dir not in sys.path:
+            sys.path.append(self.__user_nodes_dir)
+
+    def get_user_nodes_dir(self):
+        return self.__user_nodes_dir
+
+
+def _run_worker(max_cycles, parser, routing, routing_policy, tables, node_ids, conn):
+    """
+    @brief      Entry point of a worker process. Builds the nodes of its partition and the
+                links that touch them, then simulates them window by window as instructed
+                by the coordinator.
+    @param      max_cycles - number of cycles to simulate.
+    @param      parser - PartitionParser of the partition.
+    @param      routing, routing_policy - routing algorithm and policy, see Simulator.
+    @param      tables - routing tables of the routers of the partition.
+    @param      node_ids - IDs of the nodes that belong to this partition.
+    @param      conn - pipe connection to the coordinator.
+    """
+    try:
+        sim = Simulator(max_cycles, parser, routing = routing, routing_policy = routing_policy)
+        sim.set_routing_tables(tables)
+        sim.setup()
+
+        local = set(node_ids)
+        nodes = [sim.get_node(node_id) for node_id in node_ids]
+        links = sim.get_links()
+        remote_links = []
+        for data in parser.connections:
+            src_local = data.get_src_node() in local
+            dst_local = data.get_dst_node() in local
+            if src_local != dst_local:
+                link = sim.get_link(data.get_link_id())
+                link.set_remote(not dst_local, not src_local)
+                remote_links.append(link)
+
+        conn.send(("ready", None))
+        while True:
+            msg = conn.recv()
+            if msg is None:
+                break
+            start, end, inbox = msg
+            for link_id, *entry in inbox:
+                sim.get_link(link_id).inject(*entry)
+
+            for cycle in range(start, end):
+                for link in links:
+                    link.advance(cycle)
+                for node in nodes:
+                    if node.is_awake(cycle):
+                        node.advance(cycle)
+
+            outbox = []
+            for link in remote_links:
+                link_id = link.get_link_id()
+                outbox.extend((link_id,) + entry for entry in link.pop_outbox())
+            conn.send(("window", outbox))
+
+        conn.send(("stats", {node.get_node_id(): node.get_stats() for node in nodes if node.has_stats()}))
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+class ParallelSimulator:
+    """
+    @class      ParallelSimulator
+    @brief      Runs the simulation across worker processes. Every link has a latency of at
+                least one cycle, so packets and credits pushed into a link that crosses a
+                partition boundary cannot be delivered before the minimum latency of those
+                links has elapsed. The workers therefore simulate windows of that many
+                cycles independently and exchange the boundary traffic in batches between
+                windows, which gives the same results as the serial simulation.
+    """
+    def __init__(self, max_cycles, parser, num_partitions, routing="shortest", routing_policy="static"):
+        assert num_partitions > 1, "Error: parallel simulation needs more than one partition"
+        self.__max_cycles = max_cycles
+        self.__parser = parser
+        self.__num_partitions = num_partitions
+        self.__routing = routing
+        self.__routing_policy = routing_policy
+        self.__sim = Simulator(max_cycles, parser, routing = routing, routing_policy = routing_policy)
+        self.__partitions = []
+        self.__partition_parsers = []
+        self.__receivers: Dict[str, List[int]] = {}
+        self.__lookahead = max_cycles
+
+    def setup(self):
+        """
+        @brief      Builds the network, partitions it and computes the lookahead window. The
+                    coordinator keeps the whole network to compute the routing tables once
+                    and to collect the stats, the workers only build their partition.
+        """
+        self.__sim.setup()
+        self.__partitions = partition_nodes(self.__parser, self.__num_partitions)
+        routers = set(self.__sim.get_routing_tables())
+        self.__partition_parsers = [PartitionParser(self.__parser, node_ids, routers) for node_ids in self.__partitions]
+
+        owner = {}
+        for idx, node_ids in enumerate(self.__partitions):
+            for node_id in node_ids:
+                owner[node_id] = idx
+
+        for data in self.__parser.connections:
+            src_owner = owner[data.get_src_node()]
+            dst_owner = owner[data.get_dst_node()]
+            if src_owner != dst_owner:
+                # data packets are delivered on the destination side, credits on the source side
+                self.__receivers[data.get_link_id()] = [dst_owner, src_owner]
+                self.__lookahead = min(self.__lookahead, data.get_latency())
+
+        logger.info(f"Parallel simulation with {len(self.__partitions)} partitions, "
+                    f"{len(self.__receivers)} boundary links and a lookahead of {self.__lookahead} cycles")
+
+    def __receive(self, conn):
+        kind, payload = conn.recv()
+        if kind == "error":
+            raise RuntimeError(f"Worker process failed:\n{payload}")
+        return payload
+
+    def run(self):
+        """
+        @brief      Runs the worker processes window by window and routes the packets and
+                    credits that cross the partition boundaries.
+        """
+        workers = []
+        conns = []
+        tables = self.__sim.get_routing_tables()
+        for node_ids, parser in zip(self.__partitions, self.__partition_parsers):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            local_tables = {node_id: tables[node_id] for node_id in node_ids if node_id in tables}
+            worker = multiprocessing.Process(
+                target = _run_worker,
+                args = (self.__max_cycles, parser, self.__routing, self.__routing_policy,
+                        local_tables, node_ids, child_conn)
+            )
+            worker.start()
+            child_conn.close()
+            workers.append(worker)
+            conns.append(parent_conn)
+
+        try:
+            for conn in conns:
+                self.__receive(conn)
+
+            inboxes = [[] for _ in conns]
+            for start in range(0, self.__max_cycles, self.__lookahead):
+                end = min(start + self.__lookahead, self.__max_cycles)
+                for conn, inbox in zip(conns, inboxes):
+                    conn.send((start, end, inbox))
+
+                inboxes = [[] for _ in conns]
+                for conn in conns:
+                    for entry in self.__receive(conn):
+                        data_receiver, credit_receiver = self.__receivers[entry[0]]
+                        receiver = credit_receiver if entry[1] is None else data_receiver
+                        inboxes[receiver].append(entry)
+
+            for conn in conns:
+                conn.send(None)
+            for conn in conns:
+                for node_id, stats in self.__receive(conn).items():
+                    self.__sim.get_node(node_id).set_stats(stats)
+        finally:
+            for conn in conns:
+                conn.close()
+            for worker in workers:
+                worker.join()
+
+        print(f"Simulation completed. \nLog files, statistics and plots can be found in ../outputs/ directory")
+
+    def set_plotter(self, plotter):
+        self.__sim.set_plotter(plotter)
+
+    def set_topology_cache(self, cache):
+        """
+        @brief      Uses the cache in the coordinator, which hands the routing tables to the
+                    workers. Must be called before setup.
+        """
+        self.__sim.set_topology_cache(cache)
+
+    def teardown(self):
+        """
+        @brief      Calls the teardown method for each node with the stats collected by the workers.
+        """
+        self.__sim.teardown()
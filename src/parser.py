@@ -9,12 +9,15 @@ import csv
 import sys
 
 class NodeSetup:
-    def __init__(self, module_name, class_name, node_id, pattern=None, pattern_params=None):
+    def __init__(self, module_name, class_name, node_id, pattern=None, pattern_params=None, algorithm=None,
+                 algorithm_params=None):
         self.module_name = module_name
         self.class_name = class_name
         self.node_id = node_id
         self.pattern = pattern
         self.pattern_params = pattern_params
+        self.algorithm = algorithm
+        self.algorithm_params = algorithm_params
     
     # -------------------------------
     # Getters for the node attributes
@@ -34,8 +37,14 @@ class NodeSetup:
     def get_pattern_params(self):
         return self.pattern_params
 
+    def get_algorithm(self):
+        return self.algorithm
+
+    def get_algorithm_params(self):
+        return self.algorithm_params
+
 class ConnectionSetup:
-    def __init__(self, src_node, op_id, dst_node, ip_id, credit, fifo_size, latency):
+    def __init__(self, src_node, op_id, dst_node, ip_id, credit, fifo_size, latency, vcs=1):
         self.src_node = src_node
         self.op_id = op_id
         self.dst_node = dst_node
@@ -43,6 +52,7 @@ class ConnectionSetup:
         self.credit = credit
         self.fifo_size = fifo_size
         self.latency = latency
+        self.vcs = vcs
         self.link_id = f"link_{src_node}_{op_id}_to_{dst_node}_{ip_id}"
 
     # -------------------------------------
@@ -69,6 +79,9 @@ class ConnectionSetup:
     def get_latency(self):
         return self.latency
 
+    def get_vcs(self):
+        return self.vcs
+
     def get_link_id(self):
         return self.link_id
 
@@ -108,8 +121,11 @@ class Parser:
             node_id = row["node_id"]
             pattern = row.get("pattern", None)
             pattern_params = row.get("pattern_params", None)
+            # the algorithm columns are optional and only used by switches
+            algorithm = row.get("algorithm", None)
+            algorithm_params = row.get("algorithm_params", None)
 
-            node = NodeSetup(module_name, class_name, node_id, pattern, pattern_params)
+            node = NodeSetup(module_name, class_name, node_id, pattern, pattern_params, algorithm, algorithm_params)
             self.nodes.append(node)
 
     def __parse_connections(self):
@@ -124,13 +140,35 @@ class Parser:
                 credit = int(row["credit"])
                 fifo_size = int(row["fifo_size"])
                 latency = int(row["latency"])
+                # the vcs column is optional, credit and fifo_size are per virtual channel
+                vcs = int(row.get("vcs") or 1)
             except ValueError:
                 raise ValueError(f"Invalid integer")
             
-            connection = ConnectionSetup(src_node, op_id, dst_node, ip_id, credit, fifo_size, latency)
+            connection = ConnectionSetup(src_node, op_id, dst_node, ip_id, credit, fifo_size, latency, vcs)
             self.connections.append(connection)
 
+    def get_user_nodes_dir(self):
+        return self.__user_nodes_dir
+
+    def fingerprint(self):
+        """
+        @brief      Returns the contents of the input files, which identify the network
+                    without parsing it, see topology_cache.py.
+        @return     a bytes object.
+        """
+        contents = []
+        for filepath in (self.__node_config, self.__connection_config):
+            if not os.path.exists(filepath):
+                raise FileNotFoundError(f"File does not exist: {filepath}")
+            with open(filepath, "rb") as f:
+                contents.append(f.read())
+        return b"\0".join(contents)
+
     def parse(self):
+        # parsing again (e.g. in a worker process) must not duplicate the entries
+        self.nodes = []
+        self.connections = []
         self.__parse_nodes()
         self.__parse_connections()
         if self.__user_nodes_dir not in os.sys.path:
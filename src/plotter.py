@@ -0,0 +1,148 @@
+"""
+@file       plotter.py
+@brief      Renders the statistics plots, optionally in a process pool, downsampling long
+            series so that the cost of a plot does not grow with the length of the run.
+@author     Akshay Joshi
+"""
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import logging
+logger = logging.getLogger(__name__)
+
+# maximum number of bars or markers drawn per plot
+MAX_POINTS = 1000
+
+def bin_series(x, y, max_points):
+    """
+    @brief      Averages consecutive points of a series so that at most max_points remain.
+    @param      x - numpy array of x values, sorted.
+    @param      y - numpy array of y values.
+    @param      max_points - maximum number of points to keep.
+    @return     (x, y, bin_size) where x is the first x value of every bin and y the mean
+                of the bin. bin_size is 1 if the series was short enough already.
+    """
+    if len(y) <= max_points:
+        return x, y, 1
+    bin_size = math.ceil(len(y) / max_points)
+    starts = np.arange(0, len(y), bin_size)
+    sums = np.add.reduceat(y.astype(float), starts)
+    counts = np.diff(np.append(starts, len(y)))
+    return x[starts], sums / counts, bin_size
+
+def render_cycle_map(values, name, max_points):
+    """
+    @brief      Renders the activity per cycle of a cycle map. Long runs are shown as the
+                fraction of active cycles per bin of cycles.
+    @param      values - numpy boolean array indexed by cycle.
+    @param      name - name of the cycle map, used for the title and the filename.
+    @param      max_points - maximum number of bars to draw.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    cycles, activity, bin_size = bin_series(np.arange(len(values)), values, max_points)
+
+    plt.figure(figsize = (10, 4))
+    if bin_size == 1:
+        plt.bar(cycles, activity, color = 'skyblue', edgecolor = 'black', width = 0.8)
+        plt.ylabel(f"(1=Yes, 0=No)")
+    else:
+        # a single filled step outline is much cheaper to render than one bar per bin
+        edges = np.append(cycles, len(values))
+        plt.stairs(activity, edges, fill = True, color = 'skyblue')
+        plt.ylabel(f"Fraction of active cycles (bins of {bin_size})")
+    plt.title(f"Activity per Cycle - {name}")
+    plt.xlabel("Cycle")
+    plt.ylim(0, 1.2)
+    plt.grid(axis = 'y', linestyle = '--', alpha = 0.7)
+
+    filename = f"../outputs/{name}_log.png"
+    plt.tight_layout()
+    plt.savefig(filename)
+    plt.close()
+
+def render_interval_counter(buckets, label, interval, max_points):
+    """
+    @brief      Renders the values of an interval counter. Long runs are shown as the mean
+                over groups of consecutive intervals.
+    @param      buckets - dict mapping the first cycle of an interval to its value.
+    @param      label - name of the counter, used for the title and the filename.
+    @param      interval - number of cycles per interval.
+    @param      max_points - maximum number of markers to draw.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    x = np.array(sorted(buckets.keys()), dtype = np.int64)
+    y = np.array([buckets[i] for i in x])
+    x, y, bin_size = bin_series(x, y, max_points)
+
+    plt.figure(figsize=(10, 4))
+    if bin_size == 1:
+        plt.plot(x, y, marker = 'o')
+        plt.xlabel(f"Cycle interval (every {interval} cycles)")
+    else:
+        plt.plot(x, y)
+        plt.xlabel(f"Cycle interval (every {interval} cycles, mean over {bin_size} intervals)")
+    plt.ylabel("Packets sent")
+    plt.title(f"{label}")
+    plt.grid(True)
+    filename = f"../outputs/{label}.png"
+    plt.savefig(filename)
+    plt.close()
+
+
+class Plotter:
+    """
+    @class      Plotter
+    @brief      Collects the plots requested by the stats of every node and renders them
+                either immediately or in a pool of worker processes.
+    """
+    def __init__(self, enabled=True, workers=1, max_points=MAX_POINTS):
+        """
+        @brief      A constructor for the Plotter class.
+        @param      enabled - if False, plot requests are ignored.
+        @param      workers - number of worker processes; 1 renders in the calling process.
+        @param      max_points - maximum number of points drawn per plot.
+        """
+        assert workers > 0, "Error: number of plot workers should be positive"
+        assert max_points > 0, "Error: maximum number of plot points should be positive"
+        self.__enabled = enabled
+        self.__workers = workers
+        self.__max_points = max_points
+        self.__pool = None
+        self.__futures = []
+
+    def __submit(self, fn, *args):
+        if not self.__enabled:
+            return
+        if self.__workers == 1:
+            fn(*args, self.__max_points)
+            return
+        if self.__pool is None:
+            self.__pool = ProcessPoolExecutor(max_workers = self.__workers)
+        self.__futures.append(self.__pool.submit(fn, *args, self.__max_points))
+
+    def plot_cycle_map(self, values, name):
+        self.__submit(render_cycle_map, values, name)
+
+    def plot_interval_counter(self, buckets, label, interval):
+        self.__submit(render_interval_counter, dict(buckets), label, interval)
+
+    def close(self):
+        """
+        @brief      Waits for all submitted plots to be rendered.
+        """
+        if self.__pool is None:
+            return
+        try:
+            for future in self.__futures:
+                future.result()
+        finally:
+            self.__pool.shutdown()
+            self.__pool = None
+            self.__futures = []
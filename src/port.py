@@ -4,10 +4,7 @@
 @author     Akshay Joshi
 """
 
-from collections import deque
-
 from link import Link
-from packet import Packet, CreditPacket
 
 import logging
 logger = logging.getLogger(__name__)
@@ -16,6 +13,8 @@ class Port:
     """
     @class      Port
     """
+    __slots__ = ("__port_id", "__connected_link", "__node")
+
     def __init__(self, port_id, link):
         """
         @brief      A constructor for the Port class.
@@ -27,6 +26,7 @@ class Port:
 
         self.__port_id = port_id
         self.__connected_link = link
+        self.__node = None
 
     def get_port_id(self):
         """
@@ -42,87 +42,191 @@ class Port:
         """
         return self.__connected_link
 
+    def set_node(self, node):
+        """
+        @brief      Sets the Node that owns the port.
+        @param      node - the Node object the port has been added to.
+        """
+        self.__node = node
+
+    def get_node(self):
+        """
+        @brief      Returns the Node that owns the port.
+        @return     node - the Node object, or None if the port is not added to a node.
+        """
+        return self.__node
+
+    def notify_node(self):
+        """
+        @brief      Notifies the owning node that a packet or credit has arrived, so that
+                    a node sleeping on port events is woken up.
+        """
+        if self.__node is not None:
+            self.__node.notify_port_event()
+
 class InputPort(Port):
     """
     @class      InputPort
+    @brief      An input port with one fifo per virtual channel. A packet is buffered in
+                the fifo of the virtual channel it carries, so a blocked packet only holds
+                up the packets behind it on the same virtual channel.
     """
-    def __init__(self, port_id, max_size, link):
+    __slots__ = ("__max_size", "__fifos")
+
+    def __init__(self, port_id, max_size, link, num_vcs=1):
         """
         @brief      A constructor for the InputPort class.
+        @param      max_size - size of the fifo of every virtual channel.
+        @param      num_vcs - number of virtual channels.
         """
         assert isinstance(max_size, int), "Error: max_size should be an integer"
         assert max_size > 0, "Error: max_size should be greater than zero"
+        assert isinstance(num_vcs, int) and num_vcs > 0, "Error: number of virtual channels should be a positive integer"
         super().__init__(port_id, link)
         self.__max_size = max_size
-        self.__fifo = deque()
+        # lists are much smaller than deques and every fifo is at most max_size long
+        self.__fifos = [[] for _ in range(num_vcs)]
+
+    def get_num_vcs(self):
+        return len(self.__fifos)
 
-    def peek(self):
+    def peek(self, vc=0):
         """
         @brief      Returns the packet at the front of the fifo without removing it.
+        @param      vc - the virtual channel.
         @return     The packet at the front of the fifo, or None if empty.
         """
-        if len(self.__fifo) > 0:
-            return self.__fifo[0]
+        fifo = self.__fifos[vc]
+        if len(fifo) > 0:
+            return fifo[0]
         return None
 
-    def pop_pkt(self, current_cycle):
+    def is_empty(self):
+        """
+        @brief      Checks whether the fifos of all virtual channels are empty.
         """
-        @brief      Receive the packet from its fifo, if present.
+        for fifo in self.__fifos:
+            if fifo:
+                return False
+        return True
+
+    def pop_pkt(self, current_cycle, vc=0):
+        """
+        @brief      Receive the packet from its fifo, if present, and return a credit for
+                    the virtual channel to the sender.
         @param      current_cycle - the current simulation time.
+        @param      vc - the virtual channel.
         @return     the received pkt on success, None otherwise.
         """
-        fifo = self.__fifo
+        fifo = self.__fifos[vc]
         if len(fifo) > 0:
-            connected_link = self.get_connected_link()
-            credit_pkt = CreditPacket()
-            status = connected_link.push_pkt(credit_pkt, current_cycle)
-            if status < 0:
-                return None
-            return fifo.popleft()
+            self.get_connected_link().push_credit(current_cycle, 1, vc)
+            return fifo.pop(0)
         
         return None
 
+    def get_state(self):
+        """
+        @brief      Returns a snapshot of the port state for checkpointing.
+        @return     a dict with the packets in the fifo of every virtual channel.
+        """
+        return {"fifos": [list(fifo) for fifo in self.__fifos]}
+
+    def set_state(self, state):
+        """
+        @brief      Restores the port state from a checkpoint.
+        @param      state - dict returned by get_state.
+        """
+        self.__fifos = [list(fifo) for fifo in state["fifos"]]
+
     def push_pkt(self, pkt):
         """
-        @brief      Pushes the packet to its fifo.
+        @brief      Pushes the packet to the fifo of its virtual channel.
         @param      pkt - the packet to be pushed.
         """
-        if len(self.__fifo) < self.__max_size:
-            self.__fifo.append(pkt)
+        fifo = self.__fifos[pkt.get_vc()]
+        if len(fifo) < self.__max_size:
+            fifo.append(pkt)
+        self.notify_node()
 
 
 class OutputPort(Port):
     """
     @class      OutputPort
+    @brief      An output port with one credit counter per virtual channel. The virtual
+                channels share the link, so at most one packet is sent per cycle.
     """
-    def __init__(self, port_id, credit, link):
+    __slots__ = ("__recent_sent_cycle", "__credits", "__max_credit")
+
+    def __init__(self, port_id, credit, link, num_vcs=1):
         """
         @brief      A constructor for the OutputPort class.
+        @param      credit - initial credit of every virtual channel.
+        @param      num_vcs - number of virtual channels.
         """
         assert isinstance(credit, int), "Error: credit should be an integer"
         assert credit > 0, "Error: initial credit should be greater than zero"
+        assert isinstance(num_vcs, int) and num_vcs > 0, "Error: number of virtual channels should be a positive integer"
         super().__init__(port_id, link)
         self.__recent_sent_cycle = -1
-        self.__credit = credit
+        self.__credits = [credit] * num_vcs
+        self.__max_credit = credit
+
+    def get_num_vcs(self):
+        return len(self.__credits)
 
-    def get_credit(self):
-        return self.__credit
+    def get_credit(self, vc=0):
+        return self.__credits[vc]
 
-    def __increment_credit(self):
+    def get_occupancy(self):
         """
-        @brief      Increments the credit by one.
+        @brief      Returns the number of packets sent on the port that have not been credited
+                    back yet, i.e. the packets in flight and buffered downstream, over all
+                    virtual channels.
         """
-        self.__credit += 1
+        return self.__max_credit * len(self.__credits) - sum(self.__credits)
 
-    def __decrement_credit(self):
+    def select_vc(self):
         """
-        @brief      Decrements the credit by one.
+        @brief      Allocates a virtual channel for the next packet: the one with the most
+                    credits, the lowest one on a tie.
+        @return     the virtual channel, or -1 if none has a credit.
         """
-        self.__credit -= 1
-        
+        credits = self.__credits
+        if len(credits) == 1:
+            return 0 if credits[0] > 0 else -1
+        best = max(credits)
+        if best <= 0:
+            return -1
+        return credits.index(best)
+
+    def get_state(self):
+        """
+        @brief      Returns a snapshot of the port state for checkpointing.
+        @return     a dict with the available credits and the last cycle a packet was sent.
+        """
+        return {"credits": list(self.__credits), "recent_sent_cycle": self.__recent_sent_cycle}
+
+    def set_state(self, state):
+        """
+        @brief      Restores the port state from a checkpoint.
+        @param      state - dict returned by get_state.
+        """
+        self.__credits = list(state["credits"])
+        self.__recent_sent_cycle = state["recent_sent_cycle"]
+
+    def add_credit(self, count, vc=0):
+        """
+        @brief      Adds the credits delivered by the connected link.
+        @param      count - number of credits delivered.
+        @param      vc - the virtual channel the credits belong to.
+        """
+        self.__credits[vc] += count
+        self.notify_node()
+
     def push_pkt(self, pkt, current_cycle):
         """
-        @brief      Forwards the pkt to the connected link.
+        @brief      Forwards the pkt to the connected link on its virtual channel.
         @param      pkt - packet to be forwarded.
         @param      current_cycle - current simulation time.
         @return     0 on success, -1 otherwise.
@@ -130,20 +234,13 @@ class OutputPort(Port):
         assert pkt is not None, "Error: packet cannot be None"
         assert self.__recent_sent_cycle < current_cycle, "Error: cannot send more than 1 pkt in a cycle"
 
-        # Link calls this method to push credit packet
-        if isinstance(pkt, CreditPacket):
-            logger.debug(f"Port '{self.get_port_id()}' received credit")
-            self.__increment_credit()
-            return 0
-        
-        # Node calls this method to push data packet
-        available_credits = self.get_credit()
-        if available_credits > 0:
+        vc = pkt.get_vc()
+        if self.__credits[vc] > 0:
             connected_link = self.get_connected_link()
             status = connected_link.push_pkt(pkt, current_cycle)
             if status == 0:
-                self.__decrement_credit()
+                self.__credits[vc] -= 1
                 self.__recent_sent_cycle = current_cycle
             return status
 
-        return -1
\ No newline at end of file
+        return -1
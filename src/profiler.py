@@ -0,0 +1,113 @@
+"""
+@file       profiler.py
+@brief      Measures where the simulation loop spends its time: in the link phase, in the
+            node phase and in everything else, and within the node phase in every node
+            instance and node class.
+@author     Akshay Joshi
+"""
+
+from time import perf_counter_ns
+from collections import defaultdict
+
+import logging
+logger = logging.getLogger(__name__)
+
+class Profiler:
+    """
+    @class      Profiler
+    @brief      Times the phases of every cycle and, in one cycle out of sample_interval,
+                every call to Node.advance. The calls are timed back to back with one
+                clock reading per node, so that the overhead stays small.
+    """
+    def __init__(self, sample_interval=1, top=20):
+        """
+        @brief      A constructor for the Profiler class.
+        @param      sample_interval - the node calls of every sample_interval-th cycle are timed.
+        @param      top - number of node instances listed in the report.
+        """
+        assert sample_interval > 0, "Error: profiling sample interval should be positive"
+        assert top > 0, "Error: number of reported nodes should be positive"
+        self.__interval = sample_interval
+        self.__top = top
+        self.__phase_ns = {"links": 0, "nodes": 0}
+        self.__total_ns = 0
+        self.__start_ns = None
+        self.__cycles = 0
+        self.__sampled_cycles = 0
+        self.__node_ns = defaultdict(int)
+        self.__node_calls = defaultdict(int)
+
+    def start(self):
+        self.__start_ns = perf_counter_ns()
+
+    def stop(self):
+        self.__total_ns += perf_counter_ns() - self.__start_ns
+
+    def advance_links(self, links, cycle):
+        """
+        @brief      Advances the links and adds the time to the link phase.
+        """
+        start = perf_counter_ns()
+        for link in links:
+            link.advance(cycle)
+        self.__phase_ns["links"] += perf_counter_ns() - start
+
+    def advance_nodes(self, nodes, cycle):
+        """
+        @brief      Advances the nodes and adds the time to the node phase, and to every
+                    node if the cycle is sampled.
+        """
+        self.__cycles += 1
+        start = perf_counter_ns()
+        if cycle % self.__interval:
+            for node in nodes:
+                node.advance(cycle)
+            self.__phase_ns["nodes"] += perf_counter_ns() - start
+            return
+
+        self.__sampled_cycles += 1
+        node_ns = self.__node_ns
+        node_calls = self.__node_calls
+        last = start
+        for node in nodes:
+            node.advance(cycle)
+            now = perf_counter_ns()
+            node_ns[node] += now - last
+            node_calls[node] += 1
+            last = now
+        self.__phase_ns["nodes"] += last - start
+
+    def report(self):
+        """
+        @brief      Formats the hot spots ranked by time: the phases, the node classes and
+                    the node instances.
+        @return     the report as a string.
+        """
+        total = max(self.__total_ns, 1)
+        other = max(self.__total_ns - self.__phase_ns["links"] - self.__phase_ns["nodes"], 0)
+        lines = [f"===== Profile of {self.__cycles} cycles, node calls timed in {self.__sampled_cycles} =====",
+                 f"{'phase':<40}{'ms':>12}{'share':>8}"]
+        phases = list(self.__phase_ns.items()) + [("other (scheduler, stats export, checks)", other)]
+        for name, ns in sorted(phases, key = lambda item: -item[1]):
+            lines.append(f"{name:<40}{ns / 1e6:>12.1f}{ns / total:>8.1%}")
+
+        # the shares below are of the timed node calls
+        sampled = max(sum(self.__node_ns.values()), 1)
+        class_ns = defaultdict(int)
+        class_calls = defaultdict(int)
+        for node, ns in self.__node_ns.items():
+            class_ns[type(node).__name__] += ns
+            class_calls[type(node).__name__] += self.__node_calls[node]
+        lines.append(f"{'node class':<40}{'ms':>12}{'share':>8}{'calls':>10}{'us/call':>10}")
+        for name, ns in sorted(class_ns.items(), key = lambda item: -item[1]):
+            lines.append(f"{name:<40}{ns / 1e6:>12.1f}{ns / sampled:>8.1%}{class_calls[name]:>10}{ns / 1e3 / class_calls[name]:>10.2f}")
+
+        lines.append(f"{'node':<40}{'ms':>12}{'share':>8}{'calls':>10}{'us/call':>10}")
+        ranked = sorted(self.__node_ns.items(), key = lambda item: -item[1])
+        for node, ns in ranked[:self.__top]:
+            calls = self.__node_calls[node]
+            name = f"{node.get_node_id()} ({type(node).__name__})"
+            lines.append(f"{name:<40}{ns / 1e6:>12.1f}{ns / sampled:>8.1%}{calls:>10}{ns / 1e3 / calls:>10.2f}")
+        if len(ranked) > self.__top:
+            lines.append(f"... {len(ranked) - self.__top} more nodes")
+        return "\n".join(lines)
@@ -0,0 +1,365 @@
+"""
+@file       routing.py
+@brief      Computes the routing tables of the switches from the topology of the network.
+@author     Akshay Joshi
+"""
+
+import heapq
+from array import array
+from collections import deque
+from typing import Dict, List
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+class RoutingTable:
+    """
+    @class      RoutingTable
+    @brief      The precomputed routes of one switch. Destinations are numbered once for the
+                whole network, and the table keeps one output handle per destination in an
+                array, chosen from the equal-cost set by destination modulo the set size
+                (d-mod-k), so the switches spread the destinations over their paths. The
+                equal-cost sets are kept as indices into the distinct sets of the switch.
+                With an adaptive policy select_port picks among them by the load of the
+                output ports instead, see ROUTING_POLICIES.
+    """
+    __slots__ = ("__dst_index", "__ports", "__set_ids", "__sets", "__policy", "__alt_set_ids", "__distances")
+
+    def __init__(self, dst_index, ports, set_ids, sets, policy="static", alt_set_ids=None, distances=None):
+        """
+        @brief      A constructor for the RoutingTable class.
+        @param      dst_index - dict mapping a destination node ID to its index, shared by
+                    all the tables of the network.
+        @param      ports - array with the output handle per destination index, -1 if the
+                    destination is unreachable.
+        @param      set_ids - array with the index of the equal-cost set per destination.
+        @param      sets - list of the distinct tuples of equal-cost output handles, the
+                    first one empty.
+        @param      policy - one of ROUTING_POLICIES.
+        @param      alt_set_ids - array with the index of the set of output handles one hop
+                    longer than the minimal ones per destination, needed by 'ugal'.
+        @param      distances - array with the number of hops to every destination, needed
+                    by 'ugal'.
+        """
+        assert policy in ROUTING_POLICIES, f"Error: unknown routing policy {policy}"
+        assert policy != "ugal" or (alt_set_ids is not None and distances is not None), "Error: ugal needs the non-minimal sets"
+        self.__dst_index = dst_index
+        self.__ports = ports
+        self.__set_ids = set_ids
+        self.__sets = sets
+        self.__policy = policy
+        self.__alt_set_ids = alt_set_ids
+        self.__distances = distances
+
+    def get_port(self, dst_node_id):
+        """
+        @brief      Returns the output handle a packet to the destination is forwarded on.
+        @param      dst_node_id - a string representing ID of the destination node.
+        @return     an output handle of the switch.
+        """
+        port = self.__ports[self.__dst_index[dst_node_id]]
+        assert port >= 0, f"Error: no route to {dst_node_id}"
+        return port
+
+    def get_ports(self, dst_node_id):
+        """
+        @brief      Returns all the output handles on shortest legal paths to the destination.
+        @param      dst_node_id - a string representing ID of the destination node.
+        @return     a tuple of output handles, empty if the destination is unreachable.
+        """
+        return self.__sets[self.__set_ids[self.__dst_index[dst_node_id]]]
+
+    def get_policy(self):
+        return self.__policy
+
+    def get_destinations(self):
+        return list(self.__dst_index)
+
+    def get_arrays(self):
+        """
+        @brief      Returns the contents of the table, in the order of the constructor
+                    arguments after dst_index, e.g. to store it in a topology cache.
+        @return     a tuple (ports, set_ids, sets, alt_set_ids, distances).
+        """
+        return self.__ports, self.__set_ids, self.__sets, self.__alt_set_ids, self.__distances
+
+    def select_port(self, dst_node_id, load, injected):
+        """
+        @brief      Picks the output handle for a packet according to the policy.
+                    'minimal' takes the least loaded port of the equal-cost set. 'ugal' also
+                    considers the ports one hop longer, but only for packets that have just
+                    been injected so that every packet takes at most one non-minimal hop, and
+                    takes the least loaded of them if its load times its hop count is lower
+                    (UGAL-L). Ties keep the d-mod-k port.
+        @param      dst_node_id - a string representing ID of the destination node.
+        @param      load - callable returning the load of an output handle, e.g. the packets
+                    queued for it plus the uncredited packets downstream.
+        @param      injected - True if the packet arrived from a terminal.
+        @return     an output handle of the switch.
+        """
+        i = self.__dst_index[dst_node_id]
+        port = self.__ports[i]
+        assert port >= 0, f"Error: no route to {dst_node_id}"
+        if self.__policy == "static":
+            return port
+
+        best = load(port)
+        for candidate in self.__sets[self.__set_ids[i]]:
+            candidate_load = load(candidate)
+            if candidate_load < best:
+                port, best = candidate, candidate_load
+
+        if self.__policy == "ugal" and injected:
+            hops = self.__distances[i]
+            best *= hops
+            for candidate in self.__sets[self.__alt_set_ids[i]]:
+                candidate_cost = load(candidate) * (hops + 1)
+                if candidate_cost < best:
+                    port, best = candidate, candidate_cost
+        return port
+
+
+def load_imbalance(loads):
+    """
+    @brief      Measures how evenly traffic is spread over a set of ports.
+    @param      loads - the number of packets sent on every port.
+    @return     the maximum load divided by the mean load, 1.0 for a perfect balance.
+    """
+    loads = list(loads)
+    total = sum(loads)
+    if total == 0:
+        return 1.0
+    return max(loads) * len(loads) / total
+
+
+def _updown_orientation(nodes, preds, adj, routers):
+    """
+    @brief      Orders the switches for up*/down* routing: the root is the switch farthest
+                from the terminals, the core of a fat-tree, and a breadth-first traversal
+                from it gives every switch a level. A link goes up if it leads to a lower
+                (level, position) key, so every switch can go up to the root and the up and
+                down channels each form an acyclic graph.
+    @param      nodes - list of all node IDs.
+    @param      preds, adj - dicts mapping a node ID to its upstream nodes and to its
+                (output_handle, downstream node) tuples.
+    @param      routers - set of IDs of the nodes that forward packets.
+    @return     a dict mapping a switch ID to its key.
+    """
+    neighbours: Dict[str, List[str]] = {node_id: [] for node_id in routers}
+    for src in routers:
+        for _, dst in adj[src]:
+            if dst in routers:
+                neighbours[src].append(dst)
+                neighbours[dst].append(src)
+
+    # distance of every switch from its nearest terminal
+    depth = {}
+    queue = deque()
+    for src in nodes:
+        if src not in routers:
+            continue
+        if any(dst not in routers for _, dst in adj[src]) or any(prev_id not in routers for prev_id in preds[src]):
+            depth[src] = 0
+            queue.append(src)
+    while queue:
+        node_id = queue.popleft()
+        for next_id in neighbours[node_id]:
+            if next_id not in depth:
+                depth[next_id] = depth[node_id] + 1
+                queue.append(next_id)
+
+    position = {node_id: i for i, node_id in enumerate(nodes)}
+    key = {}
+    for start in sorted(routers, key = lambda node_id: (-depth.get(node_id, 0), position[node_id])):
+        if start in key:
+            continue
+        # every connected group of switches gets its own root
+        key[start] = (0, position[start])
+        queue = deque([start])
+        while queue:
+            node_id = queue.popleft()
+            for next_id in neighbours[node_id]:
+                if next_id not in key:
+                    key[next_id] = (key[node_id][0] + 1, position[next_id])
+                    queue.append(next_id)
+    return key
+
+def compute_routing_tables(nodes, links, routers, algorithm="shortest", policy="static"):
+    """
+    @brief      Computes the routing table of every switch.
+                'shortest' routes on all shortest paths. 'updown' only allows paths that go
+                up zero or more times and then down, which avoids deadlocks in topologies
+                with cycles. Only links between switches that are linked both ways are
+                oriented. One-way links, as in butterflies, always count as down.
+                The tables are stateless, so a switch that has a path down to the
+                destination always takes it; this keeps every route legal but may be
+                longer than the shortest legal path.
+                The hops into and out of a terminal are the first and last of a path and
+                go neither up nor down. Paths only pass through switches.
+    @param      nodes - list of all node IDs, in the order the destinations are numbered.
+    @param      links - list of (src_node_id, output_handle, dst_node_id) tuples.
+    @param      routers - set of IDs of the nodes that forward packets.
+    @param      algorithm - 'shortest' or 'updown'.
+    @param      policy - one of ROUTING_POLICIES, 'ugal' also computes the ports one hop
+                longer than the minimal ones and the distance to every destination.
+    @return     a dict mapping the ID of every router to its RoutingTable.
+    """
+    if algorithm not in ROUTING_ALGORITHMS:
+        raise ValueError(f"Unknown routing algorithm: {algorithm}, expected one of {list(ROUTING_ALGORITHMS)}")
+    if policy not in ROUTING_POLICIES:
+        raise ValueError(f"Unknown routing policy: {policy}, expected one of {list(ROUTING_POLICIES)}")
+    nonminimal = policy == "ugal"
+
+    adj: Dict[str, list] = {node_id: [] for node_id in nodes}
+    preds: Dict[str, list] = {node_id: [] for node_id in nodes}
+    for src, handle, dst in links:
+        adj[src].append((handle, dst))
+        preds[dst].append(src)
+
+    # destinations are the terminals that receive packets
+    destinations = [node_id for node_id in nodes if node_id not in routers and preds[node_id]]
+    dst_index = {node_id: i for i, node_id in enumerate(destinations)}
+
+    # links between switches split into the ones going down and up, with up*/down* a link
+    # goes up if it leads to a lower key and the switches are also linked the other way,
+    # with shortest-path routing every link goes down
+    key = _updown_orientation(nodes, preds, adj, routers) if algorithm == "updown" else None
+    down_links: Dict[str, list] = {node_id: [] for node_id in routers}
+    up_links: Dict[str, list] = {node_id: [] for node_id in routers}
+    for router in routers:
+        for handle, next_id in adj[router]:
+            if next_id in routers:
+                if key is not None and key[next_id] < key[router] and next_id in preds[router]:
+                    up_links[router].append((handle, next_id))
+                else:
+                    down_links[router].append((handle, next_id))
+    down_preds = _reverse(down_links)
+    up_preds = _reverse(up_links)
+
+    # destinations attached to the same switches share the routes towards those switches
+    groups: Dict[tuple, int] = {}
+    group_hops = []
+    dst_groups = []
+    direct: Dict[str, list] = {node_id: [] for node_id in routers}
+    for i, dst in enumerate(destinations):
+        seeds = tuple(sorted(set(src for src in preds[dst] if src in routers)))
+        group = groups.get(seeds)
+        if group is None:
+            group = groups[seeds] = len(group_hops)
+            group_hops.append(_next_hops(seeds, down_links, up_links, down_preds, up_preds, nonminimal))
+        dst_groups.append(group)
+        for router in seeds:
+            direct[router].append((i, tuple(sorted(handle for handle, next_id in adj[router] if next_id == dst))))
+
+    dst_groups = np.array(dst_groups, dtype = np.intp)
+    dst_ids = np.arange(len(destinations))
+    tables = {}
+    for router in routers:
+        sets = [()]
+        set_ids_of = {(): 0}
+        def set_id(hops):
+            if hops not in set_ids_of:
+                set_ids_of[hops] = len(sets)
+                sets.append(hops)
+            return set_ids_of[hops]
+
+        group_set_ids = np.array([set_id(hops_of.get(router, ())) for hops_of, _, _ in group_hops], dtype = np.uint16)
+        set_ids = group_set_ids[dst_groups]
+        alt_set_ids = distances = None
+        if nonminimal:
+            group_alt_set_ids = np.array([set_id(alt_of.get(router, ())) for _, alt_of, _ in group_hops], dtype = np.uint16)
+            group_distances = np.array([total.get(router, -1) + 1 for _, _, total in group_hops], dtype = np.uint16)
+            alt_set_ids = array("H", group_alt_set_ids[dst_groups].tobytes())
+            distances = array("H", group_distances[dst_groups].tobytes())
+        for i, hops in direct[router]:
+            set_ids[i] = set_id(hops)
+
+        # d-mod-k choice of one port per destination
+        width = max(len(hops) for hops in sets) or 1
+        choices = np.full((len(sets), width), -1, dtype = np.int16)
+        sizes = np.ones(len(sets), dtype = np.intp)
+        for i, hops in enumerate(sets[1:], 1):
+            choices[i, :len(hops)] = hops
+            sizes[i] = len(hops)
+        ports = choices[set_ids, dst_ids % sizes[set_ids]]
+
+        logger.debug(f"{router} reaches {np.count_nonzero(ports >= 0)} of {len(ports)} destinations")
+        tables[router] = RoutingTable(dst_index, array("h", ports.tobytes()), array("H", set_ids.tobytes()), sets,
+                                      policy, alt_set_ids, distances)
+    return tables
+
+def _reverse(links):
+    """
+    @brief      Returns the upstream switches of every switch over the given links.
+    @return     a dict mapping a switch ID to a list of (upstream switch, output handle) tuples.
+    """
+    preds: Dict[str, list] = {node_id: [] for node_id in links}
+    for src, out_links in links.items():
+        for handle, dst in out_links:
+            preds[dst].append((src, handle))
+    return preds
+
+def _next_hops(seeds, down_links, up_links, down_preds, up_preds, nonminimal):
+    """
+    @brief      Computes the equal-cost next hops of every switch towards the switches
+                attached to a destination.
+    @param      seeds - IDs of the switches with a link to the destination.
+    @param      nonminimal - True to also compute the next hops one hop longer.
+    @return     a tuple of three dicts mapping the ID of a switch that reaches the seeds to
+                its minimal next hops, to its next hops one hop longer (empty unless
+                nonminimal) and to its distance from the seeds. The minimal next hops of
+                the seeds are not included.
+    """
+    # paths that only go down
+    down = {seed: 0 for seed in seeds}
+    hops_of = {}
+    queue = deque(seeds)
+    while queue:
+        node_id = queue.popleft()
+        d = down[node_id] + 1
+        for prev_id, handle in down_preds[node_id]:
+            prev_d = down.get(prev_id)
+            if prev_d is None:
+                down[prev_id] = d
+                hops_of[prev_id] = [handle]
+                queue.append(prev_id)
+            elif prev_d == d:
+                hops_of[prev_id].append(handle)
+
+    # switches without a path down go up until a switch that has one, with up*/down* a
+    # switch that can go down never goes up again
+    total = dict(down)
+    heap = [(d, node_id) for node_id, d in down.items()]
+    heapq.heapify(heap)
+    while heap:
+        d, node_id = heapq.heappop(heap)
+        if d > total[node_id]:
+            continue
+        for prev_id, handle in up_preds[node_id]:
+            if prev_id in down:
+                continue
+            prev_d = total.get(prev_id)
+            if prev_d is None or d + 1 < prev_d:
+                total[prev_id] = d + 1
+                hops_of[prev_id] = [handle]
+                heapq.heappush(heap, (d + 1, prev_id))
+            elif prev_d == d + 1:
+                hops_of[prev_id].append(handle)
+
+    alt_of = {}
+    if nonminimal:
+        # a non-minimal hop leads to a switch as far from the seeds as this one, and has to
+        # be allowed in the same phase as the minimal hops
+        for router, d in total.items():
+            if router in down:
+                alt = [handle for handle, next_id in down_links[router] if down.get(next_id) == d]
+            else:
+                alt = [handle for handle, next_id in up_links[router] if total.get(next_id) == d]
+            if alt:
+                alt_of[router] = tuple(sorted(alt))
+    return {router: tuple(sorted(hops)) for router, hops in hops_of.items()}, alt_of, total
+
+ROUTING_ALGORITHMS = ("shortest", "updown")
+ROUTING_POLICIES = ("static", "minimal", "ugal")
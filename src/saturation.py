@@ -0,0 +1,283 @@
+"""
+@file       saturation.py
+@brief      Measures the latency-vs-load curve of a network driven by TrafficGenerator
+            nodes and searches for its saturation throughput, the offered load at which
+            the accepted throughput stops following it. The load points run in a process
+            pool, each through the usual setup, run and teardown of a Simulator.
+@author     Akshay Joshi
+"""
+
+import os
+import io
+import csv
+import sys
+import argparse
+import contextlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from simulator import Simulator
+from parser import Parser
+from plotter import Plotter
+from topology import TOPOLOGIES, make_topology
+from routing import ROUTING_ALGORITHMS, ROUTING_POLICIES
+from sweep import init_worker
+
+logger = logging.getLogger(__name__)
+
+def _with_param(params, key, value):
+    """
+    @brief      Sets one 'key=value' item of a pattern_params string, see traffic.parse_params.
+    """
+    items = [item for item in (params or "").split(":") if item and item.partition("=")[0] != key]
+    return ":".join(items + [f"{key}={value}"])
+
+class LoadParser:
+    """
+    @class      LoadParser
+    @brief      Wraps a Parser or a Topology and sets the injection rate of every
+                TrafficGenerator and the warm-up cycle of every TrafficSink it parses.
+    """
+    def __init__(self, parser, rate, warmup):
+        """
+        @brief      A constructor for the LoadParser class.
+        @param      parser - a Parser or a Topology that has not been parsed.
+        @param      rate - injection rate of the generators, in packets per cycle.
+        @param      warmup - cycle from which the sinks measure.
+        """
+        self.__parser = parser
+        self.__rate = rate
+        self.__warmup = warmup
+        self.nodes = []
+        self.connections = []
+
+    def parse(self):
+        self.__parser.parse()
+        self.nodes = self.__parser.nodes
+        self.connections = self.__parser.connections
+        for node in self.nodes:
+            if node.get_class_name() == "TrafficGenerator":
+                node.pattern_params = _with_param(node.get_pattern_params(), "rate", self.__rate)
+            elif node.get_class_name() == "TrafficSink":
+                node.pattern_params = _with_param(node.get_pattern_params(), "warmup", self.__warmup)
+
+
+def measure_load(parser, rate, cycles, warmup, engine="cycle", routing="shortest", routing_policy="static"):
+    """
+    @brief      Simulates one load point.
+    @param      parser - a Parser or a Topology with TrafficGenerator and TrafficSink nodes.
+    @param      rate - injection rate of every generator.
+    @param      cycles - number of cycles to simulate.
+    @param      warmup - number of cycles before the sinks start measuring.
+    @return     a dict with the rate, the offered and accepted throughput in packets per
+                terminal per cycle, and the mean latency of the packets generated after
+                the warm-up, None if none were delivered.
+    """
+    sim = Simulator(cycles, LoadParser(parser, rate, warmup), engine, routing, routing_policy)
+    sim.set_plotter(Plotter(False))
+    sim.setup()
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim.run()
+    sim.teardown()
+
+    totals = {"pkts_generated": 0, "pkts_accepted": 0, "pkts_measured": 0, "latency_total": 0}
+    generators = sinks = 0
+    for node in sim.get_nodes():
+        name = type(node).__name__
+        if name not in ("TrafficGenerator", "TrafficSink"):
+            continue
+        if name == "TrafficGenerator":
+            generators += 1
+        else:
+            sinks += 1
+        if not node.has_stats():
+            continue
+        for stat, val in node.get_stats().get_counters().items():
+            if stat in totals:
+                totals[stat] += val
+    assert generators > 0 and sinks > 0, "Error: the network needs TrafficGenerator and TrafficSink nodes"
+
+    return {
+        "rate": rate,
+        "offered": totals["pkts_generated"] / (generators * cycles),
+        "accepted": totals["pkts_accepted"] / (sinks * (cycles - warmup)),
+        "latency": totals["latency_total"] / totals["pkts_measured"] if totals["pkts_measured"] else None,
+    }
+
+def is_saturated(point, tolerance):
+    """
+    @brief      Checks whether the accepted throughput falls short of the offered load by
+                more than the relative tolerance.
+    """
+    return point["accepted"] < (1.0 - tolerance) * point["offered"]
+
+def find_saturation(pool, workers, parser, run_args, step, resolution, tolerance):
+    """
+    @brief      Measures the curve at multiples of step, then narrows the interval between
+                the last unsaturated and the first saturated rate down to the resolution.
+                Every round simulates as many rates inside the interval as there are
+                workers, so the search is a binary search with one worker and a k-ary one
+                with more.
+    @param      pool - ProcessPoolExecutor that runs measure_load.
+    @param      workers - number of worker processes of the pool.
+    @param      run_args - (cycles, warmup, engine, routing, routing_policy) of every point.
+    @return     a tuple with the highest rate found not to saturate the network, None if
+                it does not saturate at all, and the list of all measured points sorted by
+                rate.
+    """
+    points = []
+    def narrow(rates, lo, hi):
+        futures = [pool.submit(measure_load, parser, rate, *run_args) for rate in rates]
+        for future in futures:
+            point = future.result()
+            points.append(point)
+            if is_saturated(point, tolerance):
+                return lo, point["rate"]
+            lo = point["rate"]
+        return lo, hi
+
+    num_steps = max(1, round(1.0 / step))
+    lo, hi = narrow([min(1.0, i * step) for i in range(1, num_steps + 1)], 0.0, None)
+    if hi is None:
+        return None, points
+
+    while hi - lo > resolution:
+        lo, hi = narrow([lo + (hi - lo) * (i + 1) / (workers + 1) for i in range(workers)], lo, hi)
+        logger.info(f"Saturation between {lo:.4f} and {hi:.4f}")
+    points.sort(key = lambda point: point["rate"])
+    return lo, points
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--nodes",
+        type = str,
+        default = None,
+        help = "Relative path to the nodes csv file, with TrafficGenerator and TrafficSink nodes"
+    )
+    parser.add_argument(
+        "--connections",
+        type = str,
+        default = None,
+        help = "Relative path to the topology csv file"
+    )
+    parser.add_argument(
+        "--inputs",
+        type = str,
+        default = None,
+        help = "Relative path to the directory containing user-defined node implementations "
+               "(default with --topology: ../inputs)"
+    )
+    parser.add_argument(
+        "--topology",
+        type = str,
+        default = None,
+        help = f"Generated network instead of --nodes and --connections, with a traffic pattern, e.g. "
+               f"'mesh:dims=8x8,traffic=uniform'. Topologies: {', '.join(TOPOLOGIES)}"
+    )
+    parser.add_argument(
+        "--cycles",
+        type = int,
+        default = 5000,
+        help = "Number of simulation cycles per load point (default: 5000)"
+    )
+    parser.add_argument(
+        "--warmup",
+        type = int,
+        default = 1000,
+        help = "Number of cycles before the throughput and latency are measured (default: 1000)"
+    )
+    parser.add_argument(
+        "--step",
+        type = float,
+        default = 0.1,
+        help = "Distance between the injection rates of the curve (default: 0.1)"
+    )
+    parser.add_argument(
+        "--resolution",
+        type = float,
+        default = 0.01,
+        help = "Width of the interval the saturation rate is narrowed down to (default: 0.01)"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type = float,
+        default = 0.05,
+        help = "Relative shortfall of the accepted throughput that counts as saturated (default: 0.05)"
+    )
+    parser.add_argument(
+        "--engine",
+        type = str,
+        default = "event",
+        choices = list(Simulator.ENGINES),
+        help = "Simulation engine used for every point (default: event)"
+    )
+    parser.add_argument(
+        "--routing",
+        type = str,
+        default = "shortest",
+        choices = list(ROUTING_ALGORITHMS),
+        help = "Routing tables computed for the switches (default: shortest)"
+    )
+    parser.add_argument(
+        "--routing-policy",
+        type = str,
+        default = "static",
+        choices = list(ROUTING_POLICIES),
+        help = "How switches choose among the routes (default: static)"
+    )
+    parser.add_argument(
+        "--workers",
+        type = int,
+        default = os.cpu_count(),
+        help = "Number of worker processes (default: number of CPUs)"
+    )
+    parser.add_argument(
+        "--output",
+        type = str,
+        default = "../outputs/saturation.csv",
+        help = "Path of the latency-vs-load table (default: ../outputs/saturation.csv)"
+    )
+    args = parser.parse_args()
+    if args.topology is None and (args.nodes is None or args.connections is None or args.inputs is None):
+        parser.error("either --topology or all of --nodes, --connections and --inputs are required")
+    if not 0 <= args.warmup < args.cycles:
+        parser.error(f"warm-up must be between 0 and the number of cycles. Got: {args.warmup}")
+    if not 0 < args.step <= 1 or not 0 < args.resolution < 1 or not 0 <= args.tolerance < 1 or args.workers <= 0:
+        parser.error("step, resolution, tolerance and workers are out of range")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.topology is not None:
+        user_nodes_dir = os.path.abspath(args.inputs or "../inputs")
+        try:
+            parser = make_topology(args.topology, user_nodes_dir)
+        except ValueError as e:
+            sys.exit(f"Error: {e}")
+    else:
+        user_nodes_dir = os.path.abspath(args.inputs)
+        parser = Parser(os.path.abspath(args.nodes), os.path.abspath(args.connections), user_nodes_dir)
+
+    run_args = (args.cycles, args.warmup, args.engine, args.routing, args.routing_policy)
+    with ProcessPoolExecutor(max_workers = args.workers, initializer = init_worker, initargs = (user_nodes_dir,)) as pool:
+        saturation, points = find_saturation(pool, args.workers, parser, run_args, args.step, args.resolution, args.tolerance)
+
+    with open(args.output, "w", newline = '') as f:
+        writer = csv.writer(f)
+        writer.writerow(["rate", "offered", "accepted", "latency", "saturated"])
+        for point in points:
+            writer.writerow([point["rate"], point["offered"], point["accepted"], point["latency"], is_saturated(point, args.tolerance)])
+
+    print(f"{'rate':>8}{'offered':>10}{'accepted':>10}{'latency':>10}")
+    for point in points:
+        latency = f"{point['latency']:.2f}" if point["latency"] is not None else "-"
+        print(f"{point['rate']:>8.4f}{point['offered']:>10.4f}{point['accepted']:>10.4f}{latency:>10}")
+    if saturation is None:
+        print(f"No saturation up to an injection rate of 1.0")
+    else:
+        print(f"Saturation throughput: {saturation:.4f} packets per terminal per cycle (within {args.resolution})")
+    print(f"Results can be found in {args.output}")
@@ -0,0 +1,150 @@
+"""
+@file       scheduler.py
+@brief      Implements the calendars of pending link deliveries and node wake-ups used by
+            the event-driven engine.
+@author     Akshay Joshi
+"""
+
+import heapq
+from typing import Dict, List
+
+class Calendar:
+    """
+    @class      Calendar
+    @brief      Maps future cycles to the objects that have to be visited at that cycle.
+    """
+    def __init__(self):
+        """
+        @brief      A constructor for the Calendar class.
+        """
+        self.__due: Dict[int, Dict[object, None]] = {}
+        self.__due_cycles: List[int] = []
+
+    def schedule(self, item, cycle):
+        """
+        @brief      Registers an item to be visited at the given cycle.
+        @param      item - the object that has work due.
+        @param      cycle - the simulation time at which the work is due.
+        """
+        items = self.__due.get(cycle)
+        if items is None:
+            # dict is used as an insertion-ordered set so that items are
+            # visited in a deterministic order and at most once per cycle
+            items = self.__due[cycle] = {}
+            heapq.heappush(self.__due_cycles, cycle)
+        items[item] = None
+
+    def pop(self, cycle):
+        """
+        @brief      Removes and returns the items that are due at the given cycle.
+        @param      cycle - the current simulation time.
+        @return     a list of items, empty if nothing is due.
+        """
+        items = self.__due.pop(cycle, None)
+        if items is None:
+            return []
+        due_cycle = heapq.heappop(self.__due_cycles)
+        assert due_cycle == cycle, "Error: calendar entries must be processed in cycle order"
+        return list(items)
+
+    def next_cycle(self):
+        """
+        @brief      Returns the earliest cycle at which an item is due.
+        @return     an integer cycle, or None if the calendar is empty.
+        """
+        if self.__due_cycles:
+            return self.__due_cycles[0]
+        return None
+
+
+class Scheduler:
+    """
+    @class      Scheduler
+    @brief      Keeps track of the cycles at which links have a packet or credit due and
+                of the nodes that are awake, so that the simulator only advances the
+                links and nodes that have work to do.
+    """
+    def __init__(self):
+        """
+        @brief      A constructor for the Scheduler class.
+        """
+        self.__links = Calendar()
+        self.__node_timers = Calendar()
+        self.__active_nodes: Dict['Node', None] = {}
+        self.__cycle = -1
+
+    def set_cycle(self, cycle):
+        """
+        @brief      Sets the cycle that is currently being simulated.
+        @param      cycle - the current simulation time.
+        """
+        self.__cycle = cycle
+
+    def schedule_link(self, link, cycle):
+        """
+        @brief      Registers a link to be advanced at the given cycle.
+        @param      link - the Link object that has a delivery due.
+        @param      cycle - the simulation time at which the delivery is due.
+        """
+        self.__links.schedule(link, cycle)
+
+    def pop_due_links(self, cycle):
+        """
+        @brief      Removes and returns the links that are due at the given cycle.
+        @param      cycle - the current simulation time.
+        @return     a list of Link objects, empty if nothing is due.
+        """
+        return self.__links.pop(cycle)
+
+    def schedule_node(self, node, cycle):
+        """
+        @brief      Registers a sleeping node to be woken up at the given cycle.
+        @param      node - the Node object that is going to sleep.
+        @param      cycle - the simulation time at which the node wants to be woken up.
+        """
+        # a wake-up that is not in the future takes effect in the next cycle
+        self.__node_timers.schedule(node, max(cycle, self.__cycle + 1))
+
+    def activate(self, node):
+        """
+        @brief      Marks a node as awake so that it is advanced every cycle.
+        @param      node - the Node object that has been woken up.
+        """
+        self.__active_nodes[node] = None
+
+    def deactivate(self, node):
+        """
+        @brief      Stops advancing a node that has gone to sleep.
+        @param      node - the Node object that has gone to sleep.
+        """
+        self.__active_nodes.pop(node, None)
+
+    def wake_due_nodes(self, cycle):
+        """
+        @brief      Activates the sleeping nodes whose wake-up cycle has been reached.
+        @param      cycle - the current simulation time.
+        """
+        for node in self.__node_timers.pop(cycle):
+            # the node may have been woken up earlier and gone back to sleep
+            if node.is_awake(cycle):
+                self.activate(node)
+
+    def get_active_nodes(self):
+        """
+        @brief      Returns the nodes that have to be advanced in the current cycle.
+        @return     a list of Node objects.
+        """
+        return list(self.__active_nodes)
+
+    def next_cycle(self, cycle):
+        """
+        @brief      Returns the next cycle at which there is any work to do.
+        @param      cycle - the current simulation time.
+        @return     an integer cycle, or None if nothing will ever happen again.
+        """
+        if self.__active_nodes:
+            return cycle + 1
+        next_cycles = [c for c in (self.__links.next_cycle(), self.__node_timers.next_cycle()) if c is not None]
+        if next_cycles:
+            return min(next_cycles)
+        return None
@@ -1,4 +1,5 @@
 import os
+import pickle
 import importlib
 import logging
 from typing import Dict
@@ -9,15 +10,42 @@ from packet import Packet
 from port import OutputPort, InputPort
 from parser import Parser
 from stats import Stats
+from scheduler import Scheduler
+from plotter import Plotter
+from routing import compute_routing_tables, ROUTING_ALGORITHMS, ROUTING_POLICIES
 
 logger = logging.getLogger(__name__)
 
 class Simulator:
-    def __init__(self, max_cycles, parser):
+    ENGINES = ("cycle", "event")
+
+    def __init__(self, max_cycles, parser, engine="cycle", routing="shortest", routing_policy="static"):
+        assert engine in self.ENGINES, f"Error: unknown simulation engine {engine}"
+        assert routing in ROUTING_ALGORITHMS, f"Error: unknown routing algorithm {routing}"
+        assert routing_policy in ROUTING_POLICIES, f"Error: unknown routing policy {routing_policy}"
         self.__max_cycles = max_cycles
         self.__parser = parser
+        self.__engine = engine
+        self.__routing = routing
+        self.__routing_policy = routing_policy
         self.__nodes: Dict[str, Node] = {}
         self.__links: Dict[str, Link] = {}
+        self.__scheduler = None
+        self.__start_cycle = 0
+        self.__checkpoint_cycle = None
+        self.__checkpoint_path = None
+        self.__termination = None
+        self.__check_interval = 1
+        self.__next_check = None
+        self.__end_cycle = None
+        self.__plotter = Plotter()
+        self.__stats_sink = None
+        self.__flush_interval = None
+        self.__next_flush = None
+        self.__topology_cache = None
+        self.__routing_tables = None
+        self.__profiler = None
+        self.__tracer = None
 
     # ----------------------------------------
     # Private methods for building the network
@@ -45,10 +73,15 @@ class Simulator:
                     used to tell the system to include the specified directory when looking 
                     for modules.
         """
+        # look every class up once, large networks have thousands of nodes of a few classes
+        classes = {}
         for node_setup in self.__parser.nodes:
-            user_module = importlib.import_module(node_setup.get_module_name())
-            NodeClass = getattr(user_module, node_setup.get_class_name())
-            
+            class_key = (node_setup.get_module_name(), node_setup.get_class_name())
+            NodeClass = classes.get(class_key)
+            if NodeClass is None:
+                user_module = importlib.import_module(node_setup.get_module_name())
+                NodeClass = classes[class_key] = getattr(user_module, node_setup.get_class_name())
+
             node = NodeClass()
             node.set_node_id(node_setup.get_node_id())
 
@@ -58,6 +91,13 @@ class Simulator:
             else:
                 logger.warning(f"{node.get_node_id()} does not have a set_pattern method, skipping pattern setup")
 
+            # pass the scheduling algorithm, if node is a switch configured with one
+            if node_setup.get_algorithm():
+                if hasattr(node, "set_algorithm"):
+                    node.set_algorithm(node_setup.get_algorithm(), node_setup.get_algorithm_params())
+                else:
+                    logger.warning(f"{node.get_node_id()} does not have a set_algorithm method, skipping algorithm setup")
+
             self.__add_node(node)
 
     def __build_connections(self):
@@ -71,8 +111,8 @@ class Simulator:
 
             link = Link(data.get_link_id(), data.get_latency())
 
-            output_port = OutputPort(data.get_op_id(), data.get_credit(), link)
-            input_port = InputPort(data.get_ip_id(), data.get_fifo_size(), link)
+            output_port = OutputPort(data.get_op_id(), data.get_credit(), link, data.get_vcs())
+            input_port = InputPort(data.get_ip_id(), data.get_fifo_size(), link, data.get_vcs())
 
             link.set_output_port(output_port)
             link.set_input_port(input_port)
@@ -82,41 +122,384 @@ class Simulator:
 
             self.__add_link(link)
 
+    def __build_routing(self, tables=None):
+        """
+        @brief      Computes the routing tables from the parsed connections and hands them to
+                    the nodes that forward packets, those with a set_routing_table method.
+        @param      tables - the routing tables loaded from the topology cache, if any.
+        @return     a dict mapping the ID of every router to its RoutingTable.
+        """
+        if tables is None:
+            routers = {node_id for node_id, node in self.__nodes.items() if hasattr(node, "set_routing_table")}
+            if not routers:
+                return {}
+            links = []
+            for data in self.__parser.connections:
+                src_node = self.__get_node(data.get_src_node())
+                links.append((data.get_src_node(), src_node.output_handle(data.get_op_id()), data.get_dst_node()))
+            tables = compute_routing_tables(list(self.__nodes), links, routers, self.__routing, self.__routing_policy)
+        for node_id, table in tables.items():
+            self.__nodes[node_id].set_routing_table(table)
+        return tables
+
+    # -------------------------------------
+    # Public accessors for the built network
+    # -------------------------------------
+    def get_node(self, node_id):
+        return self.__nodes[node_id]
+
+    def get_nodes(self):
+        return list(self.__nodes.values())
+
+    def get_link(self, link_id):
+        return self.__links[link_id]
+
+    def get_links(self):
+        return list(self.__links.values())
+
+    def get_max_cycles(self):
+        return self.__max_cycles
+
+    def get_routing_tables(self):
+        """
+        @brief      Returns the routing tables handed to the routers during setup.
+        @return     a dict mapping the ID of every router to its RoutingTable.
+        """
+        return self.__routing_tables
+
     # -------------------------------------
     # Public methods for setting up and running the simulator
     # -------------------------------------
+    def set_topology_cache(self, cache):
+        """
+        @brief      Loads the parsed network and the routing tables from the cache during
+                    setup, or saves them there if the network is not in it yet. Must be
+                    called before setup.
+        @param      cache - TopologyCache object, see topology_cache.py.
+        """
+        self.__topology_cache = cache
+
+    def set_routing_tables(self, tables):
+        """
+        @brief      Hands the given routing tables to the routers during setup instead of
+                    computing them, e.g. the tables of the routers of one partition that the
+                    coordinator of a parallel simulation computed from the whole network.
+                    Must be called before setup.
+        @param      tables - dict mapping the ID of every router to its RoutingTable.
+        """
+        self.__routing_tables = tables
+
     def setup(self):
         """
         @brief      Sets up the simulator by parsing the configuration files and initializing nodes and links.
         """
-        self.__parser.parse()
+        cache = self.__topology_cache if self.__routing_tables is None else None
+        tables = self.__routing_tables
+        if cache is not None:
+            key = cache.key(self.__parser, self.__routing, self.__routing_policy)
+            tables = cache.load(key, self.__parser)
+        if cache is None or tables is None:
+            self.__parser.parse()
         self.__build_nodes()
         self.__build_connections()
+        if cache is not None and tables is None:
+            self.__routing_tables = self.__build_routing()
+            cache.save(key, self.__parser, self.__routing_tables)
+        else:
+            self.__routing_tables = self.__build_routing(tables)
+
+        if self.__engine == "event":
+            self.__scheduler = Scheduler()
+            for link in self.__links.values():
+                link.set_scheduler(self.__scheduler)
+            for node in self.__nodes.values():
+                node.set_scheduler(self.__scheduler)
+                self.__scheduler.activate(node)
+        if self.__tracer is not None:
+            self.__tracer.attach(self.__links.values())
 
         logger.debug("===== Simulation =====")
         for node in self.__nodes.values():
+            # with a stats sink only one flush interval is kept in memory
+            node.set_stats_num_cycles(self.__flush_interval or self.__max_cycles)
             node.setup()
 
+    # -------------------------------------
+    # Termination conditions
+    # -------------------------------------
+    def set_termination(self, predicate, check_interval=1):
+        """
+        @brief      Stops the simulation before the maximum number of cycles once the given
+                    predicate holds. See termination.py for the built-in conditions.
+        @param      predicate - callable taking (simulator, cycle) and returning True to stop,
+                    where cycle is the number of cycles simulated so far.
+        @param      check_interval - the predicate is checked every check_interval cycles.
+        """
+        assert callable(predicate), "Error: termination predicate should be callable"
+        assert isinstance(check_interval, int) and check_interval > 0, "Error: check interval should be a positive integer"
+        self.__termination = predicate
+        self.__check_interval = check_interval
+
+    def __terminates(self, cycle):
+        """
+        @brief      Checks the termination predicate at every check boundary up to the given
+                    cycle. The event engine reaches several boundaries at once when it jumps
+                    over idle cycles, during which the state does not change.
+        @param      cycle - number of cycles reflected in the current state.
+        @return     True if the simulation has to stop, False otherwise.
+        """
+        if self.__termination is None:
+            return False
+        while self.__next_check <= cycle:
+            check_cycle = self.__next_check
+            self.__next_check += self.__check_interval
+            if self.__termination(self, check_cycle):
+                self.__end_cycle = check_cycle
+                return True
+        return False
+
+    def get_end_cycle(self):
+        """
+        @brief      Returns the number of cycles after which the last run stopped.
+        """
+        return self.__end_cycle
+
+    # -------------------------------------
+    # Streaming stats export
+    # -------------------------------------
+    def set_stats_sink(self, sink, flush_interval):
+        """
+        @brief      Streams the stats of all nodes to the given sink every flush_interval
+                    cycles instead of keeping them in memory until teardown. Must be called
+                    before setup.
+        @param      sink - StatsSink object, see sinks.py.
+        @param      flush_interval - number of cycles per exported chunk.
+        """
+        assert isinstance(flush_interval, int) and flush_interval > 0, "Error: flush interval should be a positive integer"
+        self.__stats_sink = sink
+        self.__flush_interval = flush_interval
+
+    def __flush_stats_if_due(self, cycle):
+        """
+        @brief      Flushes the stats up to the last flush boundary reached. Boundaries that
+                    the event engine jumps over are merged into a single chunk.
+        @param      cycle - number of cycles reflected in the current state.
+        """
+        if self.__stats_sink is None or cycle < self.__next_flush:
+            return
+        end_cycle = cycle - cycle % self.__flush_interval
+        self.__stats_sink.flush(self.get_nodes(), end_cycle)
+        self.__next_flush = end_cycle + self.__flush_interval
+
+    # -------------------------------------
+    # Checkpointing
+    # -------------------------------------
+    def set_checkpoint(self, cycle, path):
+        """
+        @brief      Requests a checkpoint of the simulator state to be saved during run.
+        @param      cycle - the checkpoint holds the state after simulating cycles [0, cycle).
+        @param      path - path of the checkpoint file.
+        """
+        assert self.__start_cycle <= cycle <= self.__max_cycles, f"Error: checkpoint cycle {cycle} is outside of the simulated cycles"
+        self.__checkpoint_cycle = cycle
+        self.__checkpoint_path = path
+
+    def __checkpoint_if_due(self, cycle):
+        if self.__checkpoint_cycle is not None and cycle >= self.__checkpoint_cycle:
+            self.save_checkpoint(self.__checkpoint_path, self.__checkpoint_cycle)
+            self.__checkpoint_cycle = None
+
+    def save_checkpoint(self, path, cycle):
+        """
+        @brief      Saves the state of the nodes, ports, links and stats to a file.
+        @param      path - path of the checkpoint file.
+        @param      cycle - the first cycle to simulate when the checkpoint is restored.
+        """
+        links = {}
+        for link_id, link in self.__links.items():
+            links[link_id] = {
+                "link": link.get_state(),
+                "output_port": link.get_output_port().get_state(),
+                "input_port": link.get_input_port().get_state(),
+            }
+        snapshot = {
+            "cycle": cycle,
+            "nodes": {node_id: node.get_state() for node_id, node in self.__nodes.items()},
+            "links": links,
+        }
+
+        # the snapshot is pickled at once so that packets referenced from several
+        # places (e.g. a fifo and a switch queue) are restored as the same object
+        with open(path, "wb") as f:
+            pickle.dump(snapshot, f, protocol = pickle.HIGHEST_PROTOCOL)
+        logger.info(f"Saved checkpoint of cycle {cycle} to {path}")
+
+    def restore_checkpoint(self, path, reset_stats=False):
+        """
+        @brief      Restores the state saved by save_checkpoint. Must be called after setup,
+                    on a simulator built from the same configuration.
+        @param      path - path of the checkpoint file.
+        @param      reset_stats - if True, the stats recorded before the checkpoint are
+                    discarded so that only the cycles after it are measured.
+        """
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+
+        assert snapshot["nodes"].keys() == self.__nodes.keys(), "Error: checkpoint nodes do not match the configuration"
+        assert snapshot["links"].keys() == self.__links.keys(), "Error: checkpoint links do not match the configuration"
+
+        cycle = snapshot["cycle"]
+        assert cycle <= self.__max_cycles, f"Error: checkpoint cycle {cycle} is beyond the number of cycles"
+        self.__start_cycle = cycle
+        if self.__scheduler is not None:
+            self.__scheduler.set_cycle(cycle - 1)
+
+        for link_id, state in snapshot["links"].items():
+            link = self.__links[link_id]
+            link.get_output_port().set_state(state["output_port"])
+            link.get_input_port().set_state(state["input_port"])
+            link.set_state(state["link"], cycle)
+
+        for node_id, state in snapshot["nodes"].items():
+            node = self.__nodes[node_id]
+            stats = node.get_stats()
+            node.set_state(state)
+            if reset_stats:
+                node.set_stats(stats)
+        logger.info(f"Restored checkpoint of cycle {cycle} from {path}")
+
+    def __run_cycle_engine(self):
+        """
+        @brief      Advances every link and every awake node on every cycle.
+        """
+        profiler = self.__profiler
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for cycle in range(self.__start_cycle, self.__max_cycles):
+            self.__checkpoint_if_due(cycle)
+            if debug:
+                logger.debug("=== Cycle %d ===", cycle)
+
+            if profiler is None:
+                for link in self.__links.values():
+                    link.advance(cycle)
+
+                for node in self.__nodes.values():
+                    if node.is_awake(cycle):
+                        node.advance(cycle)
+            else:
+                profiler.advance_links(self.__links.values(), cycle)
+                profiler.advance_nodes([node for node in self.__nodes.values() if node.is_awake(cycle)], cycle)
+
+            self.__flush_stats_if_due(cycle + 1)
+            if self.__terminates(cycle + 1):
+                break
+        self.__checkpoint_if_due(self.__end_cycle)
+
+    def __run_event_engine(self):
+        """
+        @brief      Advances only the links that have a delivery due and the nodes that are
+                    awake, and jumps over the cycles in which there is nothing to do.
+        """
+        scheduler = self.__scheduler
+        profiler = self.__profiler
+        debug = logger.isEnabledFor(logging.DEBUG)
+        cycle = self.__start_cycle
+        while cycle is not None and cycle < self.__max_cycles:
+            # the state does not change over the skipped cycles, so a checkpoint
+            # due in one of them is taken before the next cycle with any work
+            self.__checkpoint_if_due(cycle)
+            if debug:
+                logger.debug("=== Cycle %d ===", cycle)
+            scheduler.set_cycle(cycle)
+
+            if profiler is None:
+                for link in scheduler.pop_due_links(cycle):
+                    link.advance(cycle)
+                scheduler.wake_due_nodes(cycle)
+
+                for node in scheduler.get_active_nodes():
+                    node.advance(cycle)
+            else:
+                profiler.advance_links(scheduler.pop_due_links(cycle), cycle)
+                scheduler.wake_due_nodes(cycle)
+                profiler.advance_nodes(scheduler.get_active_nodes(), cycle)
+
+            cycle = scheduler.next_cycle(cycle)
+            horizon = self.__max_cycles if cycle is None else min(cycle, self.__max_cycles)
+            self.__flush_stats_if_due(horizon)
+            if self.__terminates(horizon):
+                break
+        self.__checkpoint_if_due(self.__end_cycle)
+
     def run(self):
         """
         @brief      Runs the simulation for the specified number of cycles.
         """
-        for cycle in range(self.__max_cycles):
-            logger.debug(f"=== Cycle {cycle} ===")
+        self.__end_cycle = self.__max_cycles
+        interval = self.__check_interval
+        self.__next_check = (self.__start_cycle // interval + 1) * interval
+        if self.__stats_sink is not None:
+            self.__stats_sink.set_start_cycle(self.__start_cycle)
+            self.__next_flush = (self.__start_cycle // self.__flush_interval + 1) * self.__flush_interval
 
-            for link in self.__links.values():
-                link.advance(cycle)
+        if self.__profiler is not None:
+            self.__profiler.start()
+        if self.__engine == "event":
+            self.__run_event_engine()
+        else:
+            self.__run_cycle_engine()
+        if self.__profiler is not None:
+            self.__profiler.stop()
+        if self.__tracer is not None:
+            self.__tracer.close()
 
-            for node in self.__nodes.values():
-                node.advance(cycle)
-            logger.debug(f"\n")
+        if self.__stats_sink is not None:
+            self.__stats_sink.flush(self.get_nodes(), self.__end_cycle, final = True)
+            self.__stats_sink.close()
 
+        if self.__end_cycle < self.__max_cycles:
+            logger.info(f"Termination condition met after {self.__end_cycle} cycles")
+            print(f"Termination condition met after {self.__end_cycle} cycles.")
         print(f"Simulation completed. \nLog files, statistics and plots can be found in ../outputs/ directory")
 
+    def set_profiler(self, profiler):
+        """
+        @brief      Times the phases of the simulation loop and the nodes with the given
+                    profiler, whose report is printed during teardown. Must be called
+                    before run.
+        @param      profiler - Profiler object, see profiler.py.
+        """
+        self.__profiler = profiler
+
+    def set_tracer(self, tracer):
+        """
+        @brief      Records the packet and credit events of the links and ports into the
+                    given tracer, which is closed at the end of run. Must be called before
+                    setup.
+        @param      tracer - Tracer object, see packet_trace.py.
+        """
+        self.__tracer = tracer
+
+    def set_plotter(self, plotter):
+        """
+        @brief      Sets the Plotter used by the stats of every node during teardown.
+        @param      plotter - Plotter object that renders, parallelises or skips the plots.
+        """
+        self.__plotter = plotter
+
     def teardown(self):
         """
         @brief      Calls the teardown method for each node to finalize statistics.
         """
+        if self.__profiler is not None:
+            report = self.__profiler.report()
+            logger.info(report)
+            print(report)
         logger.info(f"===== Statistics =====")
-        for node in self.__nodes.values():
-            node.teardown()
\ No newline at end of file
+        try:
+            for node in self.__nodes.values():
+                if node.has_stats():
+                    node.get_stats().set_plotter(self.__plotter)
+                node.teardown()
+        finally:
+            self.__plotter.close()
\ No newline at end of file
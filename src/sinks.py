@@ -0,0 +1,146 @@
+"""
+@file       sinks.py
+@brief      Streams the statistics of all nodes to disk in columnar chunks while the
+            simulation is running, as an alternative to keeping them in memory for plots.
+@author     Akshay Joshi
+"""
+
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+import logging
+logger = logging.getLogger(__name__)
+
+class StatsSink(ABC):
+    """
+    @class      StatsSink
+    @brief      Base class of the stats export formats. Every flush drains the stats of all
+                nodes and writes them as three column tables:
+                - counters: node_id, name, cycle, value (the counter values at the end of the chunk)
+                - cycles: cycle, plus one boolean column '<node_id>.<name>' per cycle map
+                - intervals: node_id, name, bucket, value (the interval buckets completed in the chunk)
+    """
+    def __init__(self, output_dir):
+        """
+        @brief      A constructor for the StatsSink class.
+        @param      output_dir - directory the chunk files are written to.
+        """
+        os.makedirs(output_dir, exist_ok = True)
+        self.__output_dir = output_dir
+        self.__num_chunks = 0
+        self.__flushed_cycle = 0
+
+    def get_output_dir(self):
+        return self.__output_dir
+
+    def set_start_cycle(self, cycle):
+        """
+        @brief      Sets the first cycle of the first chunk, e.g. when a run is restored.
+        """
+        self.__flushed_cycle = cycle
+
+    def flush(self, nodes, end_cycle, final=False):
+        """
+        @brief      Drains the stats of the nodes and writes them as one chunk.
+        @param      nodes - the Node objects of the simulation.
+        @param      end_cycle - all cycles before end_cycle have been simulated.
+        @param      final - True for the last chunk of the run.
+        """
+        start_cycle = self.__flushed_cycle
+        if end_cycle <= start_cycle and not final:
+            return
+
+        counters = {"node_id": [], "name": [], "cycle": [], "value": []}
+        cycles = {"cycle": np.arange(start_cycle, end_cycle, dtype = np.int64)}
+        intervals = {"node_id": [], "name": [], "bucket": [], "value": []}
+        for node in nodes:
+            if not node.has_stats():
+                continue
+            node_id = node.get_node_id()
+            node_counters, cycle_maps, interval_counters = node.get_stats().drain(start_cycle, end_cycle, final)
+            for name, val in node_counters.items():
+                counters["node_id"].append(node_id)
+                counters["name"].append(name)
+                counters["cycle"].append(end_cycle)
+                counters["value"].append(val)
+            for name, values in cycle_maps.items():
+                cycles[f"{node_id}.{name}"] = values
+            for name, (buckets, values) in interval_counters.items():
+                intervals["node_id"].extend([node_id] * len(buckets))
+                intervals["name"].extend([name] * len(buckets))
+                intervals["bucket"].extend(buckets)
+                intervals["value"].extend(values)
+
+        tables = {
+            "counters": {
+                "node_id": np.array(counters["node_id"], dtype = str),
+                "name": np.array(counters["name"], dtype = str),
+                "cycle": np.array(counters["cycle"], dtype = np.int64),
+                "value": np.array(counters["value"], dtype = np.int64),
+            },
+            "cycles": cycles,
+            "intervals": {
+                "node_id": np.array(intervals["node_id"], dtype = str),
+                "name": np.array(intervals["name"], dtype = str),
+                "bucket": np.array(intervals["bucket"], dtype = np.int64),
+                "value": np.array(intervals["value"], dtype = np.int64),
+            },
+        }
+        self.write_chunk(self.__num_chunks, tables)
+        logger.debug(f"Flushed stats of cycles [{start_cycle}, {end_cycle}) to chunk {self.__num_chunks}")
+        self.__num_chunks += 1
+        self.__flushed_cycle = end_cycle
+
+    @abstractmethod
+    def write_chunk(self, index, tables):
+        """
+        @brief      Writes one chunk. Implemented by every export format.
+        @param      index - sequence number of the chunk.
+        @param      tables - dict mapping a table name to a dict of equally long column arrays.
+        """
+        pass
+
+    def close(self):
+        logger.info(f"Wrote {self.__num_chunks} stats chunks to {self.__output_dir}")
+
+
+class NpzSink(StatsSink):
+    """
+    @class      NpzSink
+    @brief      Writes every chunk as one .npz file with the arrays named '<table>/<column>'.
+    """
+    def write_chunk(self, index, tables):
+        arrays = {}
+        for table, columns in tables.items():
+            for column, values in columns.items():
+                arrays[f"{table}/{column}"] = values
+        np.savez(os.path.join(self.get_output_dir(), f"stats_{index:05d}.npz"), **arrays)
+
+
+class ParquetSink(StatsSink):
+    """
+    @class      ParquetSink
+    @brief      Writes every table of a chunk as a Parquet file '<table>_<index>.parquet'.
+                Requires the optional pyarrow package.
+    """
+    def __init__(self, output_dir):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("The parquet stats format requires the pyarrow package")
+        super().__init__(output_dir)
+        self.__pa = pyarrow
+        self.__pq = pyarrow.parquet
+
+    def write_chunk(self, index, tables):
+        for table, columns in tables.items():
+            path = os.path.join(self.get_output_dir(), f"{table}_{index:05d}.parquet")
+            self.__pq.write_table(self.__pa.table(columns), path)
+
+
+SINKS = {
+    "npz": NpzSink,
+    "parquet": ParquetSink,
+}
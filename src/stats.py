@@ -5,15 +5,125 @@
 """
 
 from collections import defaultdict
-import matplotlib.pyplot as plt
+import numpy as np
 import logging
 logger = logging.getLogger(__name__)
 
+from plotter import Plotter
+
+# renders plots immediately, used unless the simulator provides its own plotter
+DEFAULT_PLOTTER = Plotter()
+
+class CycleMap:
+    """
+    @class      CycleMap
+    @brief      Stores one activity bit per cycle in a bytearray that is preallocated from
+                the length of the run and grows if a later cycle is recorded. Bits of cycles
+                that have been exported can be discarded to keep the memory bounded.
+    """
+    __slots__ = ("__bits", "__offset", "__num_cycles")
+
+    def __init__(self, num_cycles=0):
+        """
+        @brief      A constructor for the CycleMap class.
+        @param      num_cycles - number of cycles to preallocate bits for.
+        """
+        self.__bits = bytearray((num_cycles + 7) >> 3)
+        self.__offset = 0
+        self.__num_cycles = 0
+
+    def record(self, cycle, val):
+        """
+        @brief      Sets the bit of the given cycle.
+        @param      cycle - the simulation time.
+        @param      val - the activity of the cycle, True or False.
+        """
+        assert cycle >= self.__offset, "Error: cannot record a cycle that has already been exported"
+        bits = self.__bits
+        pos = cycle - self.__offset
+        idx = pos >> 3
+        if idx >= len(bits):
+            bits.extend(bytes(max(idx + 1 - len(bits), len(bits))))
+        mask = 1 << (pos & 7)
+        if val:
+            bits[idx] |= mask
+        elif bits[idx] & mask:
+            bits[idx] ^= mask
+        if cycle >= self.__num_cycles:
+            self.__num_cycles = cycle + 1
+
+    def __len__(self):
+        """
+        @brief      Returns the number of cycles up to the last recorded one.
+        """
+        return self.__num_cycles
+
+    def to_array(self, start=None, end=None):
+        """
+        @brief      Unpacks the bits of the cycles [start, end) into a boolean array.
+        @param      start - first cycle, defaults to the first cycle still stored.
+        @param      end - end cycle, defaults to the cycle after the last recorded one.
+                    Cycles after the last recorded one read as False.
+        @return     a numpy array of length end - start.
+        """
+        start = self.__offset if start is None else start
+        end = max(self.__num_cycles, start) if end is None else end
+        assert self.__offset <= start <= end, "Error: cycles have already been discarded"
+
+        values = np.zeros(end - start, dtype = bool)
+        stop = min(end, self.__num_cycles)
+        if stop > start:
+            packed = np.frombuffer(self.__bits, dtype = np.uint8)
+            bits = np.unpackbits(packed, count = stop - self.__offset, bitorder = "little")
+            values[:stop - start] = bits[start - self.__offset:]
+        return values
+
+    def discard_before(self, cycle):
+        """
+        @brief      Frees the bits of the cycles before the given one. Whole bytes are
+                    discarded, so up to seven earlier cycles may be kept.
+        @param      cycle - the first cycle that has to be kept.
+        """
+        num_bytes = min((cycle - self.__offset) >> 3, len(self.__bits))
+        if num_bytes > 0:
+            del self.__bits[:num_bytes]
+            self.__offset += num_bytes << 3
+
+    def count(self):
+        """
+        @brief      Returns the number of stored cycles recorded as active.
+        """
+        return int.from_bytes(self.__bits, "little").bit_count()
+
+
 class Stats:
+    __slots__ = ("__int_counters", "__cycle_map", "__interval_counters", "__num_cycles", "__plotter")
+
     def __init__(self):
         self.__int_counters = defaultdict(int)
-        self.__cycle_map = defaultdict(lambda: defaultdict(bool))
+        self.__cycle_map = {}
         self.__interval_counters = {}
+        self.__num_cycles = 0
+        self.__plotter = None
+
+    def set_plotter(self, plotter):
+        """
+        @brief      Sets the Plotter that renders the plots of these stats.
+        @param      plotter - Plotter object, or None to use the default one.
+        """
+        self.__plotter = plotter
+
+    def get_plotter(self):
+        if self.__plotter is None:
+            return DEFAULT_PLOTTER
+        return self.__plotter
+
+    def set_num_cycles(self, num_cycles):
+        """
+        @brief      Sets the length of the run, used to preallocate the cycle maps.
+        @param      num_cycles - number of cycles that will be simulated.
+        """
+        self.__num_cycles = num_cycles
 
     def register_interval_counter(self, name, interval):
         self.__interval_counters[name] = {
@@ -38,49 +148,56 @@ class Stats:
         assert name in self.__int_counters, "Error: counter name is invalid"
         return self.__int_counters[name]
 
+    def get_counters(self):
+        return dict(self.__int_counters)
+
     def register_cycle(self, name):
         assert name not in self.__cycle_map, "Error: duplicate names for stat cycle map"
-        self.__cycle_map[name]
+        self.__cycle_map[name] = CycleMap(self.__num_cycles)
 
     def record_cycle(self, name, cycle, val):
         assert name in self.__cycle_map, "Error: cycle_map name is invalid"
-        self.__cycle_map[name][cycle] = val
+        self.__cycle_map[name].record(cycle, val)
 
     def get_cycle_map(self, name):
+        """
+        @brief      Returns the activity of every cycle up to the last recorded one.
+        @return     a numpy boolean array indexed by cycle.
+        """
         assert name in self.__cycle_map, "Error: cycle_map name in invalid"
-        return self.__cycle_map[name]
+        return self.__cycle_map[name].to_array()
+
+    def drain(self, start_cycle, end_cycle, final=False):
+        """
+        @brief      Removes and returns the stats recorded in the given cycles, so that they
+                    can be exported while the simulation is running.
+        @param      start_cycle - first cycle that has not been drained yet.
+        @param      end_cycle - all cycles before end_cycle have been simulated.
+        @param      final - if True, interval buckets that are not complete yet are drained too.
+        @return     a tuple (counters, cycle_maps, interval_counters) where counters maps a
+                    counter to its current value, cycle_maps maps a cycle map to a boolean
+                    array of the drained cycles, and interval_counters maps an interval
+                    counter to a (buckets, values) tuple of the completed buckets.
+        """
+        cycle_maps = {}
+        for name, cycle_map in self.__cycle_map.items():
+            cycle_maps[name] = cycle_map.to_array(start_cycle, end_cycle)
+            cycle_map.discard_before(end_cycle)
+
+        interval_counters = {}
+        for name, info in self.__interval_counters.items():
+            interval = info["interval"]
+            buckets = info["buckets"]
+            done = sorted(bucket for bucket in buckets if final or bucket + interval <= end_cycle)
+            interval_counters[name] = (done, [buckets.pop(bucket) for bucket in done])
+
+        return dict(self.__int_counters), cycle_maps, interval_counters
 
     def plot_graph(self, cycle_map, name):
-        cycles = sorted(cycle_map.keys())
-        successes = [int(cycle_map[cycle]) for cycle in cycles]
-
-        plt.figure(figsize = (10, 4))
-        plt.bar(cycles, successes, color = 'skyblue', edgecolor = 'black', width = 0.8)
-        plt.title(f"Activity per Cycle - {name}")
-        plt.xlabel("Cycle")
-        plt.ylabel(f"(1=Yes, 0=No)")
-        plt.ylim(0, 1.2)
-        plt.xticks(cycles)
-        plt.grid(axis = 'y', linestyle = '--', alpha = 0.7)
-
-        filename = f"../outputs/{name}_log.png"
-        plt.tight_layout()
-        plt.savefig(filename)
-        plt.close()
+        self.get_plotter().plot_cycle_map(cycle_map, name)
 
     def plot_interval_graph(self, data, label, interval):
-        x = sorted(data.keys())
-        y = [data[i] for i in x]
-
-        plt.figure(figsize=(10, 4))
-        plt.plot(x, y, marker = 'o')
-        plt.xlabel(f"Cycle interval (every {interval} cycles)")
-        plt.ylabel("Packets sent")
-        plt.title(f"{label}")
-        plt.grid(True)
-        filename = f"../outputs/{label}.png"
-        plt.savefig(filename)
-        plt.close()
+        self.get_plotter().plot_interval_counter(data, label, interval)
 
     def dump_summary(self):
         for name, val in self.__int_counters.items():
@@ -90,7 +207,7 @@ class Stats:
 
     def generate_plots(self):
         for stat_name, cycle_count in self.__cycle_map.items():
-            self.plot_graph(cycle_count, stat_name)
+            self.plot_graph(cycle_count.to_array(), stat_name)
 
         for name, info in self.__interval_counters.items():
             self.plot_interval_graph(info["buckets"], f"{name}", info["interval"])
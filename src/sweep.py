@@ -0,0 +1,206 @@
+"""
+@file       sweep.py
+@brief      Runs a grid of simulations over configuration parameters in a process pool
+            and merges their statistics into one results table.
+@author     Akshay Joshi
+"""
+
+import os
+import io
+import csv
+import sys
+import argparse
+import itertools
+import contextlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from simulator import Simulator
+from parser import Parser
+
+logger = logging.getLogger(__name__)
+
+CONNECTION_FIELDS = ("credit", "fifo_size", "latency", "vcs")
+NODE_FIELDS = ("pattern", "pattern_params", "algorithm", "algorithm_params")
+
+class SweepParser(Parser):
+    """
+    @class      SweepParser
+    @brief      A Parser that overrides fields of the parsed nodes and connections with
+                the values of one point of the sweep.
+    """
+    def __init__(self, node_config, connection_config, user_nodes_dir, overrides):
+        """
+        @brief      A constructor for the SweepParser class.
+        @param      overrides - dict mapping a connection or node field to its value.
+        """
+        super().__init__(node_config, connection_config, user_nodes_dir)
+        self.__overrides = overrides
+
+    def parse(self):
+        super().parse()
+        for field, value in self.__overrides.items():
+            if field in CONNECTION_FIELDS:
+                for connection in self.connections:
+                    setattr(connection, field, int(value))
+            elif field.startswith("pattern"):
+                # only nodes that are configured with a pattern take part in the sweep
+                for node in self.nodes:
+                    if node.get_pattern():
+                        setattr(node, field, value)
+            else:
+                # and only switches that are configured with an algorithm
+                for node in self.nodes:
+                    if node.get_algorithm():
+                        setattr(node, field, value)
+
+
+def build_grid(cycles, settings):
+    """
+    @brief      Builds the list of sweep points from the cartesian product of the values.
+    @param      cycles - list of cycle counts to simulate.
+    @param      settings - list of (field, values) tuples.
+    @return     a list of (cycles, overrides) tuples.
+    """
+    fields = [field for field, _ in settings]
+    grid = []
+    for n_cycles in cycles:
+        for values in itertools.product(*(values for _, values in settings)):
+            grid.append((n_cycles, dict(zip(fields, values))))
+    return grid
+
+def init_worker(user_nodes_dir):
+    """
+    @brief      Initialises a worker process of the pool. The worker is reused for many
+                sweep points, so user modules are imported only once per worker.
+    @param      user_nodes_dir - path to the directory containing user-defined nodes.
+    """
+    logging.disable(logging.CRITICAL)
+    if user_nodes_dir not in sys.path:
+        sys.path.append(user_nodes_dir)
+
+def run_point(node_config, connection_config, user_nodes_dir, engine, cycles, overrides, parser_class=SweepParser,
+              routing_policy="static"):
+    """
+    @brief      Runs the simulation of one sweep point.
+    @param      parser_class - Parser subclass that applies the overrides, SweepParser by default.
+    @param      routing_policy - routing policy of the switches, see Simulator.
+    @return     a list of (node_id, stat, value) tuples with the counters of every node.
+    """
+    parser = parser_class(node_config, connection_config, user_nodes_dir, overrides)
+    sim = Simulator(cycles, parser, engine, routing_policy = routing_policy)
+    sim.setup()
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim.run()
+
+    rows = []
+    for node in sim.get_nodes():
+        if not node.has_stats():
+            continue
+        for name, val in node.get_stats().get_counters().items():
+            rows.append((node.get_node_id(), name, val))
+    return rows
+
+def parse_setting(text):
+    """
+    @brief      Parses a '--set field=v1,v2,...' argument.
+    @return     a (field, values) tuple.
+    """
+    if "=" not in text:
+        raise argparse.ArgumentTypeError(f"Expected field=v1,v2,... Got: {text}")
+    field, values = text.split("=", 1)
+    if field not in CONNECTION_FIELDS + NODE_FIELDS:
+        raise argparse.ArgumentTypeError(f"Unknown field {field}, expected one of {CONNECTION_FIELDS + NODE_FIELDS}")
+    values = values.split(",")
+    if field in CONNECTION_FIELDS:
+        for value in values:
+            if not value.isdigit() or int(value) <= 0:
+                raise argparse.ArgumentTypeError(f"Field {field} takes positive integers. Got: {value}")
+    return field, values
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--nodes",
+        type = str,
+        required = True,
+        help = "Relative path to the nodes csv file"
+    )
+    parser.add_argument(
+        "--connections",
+        type = str,
+        required = True,
+        help = "Relative path to the topology csv file"
+    )
+    parser.add_argument(
+        "--inputs",
+        type = str,
+        required = True,
+        help = "Relative path to the directory containing user-defined node implementations"
+    )
+    parser.add_argument(
+        "--cycles",
+        type = int,
+        nargs = "+",
+        default = [10],
+        help = "One or more numbers of simulation cycles to sweep over (default: 10)"
+    )
+    parser.add_argument(
+        "--set",
+        type = parse_setting,
+        action = "append",
+        default = [],
+        dest = "settings",
+        help = "field=v1,v2,... to sweep over, where field is one of "
+               "credit, fifo_size, latency, vcs (applied to every connection) or "
+               "pattern, pattern_params (applied to every node with a pattern) or "
+               "algorithm, algorithm_params (applied to every node with an algorithm). May be repeated"
+    )
+    parser.add_argument(
+        "--engine",
+        type = str,
+        default = "cycle",
+        choices = list(Simulator.ENGINES),
+        help = "Simulation engine used for every point (default: cycle)"
+    )
+    parser.add_argument(
+        "--workers",
+        type = int,
+        default = os.cpu_count(),
+        help = "Number of worker processes (default: number of CPUs)"
+    )
+    parser.add_argument(
+        "--output",
+        type = str,
+        default = "../outputs/sweep.csv",
+        help = "Path of the merged results table (default: ../outputs/sweep.csv)"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    node_config = os.path.abspath(args.nodes)
+    connection_config = os.path.abspath(args.connections)
+    user_nodes_dir = os.path.abspath(args.inputs)
+
+    grid = build_grid(args.cycles, args.settings)
+    fields = [field for field, _ in args.settings]
+    print(f"Running {len(grid)} simulations on {args.workers} workers")
+
+    with ProcessPoolExecutor(max_workers = args.workers, initializer = init_worker, initargs = (user_nodes_dir,)) as pool:
+        futures = [
+            pool.submit(run_point, node_config, connection_config, user_nodes_dir, args.engine, cycles, overrides)
+            for cycles, overrides in grid
+        ]
+
+        with open(args.output, "w", newline = '') as f:
+            writer = csv.writer(f)
+            writer.writerow(["point", "cycles"] + fields + ["node_id", "stat", "value"])
+            for point, ((cycles, overrides), future) in enumerate(zip(grid, futures)):
+                for node_id, name, val in future.result():
+                    writer.writerow([point, cycles] + [overrides[field] for field in fields] + [node_id, name, val])
+
+    print(f"Sweep completed. Results can be found in {args.output}")
@@ -0,0 +1,280 @@
+"""
+@file       switches.py
+@brief      An input-buffered switch with selectable scheduling algorithms, shared by the
+            switch modules of the example networks, which only name it.
+@author     Akshay Joshi
+"""
+
+from collections import deque
+import logging
+logger = logging.getLogger(__name__)
+
+from node import Node
+from packet import Packet
+from port import InputPort, OutputPort
+from allocators import make_allocator, VirtualOutputQueues
+
+class SchedulingSwitch(Node):
+    """
+    @class      SchedulingSwitch
+    @brief      Forwards the packets of its input ports to the outputs given by the
+                routing table with one of the scheduling algorithms in algo_map, chosen
+                with the algorithm and algorithm_params columns of nodes.csv, see
+                allocators.py.
+    """
+    def __init__(self, algorithm="fifo"):
+        super().__init__()
+        self.processing_latency = 1
+        self.routing_table = None
+        self.sched_queues = []
+        self.allocator = None
+        self.head_cycles = []
+        self.head_routes = []
+        self.voqs = None
+        self.voq_vcs = []
+
+        # map available algorithms to their functions
+        # fifo:      one queue per output port in arrival order
+        # islip:     iSLIP matching of the input heads, params: number of iterations
+        # wavefront: wavefront matching of the input heads
+        # voq:       virtual output queues matched with iSLIP, params: queue size per input and iterations
+        self.algo_map = {
+            "fifo": self.fifo_algorithm,
+            "islip": self.allocator_algorithm,
+            "wavefront": self.allocator_algorithm,
+            "voq": self.voq_algorithm,
+        }
+        self.set_algorithm(algorithm, "")
+
+    def set_algorithm(self, algorithm, params):
+        if algorithm not in self.algo_map:
+            raise ValueError(f"Unknown scheduling algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.algorithm_params = params.split(":") if params else []
+        self.algo_fn = self.algo_map[algorithm]
+
+    def set_pattern(self, pattern, params):
+        # a switch has no traffic pattern, the algorithm columns select its scheduling
+        if pattern:
+            raise ValueError(f"Switch {self.get_node_id()} got the pattern {pattern}, "
+                             f"its scheduling algorithm goes in the algorithm column")
+
+    def setup(self):
+        # resolve the port handles once, the scheduling queues are indexed by output handle
+        self.in_ids = self.get_input_port_ids()
+        self.out_ids = self.get_output_port_ids()
+
+        # initialize the scheduling queues for all output ports
+        self.sched_queues = [deque() for _ in self.out_ids]
+
+        # initialize the allocator and the cycle at which every input VC head became visible
+        params = self.algorithm_params
+        if self.algorithm == "voq":
+            self.voqs = VirtualOutputQueues(len(self.in_ids), len(self.out_ids), int(params[0]) if params else 8)
+            self.allocator = make_allocator("islip", len(self.in_ids), len(self.out_ids), params[1:])
+            # the virtual channel every input moves a packet from next, round-robin
+            self.voq_vcs = [0] * len(self.in_ids)
+        elif self.algorithm != "fifo":
+            self.allocator = make_allocator(self.algorithm, len(self.in_ids), len(self.out_ids), params)
+        self.head_cycles = [[None] * self.get_input_port_at(in_h).get_num_vcs() for in_h in range(len(self.in_ids))]
+
+        # the output chosen for every input VC head, and whether an input comes from a
+        # terminal, which lets the ugal routing policy take a non-minimal route
+        self.head_routes = [[-1] * self.get_input_port_at(in_h).get_num_vcs() for in_h in range(len(self.in_ids))]
+        self.injection = []
+        for in_h in range(len(self.in_ids)):
+            upstream = self.get_input_port_at(in_h).get_connected_link().get_output_port().get_node()
+            self.injection.append(not hasattr(upstream, "set_routing_table"))
+
+        # register stats, the per-port counters show how well the load is balanced
+        self.register_counter_stats(f"pkts_forwarded")
+        self.port_counters = [f"pkts_forwarded_{out_id}" for out_id in self.out_ids]
+        for name in self.port_counters:
+            self.register_counter_stats(name)
+        self.register_cycle_stats(f"{self.get_node_id()}")
+        self.register_interval_counter_stats(f"{self.get_node_id()}_cumulative_pkts", interval=1)
+
+    def get_state(self):
+        state = super().get_state()
+        state["sched_queues"] = [list(queue) for queue in self.sched_queues]
+        state["allocator"] = self.allocator
+        state["head_cycles"] = [list(cycles) for cycles in self.head_cycles]
+        state["head_routes"] = [list(routes) for routes in self.head_routes]
+        state["voqs"] = self.voqs
+        state["voq_vcs"] = list(self.voq_vcs)
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.sched_queues = [deque(queue) for queue in state["sched_queues"]]
+        self.allocator = state["allocator"]
+        self.head_cycles = [list(cycles) for cycles in state["head_cycles"]]
+        self.head_routes = [list(routes) for routes in state["head_routes"]]
+        self.voqs = state["voqs"]
+        self.voq_vcs = list(state["voq_vcs"])
+
+    def set_routing_table(self, table):
+        # the routing table is computed by the simulator from the topology, see routing.py
+        self.routing_table = table
+
+    def route(self, pkt, in_h, in_vc):
+        # the output of a head packet is chosen once, since an adaptive choice may change
+        # from one cycle to the next
+        out_h = self.head_routes[in_h][in_vc]
+        if out_h < 0:
+            out_h = self.routing_table.select_port(pkt.get_dst_node_id(), self.port_load, self.injection[in_h])
+            self.head_routes[in_h][in_vc] = out_h
+        return out_h
+
+    def port_load(self, out_h):
+        """
+        @brief      Returns the load of an output port for adaptive routing: the packets
+                    waiting in the switch for the port and the packets sent on it that have
+                    not been credited back.
+        """
+        load = self.get_output_port_at(out_h).get_occupancy() + len(self.sched_queues[out_h])
+        if self.voqs is not None:
+            load += self.voqs.queued(out_h)
+        return load
+
+    def pop_head(self, in_h, in_vc, cycle):
+        self.head_routes[in_h][in_vc] = -1
+        return self.recv_pkt_on(in_h, cycle, in_vc)
+
+    def advance(self, cycle):
+        self.record_cycle_stats(f"{self.get_node_id()}", cycle, False)
+
+        self.algo_fn(cycle)
+
+        # sleep until a packet or credit arrives if there is nothing to forward
+        if self.is_idle():
+            self.sleep_until_event()
+
+    def is_done(self):
+        if self.voqs is not None and not self.voqs.is_empty():
+            return False
+        return not any(self.sched_queues)
+
+    def is_idle(self):
+        """
+        @brief      Checks whether the switch has no queued or buffered packets.
+        @return     True if the scheduling queues and input ports are all empty.
+        """
+        if not self.is_done():
+            return False
+        return all(self.get_input_port_at(in_h).is_empty() for in_h in range(len(self.in_ids)))
+
+    def forward(self, pkt, in_h, out_h, out_vc, cycle):
+        self.send_pkt_on(out_h, pkt, cycle, out_vc)
+
+        # record the stats
+        logger.debug("Switch forwarded packet %s from %s to %s", pkt, self.in_ids[in_h], self.out_ids[out_h])
+        self.incr_counter_stats("pkts_forwarded", 1)
+        self.incr_counter_stats(self.port_counters[out_h], 1)
+        self.record_cycle_stats(f"{self.get_node_id()}", cycle, True)
+        self.incr_interval_counter_stats(f"{self.get_node_id()}_cumulative_pkts", cycle, self.get_stats().get_counter("pkts_forwarded"))
+
+    # ------------------------------------------
+    # Scheduling algorithms
+    # ------------------------------------------
+    def fifo_algorithm(self, cycle):
+        # step 1: service/grant the existing inputs in the scheduling queues
+        for out_h in range(len(self.sched_queues)):
+            self.fifo_grant(out_h, cycle)
+
+        # step 2: add current inputs to scheduling queues
+        for in_h, in_id in enumerate(self.in_ids):
+            input_port = self.get_input_port_at(in_h)
+            for in_vc in range(input_port.get_num_vcs()):
+                # peek at the packet at the head of the virtual channel
+                pkt = input_port.peek(in_vc)
+                if not pkt:
+                    continue
+                # check the dest node id and add to the tail of the appropriate scheduling queue
+                out_h = self.route(pkt, in_h, in_vc)
+                queue = self.sched_queues[out_h]
+                ready_cycle = cycle + self.processing_latency
+                # if the scheduling queue is empty or the last packet in the queue will be sent at the same cycle,
+                # append the new packet to the queue
+                # this means that at any point in time, the scheduling queue will have packets that are ready to be sent at the same cycle
+                if not queue or queue[-1][0] == ready_cycle:
+                    queue.append((ready_cycle, pkt, in_h, in_vc))
+                    logger.debug("Switch received packet %s from %s and queued for %s", pkt, in_id, self.out_ids[out_h])
+
+    def fifo_grant(self, out_h, cycle):
+        # check if there are packets to process and if the output port has credits
+        queue = self.sched_queues[out_h]
+        if not queue:
+            return
+        # VC allocation: the packet moves to the virtual channel of the output port with
+        # the most credits
+        out_vc = self.get_output_port_at(out_h).select_vc()
+        if out_vc < 0:
+            return
+
+        # check if the first packet in the queue is ready to be sent
+        ready_cycle, pkt, in_h, in_vc = queue[0]
+        if ready_cycle > cycle:
+            return
+
+        # dequeue the packet and send it
+        queue.popleft()
+        self.pop_head(in_h, in_vc, cycle)
+        self.forward(pkt, in_h, out_h, out_vc, cycle)
+
+    def allocator_algorithm(self, cycle):
+        out_vcs = [self.get_output_port_at(out_h).select_vc() for out_h in range(len(self.out_ids))]
+
+        # every input VC head that has spent the processing latency in the switch requests
+        # its output, the oldest head of an input wins if several want the same output
+        requests = []
+        for in_h, head_cycles in enumerate(self.head_cycles):
+            input_port = self.get_input_port_at(in_h)
+            wanted = {}
+            for in_vc, head_cycle in enumerate(head_cycles):
+                pkt = input_port.peek(in_vc)
+                if not pkt:
+                    continue
+                if head_cycle is None:
+                    head_cycle = head_cycles[in_vc] = cycle
+                if head_cycle + self.processing_latency > cycle:
+                    continue
+                out_h = self.route(pkt, in_h, in_vc)
+                if out_vcs[out_h] >= 0 and (out_h not in wanted or head_cycle < head_cycles[wanted[out_h]]):
+                    wanted[out_h] = in_vc
+            requests.append(wanted)
+
+        for in_h, out_h in self.allocator.allocate(requests):
+            in_vc = requests[in_h][out_h]
+            pkt = self.pop_head(in_h, in_vc, cycle)
+            # the next packet of the virtual channel becomes the head in this cycle
+            self.head_cycles[in_h][in_vc] = cycle if self.get_input_port_at(in_h).peek(in_vc) else None
+            self.forward(pkt, in_h, out_h, out_vcs[out_h], cycle)
+
+    def voq_algorithm(self, cycle):
+        voqs = self.voqs
+        out_vcs = [self.get_output_port_at(out_h).select_vc() for out_h in range(len(self.out_ids))]
+
+        # step 1: match the ready heads of the virtual output queues
+        requests = voqs.requests(cycle, [out_vc >= 0 for out_vc in out_vcs])
+        for in_h, out_h in self.allocator.allocate(requests):
+            self.forward(voqs.pop(in_h, out_h), in_h, out_h, out_vcs[out_h], cycle)
+
+        # step 2: move one packet per input from the input port into the virtual output
+        # queues, so that an input is read once per cycle as in the other algorithms
+        for in_h, in_id in enumerate(self.in_ids):
+            if not voqs.has_space(in_h):
+                continue
+            input_port = self.get_input_port_at(in_h)
+            num_vcs = input_port.get_num_vcs()
+            for i in range(num_vcs):
+                in_vc = (self.voq_vcs[in_h] + i) % num_vcs
+                pkt = input_port.peek(in_vc)
+                if not pkt:
+                    continue
+                out_h = self.route(pkt, in_h, in_vc)
+                self.pop_head(in_h, in_vc, cycle)
+                voqs.push(in_h, out_h, cycle + self.processing_latency, pkt)
+                logger.debug("Switch received packet %s from %s and queued for %s", pkt, in_id, self.out_ids[out_h])
+                self.voq_vcs[in_h] = (in_vc + 1) % num_vcs
+                break
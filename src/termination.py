@@ -0,0 +1,87 @@
+"""
+@file       termination.py
+@brief      Provides built-in termination conditions that stop a simulation before the
+            maximum number of cycles is reached.
+@author     Akshay Joshi
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+class Drained:
+    """
+    @class      Drained
+    @brief      Holds once every node is done and no packet is left in a link pipeline or
+                an input port fifo.
+    """
+    def __call__(self, sim, cycle):
+        for node in sim.get_nodes():
+            if not node.is_done():
+                return False
+        for link in sim.get_links():
+            if not link.is_empty() or not link.get_input_port().is_empty():
+                return False
+        logger.info(f"Network drained after {cycle} cycles")
+        return True
+
+
+class SteadyState:
+    """
+    @class      SteadyState
+    @brief      Holds once the windowed throughput of a counter, summed over all nodes that
+                registered it, has settled. The throughput of a window is the increase of
+                the counter over the window divided by its length, and it has settled when
+                the last few windows all lie within the relative tolerance of their mean.
+                The windows are taken from a plain counter rather than the interval
+                counters of Stats: those are named per node, use the interval chosen by
+                each node, hold cumulative values in some of them, and lose their
+                completed buckets when the stats are streamed to disk, whereas the
+                difference of a counter gives the same window for every node
+                implementation.
+    """
+    def __init__(self, counter, tolerance=0.05, num_windows=3, window=100):
+        """
+        @brief      A constructor for the SteadyState class.
+        @param      counter - name of the counter stat, e.g. 'pkts_recvd'.
+        @param      tolerance - allowed relative deviation from the mean throughput.
+        @param      num_windows - number of consecutive windows that have to agree.
+        @param      window - minimum length of a window in cycles. A window ends at the
+                    first check at least this many cycles after it started.
+        """
+        assert tolerance >= 0, "Error: tolerance should not be negative"
+        assert num_windows > 1, "Error: at least two windows are needed to detect steady state"
+        assert window > 0, "Error: window length should be positive"
+        self.__counter = counter
+        self.__tolerance = tolerance
+        self.__num_windows = num_windows
+        self.__window = window
+        self.__last_total = None
+        self.__last_cycle = None
+        self.__throughputs = []
+
+    def __total(self, sim):
+        total = 0
+        for node in sim.get_nodes():
+            if node.has_stats():
+                total += node.get_stats().get_counters().get(self.__counter, 0)
+        return total
+
+    def __call__(self, sim, cycle):
+        if self.__last_cycle is not None and cycle - self.__last_cycle < self.__window:
+            return False
+        total = self.__total(sim)
+        if self.__last_total is not None:
+            self.__throughputs.append((total - self.__last_total) / (cycle - self.__last_cycle))
+            self.__throughputs = self.__throughputs[-self.__num_windows:]
+        self.__last_total = total
+        self.__last_cycle = cycle
+
+        if len(self.__throughputs) < self.__num_windows:
+            return False
+        mean = sum(self.__throughputs) / len(self.__throughputs)
+        if mean == 0:
+            return False
+        if all(abs(tp - mean) <= self.__tolerance * mean for tp in self.__throughputs):
+            logger.info(f"Throughput of {self.__counter} settled at {mean:.4f} per cycle after {cycle} cycles")
+            return True
+        return False
@@ -0,0 +1,327 @@
+"""
+@file       topology.py
+@brief      Generators of common topologies that build the NodeSetup and ConnectionSetup
+            lists directly, so large networks do not go through CSV files. A generator can
+            be used wherever a Parser is expected.
+@author     Akshay Joshi
+"""
+
+import os
+import itertools
+import logging
+from abc import ABC, abstractmethod
+
+from parser import NodeSetup, ConnectionSetup
+from traffic import REPLAY
+
+logger = logging.getLogger(__name__)
+
+class Topology(ABC):
+    """
+    @class      Topology
+    @brief      Base class of the generators. Every terminal is a producer A<i> that injects
+                into a switch and a consumer B<i> that ejects from one, so bidirectional
+                topologies attach both to the same switch. By default producer i sends to
+                consumer (i + shift) mod N, which crosses the bisection for shift = N/2.
+                With a traffic pattern the terminals are a TrafficGenerator, or a
+                TraceReplay for the pattern 'replay', and a TrafficSink instead, see
+                traffic.py.
+                Subclasses implement build, which adds the switches and links.
+    """
+    def __init__(self, user_nodes_dir, credit=5, fifo_size=5, latency=2, vcs=1, shift=None,
+                 switch="newSwitch.NewSwitch", producer="newProducer.NewProducer", consumer="newConsumer.NewConsumer",
+                 algorithm="", algorithm_params="", traffic=None, traffic_params="", warmup=0):
+        """
+        @brief      A constructor for the Topology class.
+        @param      user_nodes_dir - path to the directory containing the node implementations.
+        @param      credit, fifo_size, latency, vcs - parameters of every link, see ConnectionSetup.
+        @param      shift - destination offset of the producers, half the terminals by default.
+        @param      switch, producer, consumer - 'module.Class' of the nodes.
+        @param      algorithm, algorithm_params - scheduling algorithm of the switches and its
+                    parameters separated by ':', e.g. 'voq' with '32:4'.
+        @param      traffic - one of traffic.PATTERNS or traffic.REPLAY to use the built-in
+                    traffic nodes.
+        @param      traffic_params - pattern_params of the generators without the number of
+                    terminals, e.g. 'rate=0.3:injection=bursty'.
+        @param      warmup - warm-up cycle of the sinks.
+        """
+        self.__user_nodes_dir = user_nodes_dir
+        self.__link_params = (int(credit), int(fifo_size), int(latency), int(vcs))
+        self.__shift = None if shift is None else int(shift)
+        self.__classes = {"switch": switch, "producer": producer, "consumer": consumer}
+        self.__algorithm = (algorithm, algorithm_params)
+        self.__traffic = traffic
+        self.__traffic_params = traffic_params
+        self.__warmup = int(warmup)
+        if traffic is not None:
+            producer = "traffic.TraceReplay" if traffic == REPLAY else "traffic.TrafficGenerator"
+            self.__classes.update(producer = producer, consumer = "traffic.TrafficSink")
+        self.__num_ports = {}
+        self.nodes = []
+        self.connections = []
+
+    def __add_node(self, kind, node_id, pattern="", pattern_params="", algorithm=("", "")):
+        module_name, _, class_name = self.__classes[kind].rpartition(".")
+        self.nodes.append(NodeSetup(module_name, class_name, node_id, pattern, pattern_params, *algorithm))
+
+    def add_switch(self, node_id):
+        """
+        @brief      Adds a switch.
+        @param      node_id - a string representing ID of the switch.
+        """
+        self.__add_node("switch", node_id, algorithm = self.__algorithm)
+        self.__num_ports[node_id] = [0, 0]
+
+    def connect(self, src_node, dst_node):
+        """
+        @brief      Adds a unidirectional link between two switches, with the next free port
+                    of each, named like '<switch>_<index>_out' and '<switch>_<index>_in'.
+        """
+        out_idx = self.__num_ports[src_node][1]
+        in_idx = self.__num_ports[dst_node][0]
+        self.__num_ports[src_node][1] += 1
+        self.__num_ports[dst_node][0] += 1
+        self.connections.append(ConnectionSetup(
+            src_node, f"{src_node}_{out_idx}_out", dst_node, f"{dst_node}_{in_idx}_in", *self.__link_params
+        ))
+
+    def connect_both(self, node_a, node_b):
+        self.connect(node_a, node_b)
+        self.connect(node_b, node_a)
+
+    def add_terminals(self, inject_switches, eject_switches):
+        """
+        @brief      Adds producer A<i> attached to inject_switches[i] and consumer B<i>
+                    attached to eject_switches[i].
+        """
+        assert len(inject_switches) == len(eject_switches), "Error: every terminal needs a switch in each direction"
+        num_terminals = len(inject_switches)
+        shift = num_terminals // 2 if self.__shift is None else self.__shift
+        for i, switch_id in enumerate(inject_switches):
+            producer_id = f"A{i}"
+            if self.__traffic is None:
+                self.__add_node("producer", producer_id, "alternate", f"B{(i + shift) % num_terminals}")
+            else:
+                params = f"terminals={num_terminals}" + (f":{self.__traffic_params}" if self.__traffic_params else "")
+                self.__add_node("producer", producer_id, self.__traffic, params)
+            in_idx = self.__num_ports[switch_id][0]
+            self.__num_ports[switch_id][0] += 1
+            self.connections.append(ConnectionSetup(
+                producer_id, f"{producer_id}_out", switch_id, f"{switch_id}_{in_idx}_in", *self.__link_params
+            ))
+        for i, switch_id in enumerate(eject_switches):
+            consumer_id = f"B{i}"
+            self.__add_node("consumer", consumer_id, "", f"warmup={self.__warmup}" if self.__traffic is not None else "")
+            out_idx = self.__num_ports[switch_id][1]
+            self.__num_ports[switch_id][1] += 1
+            self.connections.append(ConnectionSetup(
+                switch_id, f"{switch_id}_{out_idx}_out", consumer_id, f"{consumer_id}_in", *self.__link_params
+            ))
+
+    @abstractmethod
+    def build(self):
+        """
+        @brief      Adds the switches, the links between them and the terminals.
+        """
+        pass
+
+    def get_user_nodes_dir(self):
+        return self.__user_nodes_dir
+
+    def fingerprint(self):
+        """
+        @brief      Returns the generator class and its parameters, which identify the
+                    network without generating it, see Parser.fingerprint. The source of
+                    the generators is part of the cache key, see topology_cache.py.
+        @return     a bytes object.
+        """
+        # the generated entries and the port counters are the output, not the parameters
+        params = sorted((name, value) for name, value in vars(self).items()
+                        if name not in ("nodes", "connections", "_Topology__num_ports"))
+        return repr((type(self).__module__, type(self).__qualname__, params)).encode()
+
+    def parse(self):
+        """
+        @brief      Generates the nodes and connections, see Parser.parse.
+        """
+        # generating again (e.g. in a worker process) must not duplicate the entries
+        self.nodes = []
+        self.connections = []
+        self.__num_ports = {}
+        self.build()
+        logger.info(f"{type(self).__name__} has {len(self.nodes)} nodes and {len(self.connections)} links")
+        if self.__user_nodes_dir not in os.sys.path:
+            os.sys.path.append(self.__user_nodes_dir)
+
+
+class FatTree(Topology):
+    """
+    @class      FatTree
+    @brief      A three-level k-ary fat-tree: k pods of k/2 edge and k/2 aggregation
+                switches, (k/2)^2 core switches and k^3/4 terminals.
+    """
+    def __init__(self, user_nodes_dir, k=4, **params):
+        super().__init__(user_nodes_dir, **params)
+        self.k = int(k)
+        if self.k < 2 or self.k % 2 != 0:
+            raise ValueError(f"Fat-tree radix should be an even number of at least 2. Got: {self.k}")
+
+    def build(self):
+        half = self.k // 2
+        cores = [f"C{i}" for i in range(half * half)]
+        for core in cores:
+            self.add_switch(core)
+        edges = []
+        for pod in range(self.k):
+            aggs = [f"G{pod}_{i}" for i in range(half)]
+            pod_edges = [f"E{pod}_{i}" for i in range(half)]
+            for switch_id in aggs + pod_edges:
+                self.add_switch(switch_id)
+            for i, agg in enumerate(aggs):
+                for j in range(half):
+                    self.connect_both(agg, cores[i * half + j])
+                for edge in pod_edges:
+                    self.connect_both(agg, edge)
+            edges += pod_edges
+        hosts = [edge for edge in edges for _ in range(half)]
+        self.add_terminals(hosts, hosts)
+
+
+class Mesh(Topology):
+    """
+    @class      Mesh
+    @brief      An n-dimensional mesh with one terminal per switch, or a torus if the
+                dimensions wrap around.
+    """
+    wrap = False
+
+    def __init__(self, user_nodes_dir, dims="4x4", **params):
+        super().__init__(user_nodes_dir, **params)
+        self.dims = [int(size) for size in str(dims).split("x")]
+        if not all(size > 0 for size in self.dims):
+            raise ValueError(f"Mesh dimensions should be positive. Got: {dims}")
+
+    def build(self):
+        coords = list(itertools.product(*(range(size) for size in self.dims)))
+        name = lambda coord: "S" + "_".join(str(c) for c in coord)
+        for coord in coords:
+            self.add_switch(name(coord))
+        for coord in coords:
+            for dim, size in enumerate(self.dims):
+                if coord[dim] + 1 < size:
+                    neighbour = coord[dim] + 1
+                elif self.wrap and size > 2:
+                    neighbour = 0
+                else:
+                    continue
+                self.connect_both(name(coord), name(coord[:dim] + (neighbour,) + coord[dim + 1:]))
+        switches = [name(coord) for coord in coords]
+        self.add_terminals(switches, switches)
+
+
+class Torus(Mesh):
+    """
+    @class      Torus
+    @brief      An n-dimensional torus: a mesh whose dimensions of more than two switches
+                wrap around.
+    """
+    wrap = True
+
+
+class Butterfly(Topology):
+    """
+    @class      Butterfly
+    @brief      A unidirectional k-ary n-fly: n stages of k^(n-1) switches with k inputs and
+                k outputs, and k^n terminals. Stage s sets digit n-2-s of the switch index,
+                so there is exactly one path between every producer and consumer.
+    """
+    def __init__(self, user_nodes_dir, k=2, n=3, **params):
+        super().__init__(user_nodes_dir, **params)
+        self.k = int(k)
+        self.n = int(n)
+        if self.k < 2 or self.n < 1:
+            raise ValueError(f"Butterfly needs k >= 2 and n >= 1. Got: k={self.k}, n={self.n}")
+
+    def build(self):
+        k, n = self.k, self.n
+        width = k ** (n - 1)
+        name = lambda stage, idx: f"S{stage}_{idx}"
+        for stage in range(n):
+            for idx in range(width):
+                self.add_switch(name(stage, idx))
+        for stage in range(n - 1):
+            weight = k ** (n - 2 - stage)
+            # the switches at one stage are wired in order of the digit their inputs replace,
+            # so the input index of a link equals the digit of its source
+            for digit in range(k):
+                for idx in range(width):
+                    old_digit = (idx // weight) % k
+                    if old_digit != digit:
+                        continue
+                    for out_digit in range(k):
+                        self.connect(name(stage, idx), name(stage + 1, idx + (out_digit - old_digit) * weight))
+        terminals = [name(0, t // k) for t in range(k ** n)]
+        self.add_terminals(terminals, [name(n - 1, t // k) for t in range(k ** n)])
+
+
+class Clos(Topology):
+    """
+    @class      Clos
+    @brief      A unidirectional three-stage Clos network C(m, n, r): r ingress switches with
+                n terminals each, m middle switches and r egress switches with n terminals
+                each. multi_stage_arch is C(2, 2, 2).
+    """
+    def __init__(self, user_nodes_dir, m=2, n=2, r=2, **params):
+        super().__init__(user_nodes_dir, **params)
+        self.m = int(m)
+        self.n = int(n)
+        self.r = int(r)
+        if self.m <= 0 or self.n <= 0 or self.r <= 0:
+            raise ValueError(f"Clos parameters should be positive. Got: m={self.m}, n={self.n}, r={self.r}")
+
+    def build(self):
+        ingress = [f"I{i}" for i in range(self.r)]
+        middle = [f"M{i}" for i in range(self.m)]
+        egress = [f"O{i}" for i in range(self.r)]
+        for switch_id in ingress + middle + egress:
+            self.add_switch(switch_id)
+        for switch_id in ingress:
+            for mid in middle:
+                self.connect(switch_id, mid)
+        for mid in middle:
+            for switch_id in egress:
+                self.connect(mid, switch_id)
+        self.add_terminals([switch_id for switch_id in ingress for _ in range(self.n)],
+                           [switch_id for switch_id in egress for _ in range(self.n)])
+
+
+TOPOLOGIES = {
+    "fat_tree": FatTree,
+    "mesh": Mesh,
+    "torus": Torus,
+    "butterfly": Butterfly,
+    "clos": Clos,
+}
+
+def make_topology(spec, user_nodes_dir):
+    """
+    @brief      Creates a generator from a 'name:param=value,param=value' specification,
+                e.g. 'fat_tree:k=8,latency=1', 'torus:dims=8x8x8' or
+                'mesh:dims=8x8,traffic=uniform,traffic_params=rate=0.3:injection=bursty' or
+                'mesh:dims=8x8,traffic=replay,traffic_params=file=../traces/app.npy'.
+    @param      user_nodes_dir - path to the directory containing the node implementations.
+    @return     a Topology object.
+    """
+    name, _, params = spec.partition(":")
+    if name not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology: {name}, expected one of {list(TOPOLOGIES)}")
+    kwargs = {}
+    for param in filter(None, params.split(",")):
+        if "=" not in param:
+            raise ValueError(f"Expected param=value in topology {spec}. Got: {param}")
+        key, value = param.split("=", 1)
+        kwargs[key] = value
+    try:
+        return TOPOLOGIES[name](user_nodes_dir, **kwargs)
+    except TypeError as e:
+        raise ValueError(f"Invalid parameters for topology {name}: {e}")
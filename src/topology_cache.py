@@ -0,0 +1,194 @@
+"""
+@file       topology_cache.py
+@brief      Stores the parsed network and its routing tables in a binary directory of
+            numpy arrays, keyed by a hash of the inputs, so later runs of the same network
+            skip parsing and the routing computation.
+@author     Akshay Joshi
+"""
+
+import os
+import sys
+import glob
+import shutil
+import hashlib
+import tempfile
+import logging
+from array import array
+
+import numpy as np
+
+import node as node_module
+import parser as parser_module
+import routing as routing_module
+import switches as switches_module
+import topology as topology_module
+from parser import NodeSetup, ConnectionSetup
+from routing import RoutingTable
+
+logger = logging.getLogger(__name__)
+
+# changes whenever the layout of the arrays changes
+FORMAT_VERSION = "2"
+
+# separates the strings of the string table, which never occurs in node or port IDs
+SEPARATOR = "\0"
+
+class TopologyCache:
+    """
+    @class      TopologyCache
+    @brief      A directory of compiled topologies. Every entry is a directory named after
+                its key with one .npy file per array: the string table, the nodes and
+                connections as indices into it and the integer link parameters, and the
+                routing table of every router as (router, destination) matrices.
+    """
+    def __init__(self, cache_dir):
+        """
+        @brief      A constructor for the TopologyCache class.
+        @param      cache_dir - path to the directory of the cache, created when needed.
+        """
+        self.__cache_dir = cache_dir
+
+    def key(self, parser, routing, routing_policy):
+        """
+        @brief      Hashes everything the compiled topology depends on: the network given
+                    by parser.fingerprint, the sources of the user nodes and the switches
+                    they build on, which decide the routers, the sources of the nodes, which
+                    order the port handles, of the parser, the generators, the routing and
+                    this cache, and the routing algorithm and policy.
+        @param      parser - a Parser or a Topology.
+        @return     a hex string.
+        """
+        digest = hashlib.sha256()
+        for part in (FORMAT_VERSION, routing, routing_policy):
+            digest.update(part.encode() + b"\0")
+        digest.update(parser.fingerprint())
+        sources = sorted(glob.glob(os.path.join(parser.get_user_nodes_dir(), "*.py")))
+        modules = (node_module, switches_module, parser_module, topology_module, routing_module, sys.modules[__name__])
+        for path in sources + [module.__file__ for module in modules]:
+            digest.update(os.path.basename(path).encode() + b"\0")
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def __entry(self, key):
+        return os.path.join(self.__cache_dir, key)
+
+    def load(self, key, parser):
+        """
+        @brief      Fills the nodes and connections of the parser from the cache, as
+                    parser.parse would.
+        @param      key - key of the entry, see key.
+        @param      parser - a Parser or a Topology.
+        @return     a dict mapping the ID of every router to its RoutingTable, or None if
+                    the entry does not exist.
+        """
+        entry = self.__entry(key)
+        if not os.path.isdir(entry):
+            return None
+        arrays = {name[:-len(".npy")]: np.load(os.path.join(entry, name))
+                  for name in os.listdir(entry) if name.endswith(".npy")}
+        strings = arrays["strings"].tobytes().decode().split(SEPARATOR)
+        optional = lambda idx: None if idx < 0 else strings[idx]
+
+        parser.nodes = [NodeSetup(strings[module], strings[cls], strings[node_id], optional(pattern), optional(params),
+                                  optional(algorithm), optional(algorithm_params))
+                        for module, cls, node_id, pattern, params, algorithm, algorithm_params in arrays["nodes"].tolist()]
+        parser.connections = [ConnectionSetup(strings[src], strings[op_id], strings[dst], strings[ip_id], *params)
+                              for src, op_id, dst, ip_id, *params in arrays["connections"].tolist()]
+        if parser.get_user_nodes_dir() not in sys.path:
+            sys.path.append(parser.get_user_nodes_dir())
+
+        destinations = [strings[idx] for idx in arrays["destinations"].tolist()]
+        dst_index = {node_id: i for i, node_id in enumerate(destinations)}
+        policy = strings[int(arrays["policy"][0])]
+        set_ptr = arrays["set_ptr"].tolist()
+        set_offsets = arrays["set_offsets"].tolist()
+        set_handles = arrays["set_handles"].tolist()
+        all_sets = [tuple(set_handles[set_offsets[i]:set_offsets[i + 1]]) for i in range(len(set_offsets) - 1)]
+        tables = {}
+        for r, router in enumerate(arrays["routers"].tolist()):
+            # copying the rows keeps the lookups on plain arrays, which are faster to index
+            alt_set_ids = distances = None
+            if "alt_set_ids" in arrays:
+                alt_set_ids = array("H", arrays["alt_set_ids"][r].tobytes())
+                distances = array("H", arrays["distances"][r].tobytes())
+            tables[strings[router]] = RoutingTable(
+                dst_index, array("h", arrays["ports"][r].tobytes()), array("H", arrays["set_ids"][r].tobytes()),
+                all_sets[set_ptr[r]:set_ptr[r + 1]], policy, alt_set_ids, distances
+            )
+        logger.info(f"Loaded the compiled topology {key[:12]} with {len(parser.nodes)} nodes and {len(parser.connections)} links")
+        return tables
+
+    def save(self, key, parser, tables):
+        """
+        @brief      Compiles the parsed network and its routing tables into a new entry.
+                    The entry is written to a temporary directory and renamed, so
+                    concurrent runs never see a partial entry.
+        @param      key - key of the entry, see key.
+        @param      parser - a parsed Parser or Topology.
+        @param      tables - dict mapping the ID of every router to its RoutingTable.
+        """
+        strings = {}
+        def intern(value):
+            if value is None:
+                return -1
+            assert SEPARATOR not in value, f"Error: {value!r} cannot be stored in the topology cache"
+            return strings.setdefault(value, len(strings))
+
+        arrays = {}
+        arrays["nodes"] = np.array([
+            (intern(n.get_module_name()), intern(n.get_class_name()), intern(n.get_node_id()),
+             intern(n.get_pattern()), intern(n.get_pattern_params()),
+             intern(n.get_algorithm()), intern(n.get_algorithm_params()))
+            for n in parser.nodes
+        ], dtype = np.int32).reshape(-1, 7)
+        arrays["connections"] = np.array([
+            (intern(c.get_src_node()), intern(c.get_op_id()), intern(c.get_dst_node()), intern(c.get_ip_id()),
+             c.get_credit(), c.get_fifo_size(), c.get_latency(), c.get_vcs())
+            for c in parser.connections
+        ], dtype = np.int32).reshape(-1, 8)
+
+        routers = list(tables)
+        destinations = next(iter(tables.values())).get_destinations() if tables else []
+        num_dst = len(destinations)
+        arrays["routers"] = np.array([intern(router) for router in routers], dtype = np.int32)
+        arrays["destinations"] = np.array([intern(node_id) for node_id in destinations], dtype = np.int32)
+        arrays["policy"] = np.array([intern(tables[routers[0]].get_policy() if tables else "static")], dtype = np.int32)
+        arrays["ports"] = np.zeros((len(routers), num_dst), dtype = np.int16)
+        arrays["set_ids"] = np.zeros((len(routers), num_dst), dtype = np.uint16)
+        set_ptr = [0]
+        set_offsets = [0]
+        set_handles = []
+        nonminimal = any(table.get_arrays()[3] is not None for table in tables.values())
+        if nonminimal:
+            arrays["alt_set_ids"] = np.zeros((len(routers), num_dst), dtype = np.uint16)
+            arrays["distances"] = np.zeros((len(routers), num_dst), dtype = np.uint16)
+        for r, router in enumerate(routers):
+            ports, set_ids, sets, alt_set_ids, distances = tables[router].get_arrays()
+            arrays["ports"][r] = np.frombuffer(ports, dtype = np.int16)
+            arrays["set_ids"][r] = np.frombuffer(set_ids, dtype = np.uint16)
+            if nonminimal:
+                arrays["alt_set_ids"][r] = np.frombuffer(alt_set_ids, dtype = np.uint16)
+                arrays["distances"][r] = np.frombuffer(distances, dtype = np.uint16)
+            for hops in sets:
+                set_handles.extend(hops)
+                set_offsets.append(len(set_handles))
+            set_ptr.append(len(set_offsets) - 1)
+        arrays["set_ptr"] = np.array(set_ptr, dtype = np.int64)
+        arrays["set_offsets"] = np.array(set_offsets, dtype = np.int64)
+        arrays["set_handles"] = np.array(set_handles, dtype = np.int16)
+        arrays["strings"] = np.frombuffer(SEPARATOR.join(strings).encode(), dtype = np.uint8)
+
+        os.makedirs(self.__cache_dir, exist_ok = True)
+        tmp_dir = tempfile.mkdtemp(dir = self.__cache_dir, prefix = ".tmp-")
+        try:
+            for name, values in arrays.items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), values)
+            os.rename(tmp_dir, self.__entry(key))
+        except OSError:
+            # another run saved the same entry first
+            shutil.rmtree(tmp_dir, ignore_errors = True)
+            if not os.path.isdir(self.__entry(key)):
+                raise
+            return
+        logger.info(f"Saved the compiled topology {key[:12]} to {self.__cache_dir}")
@@ -0,0 +1,487 @@
+"""
+@file       traffic.py
+@brief      Built-in traffic generator and sink nodes for the synthetic traffic patterns,
+            and a producer that replays recorded traffic from a binary trace. The
+            injection cycles and destinations of a generator are drawn in numpy batches
+            from a random stream of its own, so advance does no random number work and
+            only runs in the cycles a packet is due.
+            Convert a csv trace from the src directory: python traffic.py trace.csv trace.npy
+@author     Akshay Joshi
+"""
+
+import os
+import sys
+import math
+import argparse
+from bisect import bisect_right
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+from node import Node
+
+# destination of the generator with index i out of n terminals:
+# uniform:     any terminal, drawn for every packet
+# transpose:   the terminals form a square matrix and row and column are swapped
+# bitcomp:     n - 1 - i, the bit complement of i if n is a power of two
+# hotspot:     the hotspot terminal with probability 'fraction', uniform otherwise
+# permutation: a random permutation of the terminals, the same for all generators with the same seed
+PATTERNS = ("uniform", "transpose", "bitcomp", "hotspot", "permutation")
+
+# bernoulli: a packet is injected in every cycle with probability 'rate'
+# bursty:    on/off Markov process that injects every cycle while on, with bursts of
+#            'burst' packets on average and the same average rate
+INJECTION_PROCESSES = ("bernoulli", "bursty")
+
+GENERATOR_PARAMS = {
+    "rate": 1.0,            # packets per cycle
+    "terminals": 0,         # number of destinations, required
+    "prefix": "B",          # the destinations are <prefix>0 to <prefix><terminals-1>
+    "index": -1,            # index of the generator, by default the number at the end of its ID
+    "seed": 1,
+    "injection": "bernoulli",
+    "burst": 8.0,           # mean burst length of 'bursty'
+    "hotspot": 0,           # destination index of 'hotspot'
+    "fraction": 0.1,        # share of the packets sent to the hotspot
+    "batch": 4096,          # packets drawn at a time
+}
+
+SINK_PARAMS = {
+    "warmup": 0,            # packets generated before this cycle are not measured
+}
+
+# pattern of TraceReplay, which takes its packets from a trace file instead
+REPLAY = "replay"
+
+REPLAY_PARAMS = {
+    "file": "",             # path to the trace, relative to the working directory, required
+    "terminals": 0,         # number of destinations, checked against the trace if given
+    "prefix": "B",          # the destinations are <prefix>0 to <prefix><terminals-1>
+    "index": -1,            # source index in the trace, by default the number at the end of the ID
+    "batch": 4096,          # records read at a time
+}
+
+# a trace record: a message of 'size' packets from terminal src to terminal dst,
+# generated at 'cycle'. Traces are sorted by src and then by cycle, see write_trace.
+TRACE_RECORD = np.dtype([("cycle", "<i8"), ("src", "<u4"), ("dst", "<u4"), ("size", "<u4")])
+
+def parse_params(params, defaults):
+    """
+    @brief      Parses 'key=value' items separated by ':' as given in the pattern_params
+                column, converting every value to the type of its default.
+    @param      params - the pattern_params string, may be empty or None.
+    @param      defaults - dict with the accepted keys and their default values.
+    @return     a dict with a value for every key of defaults.
+    """
+    values = dict(defaults)
+    for item in filter(None, (params or "").split(":")):
+        key, sep, value = item.partition("=")
+        if not sep or key not in defaults:
+            raise ValueError(f"Invalid traffic parameter: {item}, expected key=value with a key in {list(defaults)}")
+        try:
+            values[key] = type(defaults[key])(value)
+        except ValueError:
+            raise ValueError(f"Invalid value for traffic parameter {key}: {value}")
+    return values
+
+def write_trace(path, cycles, srcs, dsts, sizes=None):
+    """
+    @brief      Writes a trace for TraceReplay, sorting the records by source and cycle.
+    @param      path - path of the .npy file.
+    @param      cycles, srcs, dsts - sequences with the generation cycle, the source index
+                and the destination index of every message.
+    @param      sizes - sequence with the number of packets of every message, 1 by default.
+    """
+    records = np.empty(len(cycles), dtype = TRACE_RECORD)
+    records["cycle"] = cycles
+    records["src"] = srcs
+    records["dst"] = dsts
+    records["size"] = 1 if sizes is None else sizes
+    assert (records["cycle"] >= 0).all() and (records["size"] > 0).all(), "Error: trace cycles and sizes should not be negative or zero"
+    np.save(path, records[np.lexsort((records["cycle"], records["src"]))])
+
+# traces memory-mapped by this process, shared by all the replay nodes reading one
+_traces = {}
+
+def load_trace(path):
+    """
+    @brief      Memory-maps a trace written by write_trace, once per process.
+    """
+    path = os.path.abspath(path)
+    records = _traces.get(path)
+    if records is None:
+        records = np.load(path, mmap_mode = "r")
+        if records.dtype != TRACE_RECORD:
+            raise ValueError(f"Trace {path} has records of type {records.dtype}, expected {TRACE_RECORD}")
+        _traces[path] = records
+    return records
+
+def _terminal_index(node, index, num_terminals):
+    """
+    @brief      Returns the given index, or the number at the end of the node ID if it is
+                negative.
+    """
+    if index < 0:
+        digits = len(node.get_node_id()) - len(node.get_node_id().rstrip("0123456789"))
+        assert digits > 0, f"Error: {node.get_node_id()} needs index= since its ID does not end with a number"
+        index = int(node.get_node_id()[-digits:])
+    assert num_terminals <= 0 or 0 <= index < num_terminals, f"Error: index {index} of {node.get_node_id()} is not below terminals={num_terminals}"
+    return index
+
+
+class _SourceQueue(Node):
+    """
+    @class      _SourceQueue
+    @brief      Base class of the producers that know when their packets are generated.
+                The schedule is kept as lists of generation cycles and destination
+                indices, and the packets are sent in order on the only output port.
+                Packets that cannot be sent for lack of credits wait in an unbounded source
+                queue, so the offered load does not depend on the network. Packets are
+                numbered by the cycle they are generated at, which TrafficSink uses to
+                measure their latency.
+    """
+    def __init__(self):
+        super().__init__()
+        self.times = []         # generation cycles of the packets scheduled so far
+        self.dsts = []          # destination indices of the packets scheduled so far
+        self.head = 0           # first packet that has not been sent
+        self.counted = 0        # first packet that has not been counted as generated
+
+    def get_state(self):
+        state = super().get_state()
+        state["times"] = self.times
+        state["dsts"] = self.dsts
+        state["head"] = self.head
+        state["counted"] = self.counted
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.times = state["times"]
+        self.dsts = state["dsts"]
+        self.head = state["head"]
+        self.counted = state["counted"]
+
+    def setup_source(self, kind):
+        assert len(self.get_output_port_ids()) == 1, f"Error: {kind} {self.get_node_id()} needs exactly one output port"
+        self.out_handle = 0
+
+        # register the necessary stats, only the cycles with a send are recorded
+        self.register_counter_stats(f"pkts_generated")
+        self.register_counter_stats(f"pkts_sent")
+        self.register_cycle_stats(f"{self.get_node_id()}")
+
+    def append_packets(self, times, dsts):
+        """
+        @brief      Appends packets to the schedule and drops the packets that have been sent.
+        @param      times, dsts - lists of the generation cycles and destination indices.
+        """
+        head = self.head
+        self.times = self.times[head:] + times
+        self.dsts = self.dsts[head:] + dsts
+        self.counted -= head
+        self.head = 0
+
+    def send_due(self, cycle):
+        """
+        @brief      Sends the oldest packet due by the cycle and puts the node to sleep until
+                    it has more to do. The schedule has to contain every packet generated
+                    by the cycle.
+        """
+        times = self.times
+
+        # count the packets generated since the last call
+        due = bisect_right(times, cycle, self.counted)
+        if due > self.counted:
+            self.incr_counter_stats(f"pkts_generated", due - self.counted)
+            self.counted = due
+
+        # send the oldest packet of the source queue on the virtual channel with the most credits
+        vc = -1
+        if self.head < due:
+            vc = self.get_output_port_at(self.out_handle).select_vc()
+            if vc >= 0:
+                packet = self.create_pkt(times[self.head], f"{self.params['prefix']}{self.dsts[self.head]}")
+                if self.send_pkt_on(self.out_handle, packet, cycle, vc) < 0:
+                    self.release_pkt(packet)
+                    vc = -1
+                else:
+                    logger.debug("%s sent packet %s", self.get_node_id(), packet)
+                    self.head += 1
+                    self.incr_counter_stats(f"pkts_sent", 1)
+                    self.record_cycle_stats(f"{self.get_node_id()}", cycle, True)
+
+        # sleep until the next packet is generated, or a credit arrives if packets are
+        # waiting for one
+        wake = times[due] if due < len(times) else None
+        if self.head == due:
+            if wake is None:
+                self.sleep_until_event()
+            else:
+                self.sleep_until(wake)
+        elif vc < 0:
+            self.sleep_until_event(wake)
+
+
+class TrafficGenerator(_SourceQueue):
+    """
+    @class      TrafficGenerator
+    @brief      Injects packets on its only output port following a traffic pattern, given
+                by the pattern column, and an injection process at a fixed rate, given by
+                the pattern_params column, e.g. 'uniform' with 'rate=0.3:terminals=64'.
+    """
+    def __init__(self):
+        super().__init__()
+        self.pattern = "uniform"
+        self.params = dict(GENERATOR_PARAMS)
+        self.rng = None
+        self.next_start = 0     # first cycle not covered by the drawn packets
+
+    def set_pattern(self, pattern, params):
+        if pattern not in PATTERNS:
+            raise ValueError(f"Unknown traffic pattern: {pattern}, expected one of {list(PATTERNS)}")
+        self.pattern = pattern
+        self.params = parse_params(params, GENERATOR_PARAMS)
+        p = self.params
+        if p["terminals"] <= 0:
+            raise ValueError(f"Traffic pattern {pattern} needs the number of terminals, e.g. terminals=16")
+        if not 0.0 <= p["rate"] <= 1.0:
+            raise ValueError(f"Injection rate should be between 0 and 1. Got: {p['rate']}")
+        if p["injection"] not in INJECTION_PROCESSES:
+            raise ValueError(f"Unknown injection process: {p['injection']}, expected one of {list(INJECTION_PROCESSES)}")
+        if p["injection"] == "bursty" and p["rate"] < 1.0 and (p["burst"] < 1.0 or p["rate"] / (1.0 - p["rate"]) > p["burst"]):
+            raise ValueError(f"Burst length {p['burst']} is too short for rate {p['rate']}, it needs at least rate/(1-rate)")
+
+    def get_state(self):
+        state = super().get_state()
+        state["rng"] = self.rng
+        state["next_start"] = self.next_start
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.rng = state["rng"]
+        self.next_start = state["next_start"]
+
+    def is_done(self):
+        # packets are generated for ever at a positive rate
+        return self.params["rate"] == 0.0 and self.head == len(self.times)
+
+    def setup(self):
+        p = self.params
+        num_terminals = p["terminals"]
+        self.index = _terminal_index(self, p["index"], num_terminals)
+
+        # every generator has its own stream, derived from the seed and its index, so
+        # the traffic does not depend on the order in which the nodes are advanced
+        self.rng = np.random.default_rng(np.random.SeedSequence(p["seed"], spawn_key = (self.index,)))
+        self.fixed_dst = None
+        if self.pattern == "transpose":
+            side = math.isqrt(num_terminals)
+            assert side * side == num_terminals, f"Error: transpose needs a square number of terminals. Got: {num_terminals}"
+            self.fixed_dst = (self.index % side) * side + self.index // side
+        elif self.pattern == "bitcomp":
+            self.fixed_dst = num_terminals - 1 - self.index
+        elif self.pattern == "permutation":
+            self.fixed_dst = int(np.random.default_rng(p["seed"]).permutation(num_terminals)[self.index])
+        if self.pattern == "hotspot":
+            assert 0 <= p["hotspot"] < num_terminals, f"Error: hotspot {p['hotspot']} is not below terminals={num_terminals}"
+        self.setup_source("traffic generator")
+
+    def __draw_destinations(self, count):
+        p = self.params
+        if self.fixed_dst is not None:
+            return np.full(count, self.fixed_dst)
+        dsts = self.rng.integers(0, p["terminals"], count)
+        if self.pattern == "hotspot":
+            dsts[self.rng.random(count) < p["fraction"]] = p["hotspot"]
+        return dsts
+
+    def __draw(self):
+        """
+        @brief      Appends the next batch of packets to the schedule and drops the packets
+                    that have been sent. Both injection processes are memoryless at the
+                    batch boundaries, the bursty one because a batch ends with a burst.
+        """
+        p = self.params
+        rate = p["rate"]
+        if p["injection"] == "bernoulli" or rate == 1.0:
+            times = self.next_start - 1 + np.cumsum(self.rng.geometric(rate, p["batch"]))
+            self.next_start = int(times[-1]) + 1
+        else:
+            # off periods end with probability alpha per cycle and bursts with 1/burst,
+            # alpha is chosen so that the process is on for a share 'rate' of the cycles
+            beta = 1.0 / p["burst"]
+            alpha = rate * beta / (1.0 - rate)
+            pairs = max(1, int(p["batch"] / p["burst"]))
+            offs = self.rng.geometric(alpha, pairs)
+            ons = self.rng.geometric(beta, pairs)
+            starts = self.next_start + np.cumsum(offs + ons) - ons
+            ends = np.cumsum(ons)
+            times = np.repeat(starts, ons) + np.arange(ends[-1]) - np.repeat(ends - ons, ons)
+            self.next_start = int(starts[-1] + ons[-1])
+
+        self.append_packets(times.tolist(), self.__draw_destinations(len(times)).tolist())
+
+    def advance(self, cycle):
+        if self.params["rate"] == 0.0:
+            # without traffic the generator never sends, so it never needs to run again
+            self.sleep_until_event()
+            return
+
+        # draw until the schedule reaches beyond the current cycle
+        while not self.times or self.times[-1] <= cycle:
+            self.__draw()
+        self.send_due(cycle)
+
+
+class TraceReplay(_SourceQueue):
+    """
+    @class      TraceReplay
+    @brief      Injects the messages of one source of a recorded trace at the cycles they
+                were recorded at, configured with the pattern 'replay' and pattern_params
+                such as 'file=../traces/app.npy:terminals=64'. A message of size n is
+                injected as n packets, one per cycle at most. The trace is memory-mapped
+                and read in batches, so it may be larger than memory, and the nodes of a
+                process share one mapping. The records of the node are found by binary
+                search on the source column.
+    """
+    def __init__(self):
+        super().__init__()
+        self.params = dict(REPLAY_PARAMS)
+        self.records = None
+        self.pos = 0            # next record of the trace to read
+        self.end = 0            # end of the records of this source
+
+    def set_pattern(self, pattern, params):
+        if pattern != REPLAY:
+            raise ValueError(f"Unknown pattern of a trace replay node: {pattern}, expected {REPLAY}")
+        self.params = parse_params(params, REPLAY_PARAMS)
+        if not self.params["file"]:
+            raise ValueError(f"Trace replay needs the trace file, e.g. file=../traces/app.npy")
+
+    def get_state(self):
+        state = super().get_state()
+        state["pos"] = self.pos
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.pos = state["pos"]
+
+    def is_done(self):
+        return self.pos == self.end and self.head == len(self.times)
+
+    def setup(self):
+        p = self.params
+        self.index = _terminal_index(self, p["index"], p["terminals"])
+        self.records = load_trace(p["file"])
+        sources = self.records["src"]
+        self.pos = int(np.searchsorted(sources, self.index, "left"))
+        self.end = int(np.searchsorted(sources, self.index, "right"))
+        self.setup_source("trace replay node")
+
+    def __read(self):
+        """
+        @brief      Appends the packets of the next batch of records to the schedule.
+        """
+        p = self.params
+        batch = self.records[self.pos:min(self.pos + p["batch"], self.end)]
+        cycles = batch["cycle"]
+        assert (batch["src"] == self.index).all() and (np.diff(cycles) >= 0).all() and \
+            (not self.times or cycles[0] >= self.times[-1]), f"Error: trace {p['file']} is not sorted by source and cycle"
+        assert p["terminals"] <= 0 or (batch["dst"] < p["terminals"]).all(), \
+            f"Error: trace {p['file']} has destinations of {self.get_node_id()} not below terminals={p['terminals']}"
+        sizes = batch["size"]
+        self.append_packets(np.repeat(cycles, sizes).tolist(), np.repeat(batch["dst"], sizes).tolist())
+        self.pos += len(batch)
+
+    def advance(self, cycle):
+        # read until the schedule reaches beyond the current cycle or the trace ends
+        while self.pos < self.end and (not self.times or self.times[-1] <= cycle):
+            self.__read()
+        self.send_due(cycle)
+
+
+class TrafficSink(Node):
+    """
+    @class      TrafficSink
+    @brief      Ejects one packet per cycle from its only input port and measures the
+                latency of the packets from the cycle they were generated at, which is
+                their ID for TrafficGenerator and the built-in producers. Packets generated
+                before the warm-up cycle, given as 'warmup=<cycle>' in the pattern_params
+                column, are counted in pkts_recvd but not measured, and pkts_accepted counts
+                the packets received from the warm-up cycle on.
+    """
+    def __init__(self):
+        super().__init__()
+        self.params = dict(SINK_PARAMS)
+
+    def set_pattern(self, pattern, params):
+        self.params = parse_params(params, SINK_PARAMS)
+
+    def setup(self):
+        self.warmup = self.params["warmup"]
+        assert len(self.get_input_port_ids()) == 1, f"Error: traffic sink {self.get_node_id()} needs exactly one input port"
+        self.in_handle = 0
+
+        # pkts_measured and latency_total give the mean latency after the warm-up
+        self.register_counter_stats(f"pkts_recvd")
+        self.register_counter_stats(f"pkts_accepted")
+        self.register_counter_stats(f"pkts_measured")
+        self.register_counter_stats(f"latency_total")
+        self.register_cycle_stats(f"{self.get_node_id()}")
+
+    def advance(self, cycle):
+        # receive one packet per cycle, from the first virtual channel that has one
+        input_port = self.get_input_port_at(self.in_handle)
+        pkt = None
+        for vc in range(input_port.get_num_vcs()):
+            pkt = self.recv_pkt_on(self.in_handle, cycle, vc)
+            if pkt:
+                break
+        if pkt:
+            logger.debug("%s received packet %s", self.get_node_id(), pkt)
+            self.incr_counter_stats(f"pkts_recvd", 1)
+            if cycle >= self.warmup:
+                self.incr_counter_stats(f"pkts_accepted", 1)
+            created = pkt.get_seq()
+            if created >= self.warmup:
+                self.incr_counter_stats(f"pkts_measured", 1)
+                self.incr_counter_stats(f"latency_total", cycle - created)
+            self.record_cycle_stats(f"{self.get_node_id()}", cycle, True)
+            self.release_pkt(pkt)
+
+        # nothing left to receive, sleep until the next packet arrives
+        if input_port.is_empty():
+            self.sleep_until_event()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "input",
+        type = str,
+        help = "Path to a csv file with cycle, src and dst columns, and optionally size, and a header row"
+    )
+    parser.add_argument(
+        "output",
+        type = str,
+        help = "Path of the binary trace for TraceReplay, a .npy file"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    columns = np.genfromtxt(args.input, delimiter = ",", names = True, dtype = np.int64)
+    names = columns.dtype.names
+    if columns.ndim == 0:
+        columns = columns.reshape(1)
+    if not {"cycle", "src", "dst"} <= set(names):
+        sys.exit(f"Error: {args.input} needs the columns cycle, src and dst. Got: {', '.join(names)}")
+    write_trace(args.output, columns["cycle"], columns["src"], columns["dst"], columns["size"] if "size" in names else None)
+    print(f"Wrote {len(columns)} records to {args.output}")